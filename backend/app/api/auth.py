@@ -3,12 +3,14 @@ from sqlalchemy.orm import Session
 from app.schemas.user import UserCreate, UserLogin, Token
 from app.models.user import User
 from app.core.security import hash_password, verify_password, create_access_token
-from app.core.database import get_db
+from app.core.database import get_db, get_write_db
 
 router = APIRouter()
 
 @router.post("/register")
-def register(user: UserCreate, db: Session = Depends(get_db)):
+def register(user: UserCreate, db: Session = Depends(get_write_db)):
+    # hash before the transaction starts (it holds the SQLite write lock)
+    hashed_password = hash_password(user.password)
     existing_user = db.query(User).filter(
         (User.username == user.username) | (User.email == user.email)
     ).first()
@@ -18,7 +20,7 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
     new_user = User(
         username=user.username,
         email=user.email,
-        hashed_password=hash_password(user.password)
+        hashed_password=hashed_password
     )
     db.add(new_user)
     db.commit()
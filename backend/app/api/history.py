@@ -49,7 +49,6 @@ async def upload_pdf(
 
         # ✅ Store in database
         store_report_in_db(
-            db=db,
             user_id=user_id,
             metadata=str(metadata),
             doctor_summary=doctor_summary,
@@ -85,7 +84,7 @@ def get_latest_summary(db: Session = Depends(get_db), token: str = Depends(oauth
             raise HTTPException(status_code=401, detail="Invalid token")
 
         from app.models.user import User
-        from app.models.history import ReportHistory  # ✅ FIXED
+        from app.models.history import ReportHistory, history_order  # ✅ FIXED
 
         db_user = db.query(User).filter(User.username == username).first()
         if not db_user:
@@ -94,7 +93,7 @@ def get_latest_summary(db: Session = Depends(get_db), token: str = Depends(oauth
         latest_report = (
             db.query(ReportHistory)
             .filter(ReportHistory.user_id == db_user.id)
-            .order_by(ReportHistory.id.desc())  # ✅ NO created_at field
+            .order_by(*history_order(descending=True))
             .first()
         )
 
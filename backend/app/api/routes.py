@@ -4,18 +4,35 @@ import os
 import io
 import json
 import glob
+import hashlib
 import logging
+from datetime import date, datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
 from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query, Header, Response
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.responses import FileResponse, StreamingResponse
 from jose import jwt, JWTError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.services.summary import generate_summary
-from app.services.pdf_generator import generate_summary_pdf
-from app.core.database import get_db, store_report_in_db
+from app.services.report_pdf import prepare_report_pdf, iter_user_report_pdfs, render_report_pdf, TREND_WINDOW, TREND_HISTORY
+from app.services.report_export import iter_report_archive
+from app.services.report_compare import comparison_etag, load_comparison, render_comparison
+from app.services.prerender import schedule_prerender
+from app.services.metric_store import metric_values_for_reports
+from app.services.trend_cache import trend_cache
+from app.services.trend_aggregates import get_trend_summary
+from app.services.trend_analytics import get_user_trend_analytics
+from app.services.cohort_stats import cohort_percentile, COHORT_ALL
+from app.services.lab_import import import_lab_results, IMPORT_FORMATS, LAB_IMPORT_MAX_BYTES
+from app.services.pdf_cache import pdf_cache
+from app.services.chart_cache import parse_chart_name, chart_file_path, chart_data_uri, MEDIA_TYPES
+from app.core.database import get_db, get_async_db, store_reports_in_db_async, pool_stats
+from app.utils.downsample import downsample_rows
 from app.core.security import SECRET_KEY, ALGORITHM
 from app.models.user import User
 
@@ -25,6 +42,40 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Content-addressed resources never change, so clients/CDNs may keep them forever
+_IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Usernames allowed to read /metrics/db-pool (comma-separated; empty = any signed-in user)
+DB_METRICS_USERS = {u.strip() for u in os.getenv("DB_METRICS_USERS", "").split(",") if u.strip()}
+
+
+def _not_modified_since(if_modified_since: Optional[str], last_modified: datetime) -> bool:
+    if not if_modified_since:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return last_modified <= since
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """RFC 7232 weak comparison of an If-None-Match header against our ETag."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    ours = etag[2:] if etag.startswith("W/") else etag
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == ours:
+            return True
+    return False
+
 
 # -----------------------------------------------------------------------------
 # Upload report + generate summary (+ suggestions) and persist to history
@@ -32,7 +83,9 @@ logger = logging.getLogger(__name__)
 @router.post("/upload")
 async def upload_pdf(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    inline_charts: bool = Query(False, description="Also return small charts inline as data: URIs."),
+    prerender_pdf: bool = Query(True, description="Render this report's PDF in the background."),
+    db: AsyncSession = Depends(get_async_db),
     token: str = Depends(oauth2_scheme),
 ):
     try:
@@ -42,39 +95,59 @@ async def upload_pdf(
         if not username:
             raise HTTPException(status_code=401, detail="Invalid token")
 
-        db_user = db.query(User).filter(User.username == username).first()
+        db_user = (await db.execute(select(User).where(User.username == username))).scalars().first()
         if db_user is None:
             raise HTTPException(status_code=404, detail="User not found")
 
         logger.info("✅ Received file: %s for user_id: %s", file.filename, db_user.id)
 
         # ---- generate summaries, metrics, ranges, suggestions, charts ----
-        result = await generate_summary(file=file, user_id=db_user.id)
+        data = await file.read()
+        result = await generate_summary(file=data, user_id=db_user.id)
         logger.info("✅ Summary generated successfully")
 
         # We save ONLY the numeric metrics as "metadata" for trend history
         # (keep it simple and consistent for /history/metrics)
         metrics: Dict[str, Any] = result.get("metrics") or {}
 
-        # ---- persist a history row for this user ----
-        store_report_in_db(
-            db=db,
-            user_id=db_user.id,
-            doctor_summary=result.get("doctor_summary") or "",
-            patient_summary=result.get("patient_summary") or "",
-            metadata=metrics,            # <= store numeric metrics
-            filename=file.filename,      # if the column exists it will be saved
+        # ---- persist a history row for this user (async engine, no blocked event loop) ----
+        (report_id,) = await store_reports_in_db_async(
+            [
+                {
+                    "user_id": db_user.id,
+                    "doctor_summary": result.get("doctor_summary") or "",
+                    "patient_summary": result.get("patient_summary") or "",
+                    "metadata": metrics,          # <= store numeric metrics
+                    "filename": file.filename,    # if the column exists it will be saved
+                    "content_hash": hashlib.sha256(data).hexdigest(),  # bulk ingestion dedupes on it
+                    "ranges": result.get("ranges") or {},
+                    "summary_model": result.get("summary_model"),
+                    "summary_prompt_version": result.get("summary_prompt_version"),
+                }
+            ]
         )
 
+        # ---- warm the PDF cache so the usual next click is instant ----
+        if prerender_pdf and report_id:
+            schedule_prerender(user_id=db_user.id, report_id=report_id)
+
         # ---- return everything the frontend needs ----
-        return {
+        charts: Dict[str, str] = result.get("charts") or {}
+        response: Dict[str, Any] = {
+            "report_id": report_id,
             "doctor_summary": result.get("doctor_summary") or "",
             "patient_summary": result.get("patient_summary") or "",
             "metrics": result.get("metrics") or {},         # numeric values
             "ranges": result.get("ranges") or {},           # normal bands
-            "charts": result.get("charts") or {},           # optional image paths
+            "charts": charts,                               # stable chart URLs
             "suggestions": result.get("suggestions") or {}, # ✅ now included
         }
+        if inline_charts:
+            # small charts only; anything larger stays a cacheable URL
+            response["chart_data"] = {
+                m: uri for m, uri in ((m, chart_data_uri(u)) for m, u in charts.items()) if uri
+            }
+        return response
 
     except HTTPException:
         raise
@@ -83,11 +156,144 @@ async def upload_pdf(
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
+# -----------------------------------------------------------------------------
+# Bulk import of structured lab results (CSV / JSON / FHIR), no PDF / LLM step.
+# Everything goes into the caller's history; summaries are generated later.
+# -----------------------------------------------------------------------------
+@router.post("/import/lab-results")
+def import_structured_results(
+    file: UploadFile = File(...),
+    format: str = Query("auto", description="auto, csv, json or fhir."),
+    dry_run: bool = Query(False, description="Validate only, write nothing."),
+    db: Session = Depends(get_db),
+    token: str = Depends(oauth2_scheme),
+) -> Dict[str, Any]:
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        username = payload.get("sub")
+        if not username:
+            raise HTTPException(status_code=401, detail="Invalid token")
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    user = db.query(User).filter(User.username == username).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    if format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=422, detail=f"format must be one of {', '.join(IMPORT_FORMATS)}")
+
+    data = file.file.read(LAB_IMPORT_MAX_BYTES + 1)
+    if len(data) > LAB_IMPORT_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="File too large; use import_lab_results.py")
+
+    result = import_lab_results(
+        db,
+        data,
+        fmt=format,
+        source=f"import:{file.filename or 'upload'}",
+        user_id=user.id,
+        dry_run=dry_run,
+    )
+    return {
+        "rows": result.rows,
+        "reports": result.reports,
+        "duplicates": result.duplicates,
+        "report_ids": result.report_ids,
+        "error_count": result.error_count,
+        "errors": [{"line": e.line, "message": e.message} for e in result.errors],
+    }
+
+
+# -----------------------------------------------------------------------------
+# DB pool metrics (utilization, checkout wait histogram, timeouts)
+#  - signed-in users only; DB_METRICS_USERS narrows it to operators
+# -----------------------------------------------------------------------------
+@router.get("/metrics/db-pool")
+def get_db_pool_metrics(token: str = Depends(oauth2_scheme)) -> Dict[str, Any]:
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        username = payload.get("sub")
+        if not username:
+            raise HTTPException(status_code=401, detail="Invalid token")
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    if DB_METRICS_USERS and username not in DB_METRICS_USERS:
+        raise HTTPException(status_code=403, detail="Not allowed")
+    return pool_stats()
+
+
+# -----------------------------------------------------------------------------
+# Serve content-addressed charts (immutable, ETag = content key)
+# -----------------------------------------------------------------------------
+@router.get("/charts/{name}")
+def get_chart(
+    name: str,
+    if_none_match: Optional[str] = Header(None),
+):
+    parsed = parse_chart_name(name)
+    if not parsed:
+        raise HTTPException(status_code=404, detail="Chart not found")
+    key, fmt = parsed
+
+    headers = {"ETag": f'"{key}"', "Cache-Control": _IMMUTABLE_CACHE_CONTROL}
+    if _etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    path = chart_file_path(key, fmt)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Chart not found")
+    return FileResponse(path, media_type=MEDIA_TYPES[fmt], headers=headers)
+
+
+# -----------------------------------------------------------------------------
+# Shared filters for the history list endpoints (keyset pagination)
+# -----------------------------------------------------------------------------
+_DEFAULT_TREND_METRICS = ["Hemoglobin", "Platelets", "WBC", "RBC", "Glucose"]
+
+
+def _history_page_query(db: Session, user_id: int, since: Optional[date], until: Optional[date], metric: Optional[str]):
+    """
+    Only the light columns of report_history (never the summary text), filtered
+    by upload date and, optionally, by reports that contain `metric`.
+    """
+    from app.models.history import ReportHistory, ReportMetric
+
+    q = db.query(ReportHistory.id, ReportHistory.uploaded_at, ReportHistory.filename).filter(
+        ReportHistory.user_id == user_id
+    )
+    if since is not None:
+        q = q.filter(ReportHistory.uploaded_at >= datetime.combine(since, datetime.min.time()))
+    if until is not None:
+        q = q.filter(ReportHistory.uploaded_at < datetime.combine(until + timedelta(days=1), datetime.min.time()))
+    if metric:
+        q = q.filter(
+            ReportHistory.id.in_(
+                db.query(ReportMetric.report_id).filter(
+                    ReportMetric.user_id == user_id, ReportMetric.metric == metric
+                )
+            )
+        )
+    return q
+
+
 # -----------------------------------------------------------------------------
 # History metrics for Trend Analysis (table)
+#  - keyset pagination: ?after_id=<X-Next-Cursor>&limit=N (oldest report date first)
+#  - filters: since/until (upload date), metrics=... (columns to return)
+#  - points=N: downsample the page with LTTB per column (peaks/troughs kept)
+#  - served from trend_cache; ETag changes only when the user's history does
 # -----------------------------------------------------------------------------
 @router.get("/history/metrics")
 def get_history_metrics(
+    response: Response,
+    limit: int = Query(500, ge=1, le=2000),
+    after_id: Optional[int] = Query(None, description="Cursor: return reports after this report (X-Next-Cursor)."),
+    since: Optional[date] = Query(None),
+    until: Optional[date] = Query(None),
+    metrics: Optional[List[str]] = Query(None, description="Metric columns to return (default: the five core metrics)."),
+    points: Optional[int] = Query(None, ge=3, le=2000, description="Downsample to about this many points per metric."),
+    if_none_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
     token: str = Depends(oauth2_scheme),
 ) -> List[Dict[str, Any]]:
@@ -104,60 +310,145 @@ def get_history_metrics(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # ---- query history ----
-    from app.models.history import ReportHistory
+    # ---- one page from the cached per-user trend arrays ----
+    series = trend_cache.get(db, user.id)
+    columns = metrics or _DEFAULT_TREND_METRICS
+    etag = series.etag("metrics", limit, after_id, since, until, columns, points)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
+    try:
+        positions = series.select(after_id=after_id, since=since, until=until, limit=limit + 1)
+    except KeyError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if len(positions) > limit:
+        positions = positions[:limit]
+        response.headers["X-Next-Cursor"] = str(series.report_ids[int(positions[-1])])
+
+    out = series.rows(positions, columns)
+    if points:
+        out = downsample_rows(out, columns, points)
+    return out
+
 
-    rows = (
-        db.query(ReportHistory)
-        .filter(ReportHistory.user_id == user.id)
-        .order_by(ReportHistory.id.asc())
-        .all()
+# -----------------------------------------------------------------------------
+# Per-metric trend summary (incrementally maintained aggregates, O(metrics))
+# -----------------------------------------------------------------------------
+@router.get("/history/summary")
+def get_history_summary(
+    db: Session = Depends(get_db),
+    token: str = Depends(oauth2_scheme),
+) -> List[Dict[str, Any]]:
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        username = payload.get("sub")
+        if not username:
+            raise HTTPException(status_code=401, detail="Invalid token")
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    user = db.query(User).filter(User.username == username).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    return get_trend_summary(db, user.id)
+
+
+# -----------------------------------------------------------------------------
+# Trend analytics: rolling average, rate of change, regression projection,
+# z-score / out-of-range anomaly flags per metric (vectorized, see trend_analytics)
+# -----------------------------------------------------------------------------
+@router.get("/history/analytics")
+def get_history_analytics(
+    metrics: Optional[List[str]] = Query(None, description="Metrics to analyse (default: all)."),
+    since: Optional[date] = Query(None),
+    until: Optional[date] = Query(None),
+    window: int = Query(5, ge=1, le=100, description="Rolling-average window (points)."),
+    horizon_days: float = Query(30.0, ge=0, le=3650, description="Projection horizon after the last point."),
+    z_threshold: float = Query(2.0, gt=0, description="Flag points with |z| above this."),
+    points: Optional[int] = Query(None, ge=3, le=5000, description="Downsample each series to this many points (LTTB)."),
+    db: Session = Depends(get_db),
+    token: str = Depends(oauth2_scheme),
+) -> Dict[str, Dict[str, Any]]:
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        username = payload.get("sub")
+        if not username:
+            raise HTTPException(status_code=401, detail="Invalid token")
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    user = db.query(User).filter(User.username == username).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    return get_user_trend_analytics(
+        db,
+        user.id,
+        metrics=metrics,
+        since=datetime.combine(since, datetime.min.time()) if since else None,
+        until=datetime.combine(until + timedelta(days=1), datetime.min.time()) if until else None,
+        window=window,
+        horizon_days=horizon_days,
+        z_threshold=z_threshold,
+        max_points=points,
     )
 
-    def _parse_meta(entry) -> Dict[str, Any]:
-        # tolerant to different column names and storage formats
-        for attr in ("report_metadata", "metadata_json", "metadata", "report_data", "meta", "data"):
-            if hasattr(entry, attr):
-                raw = getattr(entry, attr)
-                if not raw:
-                    continue
-                if isinstance(raw, dict):
-                    return raw
-                try:
-                    return json.loads(raw)
-                except Exception:
-                    return {}
-        return {}
-
-    def _sf(x: Optional[Any]) -> float:
-        try:
-            return float(x)
-        except Exception:
-            return -1.0
 
-    out: List[Dict[str, Any]] = []
-    for r in rows:
-        meta = _parse_meta(r)
-        date_str = r.uploaded_at.strftime("%Y-%m-%d") if getattr(r, "uploaded_at", None) else f"id-{r.id}"
-        out.append(
-            {
-                "date": date_str,
-                "Hemoglobin": _sf(meta.get("Hemoglobin")),
-                "Platelets": _sf(meta.get("Platelets")),
-                "WBC": _sf(meta.get("WBC")),
-                "RBC": _sf(meta.get("RBC")),
-                "Glucose": _sf(meta.get("Glucose")),
-            }
+# -----------------------------------------------------------------------------
+# Population percentile: "how does my value compare" (precomputed sketches)
+#  - value defaults to the user's latest value of the metric
+# -----------------------------------------------------------------------------
+@router.get("/cohort/percentile")
+def get_cohort_percentile(
+    metric: str = Query(..., max_length=64),
+    value: Optional[float] = Query(None),
+    cohort: str = Query(COHORT_ALL, max_length=32),
+    db: Session = Depends(get_db),
+    token: str = Depends(oauth2_scheme),
+) -> Dict[str, Any]:
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        username = payload.get("sub")
+        if not username:
+            raise HTTPException(status_code=401, detail="Invalid token")
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    user = db.query(User).filter(User.username == username).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    if value is None:
+        from app.models.history import MetricAggregate
+
+        value = (
+            db.query(MetricAggregate.last_value)
+            .filter(MetricAggregate.user_id == user.id, MetricAggregate.metric == metric)
+            .scalar()
         )
-    return out
+
+    result = cohort_percentile(db, metric, value, cohort)
+    if result is None:
+        raise HTTPException(status_code=404, detail="No population statistics for this metric yet")
+    return result
 
 
 # -----------------------------------------------------------------------------
 # List this user's recent reports (id/filename/date + quick metric keys)
+#  - keyset pagination: ?before_id=<X-Next-Cursor>&limit=N (newest report date first)
+#  - filters: since/until (upload date), metric=<name> (reports containing it)
 # -----------------------------------------------------------------------------
 @router.get("/history/reports")
 def list_user_reports(
-    limit: int = 50,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    before_id: Optional[int] = Query(None, description="Cursor: return reports before this report (X-Next-Cursor)."),
+    since: Optional[date] = Query(None),
+    until: Optional[date] = Query(None),
+    metric: Optional[str] = Query(None),
     db: Session = Depends(get_db),
     token: str = Depends(oauth2_scheme),
 ) -> List[Dict[str, Any]]:
@@ -173,34 +464,33 @@ def list_user_reports(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    from app.models.history import ReportHistory
-    rows = (
-        db.query(ReportHistory)
-        .filter(ReportHistory.user_id == user.id)
-        .order_by(ReportHistory.id.desc())
-        .limit(max(1, min(limit, 200)))
-        .all()
-    )
+    from app.models.history import ReportHistory, history_keyset, history_order
 
-    def _parse_meta(entry) -> Dict[str, Any]:
-        raw = getattr(entry, "report_metadata", None)
-        if isinstance(raw, dict):
-            return raw
-        if isinstance(raw, str) and raw.strip():
-            try:
-                return json.loads(raw)
-            except Exception:
-                return {}
-        return {}
+    q = _history_page_query(db, user.id, since, until, metric)
+    if before_id is not None:
+        cursor_at = (
+            db.query(ReportHistory.uploaded_at)
+            .filter(ReportHistory.id == before_id, ReportHistory.user_id == user.id)
+            .scalar()
+        )
+        if cursor_at is None:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        q = q.filter(history_keyset(cursor_at, before_id, before=True))
+    rows = q.order_by(*history_order(descending=True)).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = str(rows[-1].id)
+
+    values = metric_values_for_reports(db, [r.id for r in rows])
 
     out: List[Dict[str, Any]] = []
     for r in rows:
         out.append(
             {
                 "id": r.id,
-                "filename": getattr(r, "filename", None),
-                "uploaded_at": r.uploaded_at.isoformat() if getattr(r, "uploaded_at", None) else None,
-                "metric_keys": sorted(k for k in _parse_meta(r).keys() if k != "ranges"),
+                "filename": r.filename,
+                "uploaded_at": r.uploaded_at.isoformat() if r.uploaded_at else None,
+                "metric_keys": sorted(values.get(r.id, {}).keys()),
             }
         )
     return out
@@ -208,14 +498,20 @@ def list_user_reports(
 
 # -----------------------------------------------------------------------------
 # Download the latest (or specific) report as a PDF
-#  - unchanged behavior EXCEPT we now pass tiny trend series per metric
-#    so the PDF graphs match the summary page.
+#  - sparklines: last TREND_HISTORY values downsampled to sparkline_points (LTTB)
+#  - rendered PDFs are cached per (report, sparkline window, content hash);
+#    the content hash is the ETag, so repeat downloads return 304 or cached bytes.
+#  - Last-Modified is when the current content was rendered, not the upload
+#    date: summaries and sparklines can change after upload.
 # -----------------------------------------------------------------------------
 @router.get("/download-report")
 def download_report(
     report_id: Optional[int] = Query(
         None, description="If provided, download that specific report; otherwise the latest."
     ),
+    sparkline_points: int = Query(TREND_WINDOW, ge=2, le=TREND_HISTORY, description="Points per sparkline (LTTB-downsampled)."),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
     db: Session = Depends(get_db),
     token: str = Depends(oauth2_scheme),
 ):
@@ -232,94 +528,106 @@ def download_report(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    from app.models.history import ReportHistory
-
-    # pick the row to render
-    q = db.query(ReportHistory).filter(ReportHistory.user_id == user.id)
-    if report_id is not None:
-        q = q.filter(ReportHistory.id == report_id)
-    row = q.order_by(ReportHistory.id.desc()).first()
-    if not row:
+    job = prepare_report_pdf(db, user_id=user.id, report_id=report_id, trend_window=sparkline_points)
+    if job is None:
         raise HTTPException(status_code=404, detail="Report not found for this user.")
 
-    # Parse metadata JSON (robust)
-    metadata: Dict[str, Any] = {}
-    raw_meta = getattr(row, "report_metadata", None)
-    if isinstance(raw_meta, dict):
-        metadata = raw_meta
-    elif isinstance(raw_meta, str) and raw_meta.strip():
-        try:
-            metadata = json.loads(raw_meta)
-        except Exception:
-            metadata = {}
-
-    # ---- build tiny series for sparklines (last up to 8 values)
-    # We only create series for the metrics present in THIS report.
-    rows = (
-        db.query(ReportHistory)
-        .filter(ReportHistory.user_id == user.id)
-        .order_by(ReportHistory.id.asc())
-        .all()
-    )
-
-    def _parse_meta(entry) -> Dict[str, Any]:
-        for attr in ("report_metadata", "metadata_json", "metadata", "report_data", "meta", "data"):
-            if hasattr(entry, attr):
-                raw = getattr(entry, attr)
-                if not raw:
-                    continue
-                if isinstance(raw, dict):
-                    return raw
-                try:
-                    return json.loads(raw)
-                except Exception:
-                    return {}
-        return {}
-
-    # metrics keys in the current/latest report
-    current_metrics: Dict[str, float] = {}
+    headers = {"ETag": job.etag, "Cache-Control": "private, no-cache"}
+    # only a render of exactly this content (same cache key) has a usable date
+    cached = pdf_cache.get(job.cache_key)
+    if cached is not None:
+        headers["Last-Modified"] = format_datetime(cached.last_modified.replace(tzinfo=timezone.utc), usegmt=True)
+    if _etag_matches(if_none_match, job.etag) or (
+        if_none_match is None
+        and cached is not None
+        and _not_modified_since(if_modified_since, cached.last_modified)
+    ):
+        return Response(status_code=304, headers=headers)
+
+    # ---- generate (or reuse) the PDF, with trend series for the sparklines ----
     try:
-        base = metadata.get("metrics") if isinstance(metadata.get("metrics"), dict) else metadata
-        for k, v in (base or {}).items():
-            if k == "ranges":
-                continue
-            try:
-                current_metrics[k] = float(v)
-            except Exception:
-                pass
+        pdf = cached or render_report_pdf(job)
     except Exception:
-        current_metrics = {}
+        logger.error("PDF generation failed", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to generate PDF.")
 
-    series_map: Dict[str, List[float]] = {k: [] for k in current_metrics.keys()}
-    for r in rows:
-        meta = _parse_meta(r)
-        src = meta.get("metrics") if isinstance(meta.get("metrics"), dict) else meta
-        for k in list(series_map.keys()):
-            try:
-                series_map[k].append(float(src.get(k)))
-            except Exception:
-                # keep alignment even if a value is missing (skip silently)
-                pass
-
-    # keep last few points for a compact sparkline
-    for k in series_map:
-        if len(series_map[k]) > 8:
-            series_map[k] = series_map[k][-8:]
-
-    # ---- generate the PDF (now with trend_series) ----
-    pdf_path = generate_summary_pdf(
-        doctor_summary=row.doctor_summary or getattr(row, "summary_doctor", "") or "",
-        patient_summary=row.patient_summary or getattr(row, "summary_patient", "") or "",
-        metadata=metadata,
-        user_id=user.id,
-        trend_series=series_map,  # ✅ this makes the PDF charts match the page
+    headers["ETag"] = pdf.etag  # differs from job.etag for an uncached fallback render
+    headers["Last-Modified"] = format_datetime(pdf.last_modified.replace(tzinfo=timezone.utc), usegmt=True)
+    headers["Content-Disposition"] = 'attachment; filename="Health_Summary.pdf"'
+    return Response(content=pdf.data, media_type="application/pdf", headers=headers)
+
+
+# -----------------------------------------------------------------------------
+# Export ALL of this user's reports as a streamed ZIP (PDFs + metrics.csv)
+# -----------------------------------------------------------------------------
+@router.get("/export/reports")
+def export_reports(
+    db: Session = Depends(get_db),
+    token: str = Depends(oauth2_scheme),
+):
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        username = payload.get("sub")
+        if not username:
+            raise HTTPException(status_code=401, detail="Invalid token")
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    user = db.query(User).filter(User.username == username).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    from app.models.history import ReportHistory  # local import
+
+    if db.query(ReportHistory.id).filter(ReportHistory.user_id == user.id).first() is None:
+        raise HTTPException(status_code=404, detail="No reports found for this user.")
+
+    # reports are read in keyset pages while the archive streams (own sessions, not this one)
+    return StreamingResponse(
+        iter_report_archive(iter_user_report_pdfs(user.id)),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="Health_Reports.zip"'},
     )
-    if not (isinstance(pdf_path, str) and os.path.exists(pdf_path)):
-        logger.error("PDF generation failed; path not created: %r", pdf_path)
+
+
+# -----------------------------------------------------------------------------
+# Compare several reports side by side in ONE PDF
+# -----------------------------------------------------------------------------
+@router.get("/compare-reports")
+def compare_reports(
+    report_ids: Optional[List[int]] = Query(None, description="Reports to compare; default: the most recent `last`."),
+    last: int = Query(3, ge=2, le=12),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    token: str = Depends(oauth2_scheme),
+):
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        username = payload.get("sub")
+        if not username:
+            raise HTTPException(status_code=401, detail="Invalid token")
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    user = db.query(User).filter(User.username == username).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    reports = load_comparison(db, user_id=user.id, report_ids=report_ids, last=last)
+    if len(reports) < 2:
+        raise HTTPException(status_code=404, detail="Need at least two reports to compare.")
+
+    # the ETag comes from the inputs, so a 304 never pays for a render
+    headers = {"ETag": comparison_etag(reports), "Cache-Control": "private, no-cache"}
+    if _etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    try:
+        pdf = render_comparison(reports)
+    except Exception:
+        logger.error("Comparison PDF generation failed", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to generate PDF.")
 
-    return FileResponse(
-        pdf_path,
-        media_type="application/pdf",
-        filename="Health_Summary.pdf",
-    )
+    headers["ETag"] = pdf.etag
+    headers["Content-Disposition"] = 'attachment; filename="Health_Comparison.pdf"'
+    return Response(content=pdf.data, media_type="application/pdf", headers=headers)
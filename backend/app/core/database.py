@@ -3,16 +3,24 @@
 from __future__ import annotations
 
 import os
-import json
+import time
+import asyncio
+import bisect
 import logging
-from typing import Optional, Dict, List
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, NamedTuple, Optional
 from datetime import datetime
 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, inspect, text
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table, Text, create_engine, event, insert, inspect, text
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 
+from app.utils import json_codec
+
 # -----------------------------------------------------------------------------
 # Engine / session
 # -----------------------------------------------------------------------------
@@ -21,17 +29,277 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("❌ DATABASE_URL is not set in the .env file.")
 
-engine = create_engine(DATABASE_URL)
+# Pool settings (ignored for in-memory SQLite, which has a single connection)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# MySQL drops idle connections after wait_timeout (8h by default); recycle well before
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1").lower() in ("1", "true", "yes")
+
+# SQLite mode (single-node deployments): DATABASE_URL=sqlite:///./health_trail.db
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "15000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+
+logger = logging.getLogger(__name__)
+
+
+class _PoolStats:
+    """Checkout wait times of one pool (exported by pool_stats())."""
+
+    # upper bounds (ms) of the wait histogram; the last bucket is open-ended
+    BUCKETS_MS = (1, 5, 25, 100, 500, 2000)
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.buckets = [0] * (len(self.BUCKETS_MS) + 1)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, timed_out: bool = False) -> None:
+        ms = seconds * 1000.0
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            self.buckets[bisect.bisect_left(self.BUCKETS_MS, ms)] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_ms_avg": round(1000.0 * self.wait_total / self.checkouts, 3) if self.checkouts else 0.0,
+                "wait_ms_max": round(1000.0 * self.wait_max, 3),
+                "wait_ms_histogram": {
+                    **{f"le_{b}": n for b, n in zip(self.BUCKETS_MS, self.buckets)},
+                    "inf": self.buckets[-1],
+                },
+            }
+
+
+class _TimedCheckoutMixin:
+    """Measures how long each checkout waits for a free connection."""
+
+    stats: _PoolStats
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except sa_exc.TimeoutError:
+            self.stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - start)
+        return conn
+
+
+class _InstrumentedQueuePool(_TimedCheckoutMixin, QueuePool):
+    stats = _PoolStats()
+
+
+class _InstrumentedAsyncQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    stats = _PoolStats()
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    return url.startswith("sqlite") and (":memory:" in url or url.rstrip("/").endswith("sqlite:"))
+
+
+def _pool_kwargs(url: str, poolclass) -> Dict[str, Any]:
+    if _is_memory_sqlite(url):
+        return {}
+    return {
+        "poolclass": poolclass,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def _connect_args(url: str) -> Dict[str, Any]:
+    if not url.startswith("sqlite"):
+        return {}
+    # pooled connections move between threads; busy waits happen in SQLite itself
+    return {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000.0}
+
+
+def _json_deserializer(raw: Any) -> Any:
+    # legacy TEXT metadata may hold non-JSON (e.g. a Python repr); read it as empty
+    try:
+        return json_codec.loads(raw)
+    except ValueError:
+        return None
+
+
+# JSON columns (report metadata) are encoded/decoded with orjson when installed
+_JSON_CODEC = {"json_serializer": json_codec.dumps, "json_deserializer": _json_deserializer}
+
+
+def _setup_sqlite(sync_engine, url: str) -> None:
+    """
+    Per-connection pragmas plus explicit transaction control: pysqlite's own
+    implicit BEGIN is disabled so that write transactions can start with
+    BEGIN IMMEDIATE and wait on busy_timeout. A deferred BEGIN that reads
+    first and writes later fails at once with "database is locked" if another
+    connection committed in between (busy_timeout cannot help: its snapshot is
+    stale), so every write path must opt in: begin_write() for Core writes,
+    WriteSessionLocal / get_write_db() for ORM sessions that write.
+    Plain SessionLocal sessions are for reads.
+    """
+
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_conn, _record):
+        dbapi_conn.isolation_level = None
+        cur = dbapi_conn.cursor()
+        if not _is_memory_sqlite(url):
+            cur.execute("PRAGMA journal_mode=WAL")  # readers never block the writer
+        cur.execute("PRAGMA synchronous=NORMAL")    # durable at checkpoints; safe with WAL
+        cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cur.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cur.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cur.execute("PRAGMA temp_store=MEMORY")
+        cur.execute("PRAGMA foreign_keys=ON")
+        cur.close()
+
+    @event.listens_for(sync_engine, "begin")
+    def _on_begin(conn):
+        opts = conn.get_execution_options()
+        if opts.get("isolation_level") == "AUTOCOMMIT":
+            return  # e.g. VACUUM, which cannot run inside a transaction
+        conn.exec_driver_sql("BEGIN IMMEDIATE" if opts.get("sqlite_immediate") else "BEGIN")
+
+
+engine = create_engine(
+    DATABASE_URL,
+    connect_args=_connect_args(DATABASE_URL),
+    **_JSON_CODEC,
+    **_pool_kwargs(DATABASE_URL, _InstrumentedQueuePool),
+)
+if IS_SQLITE:
+    _setup_sqlite(engine, DATABASE_URL)
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+# Sessions that write: on SQLite every transaction starts with BEGIN IMMEDIATE
+# (ignored by other backends)
+WriteSessionLocal = sessionmaker(bind=engine.execution_options(sqlite_immediate=True), autocommit=False, autoflush=False)
 Base = declarative_base()
 
-logger = logging.getLogger(__name__)
+# In-process single-writer queue for SQLite (one writer at a time per file anyway)
+_sqlite_write_lock = threading.Lock()
+
+
+@contextmanager
+def begin_write():
+    """
+    engine.begin() for write transactions. On SQLite, writers are serialized
+    in-process and start with BEGIN IMMEDIATE, so other processes wait on
+    busy_timeout rather than failing; elsewhere it is plain engine.begin().
+    """
+    if not IS_SQLITE:
+        with engine.begin() as conn:
+            yield conn
+        return
+    with _sqlite_write_lock:
+        with engine.connect() as conn:
+            conn.execution_options(sqlite_immediate=True)
+            with conn.begin():
+                yield conn
+
+
+# -----------------------------------------------------------------------------
+# Async engine / session (async endpoints). Created lazily so the async driver
+# (aiomysql / aiosqlite) is only needed when an async path is actually used.
+# -----------------------------------------------------------------------------
+_ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "mysql+mysqldb": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or (
+    _ASYNC_DRIVERS.get(DATABASE_URL.split("://", 1)[0], DATABASE_URL.split("://", 1)[0])
+    + "://"
+    + DATABASE_URL.split("://", 1)[1]
+)
+
+_async_engine = None
+_async_sessionmaker = None
+_async_lock = threading.Lock()
+
+
+def get_async_engine():
+    global _async_engine, _async_sessionmaker
+    if _async_engine is None:
+        with _async_lock:
+            if _async_engine is None:
+                from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+                _async_engine = create_async_engine(
+                    ASYNC_DATABASE_URL,
+                    connect_args=_connect_args(ASYNC_DATABASE_URL),
+                    **_JSON_CODEC,
+                    **_pool_kwargs(ASYNC_DATABASE_URL, _InstrumentedAsyncQueuePool),
+                )
+                if ASYNC_DATABASE_URL.startswith("sqlite"):
+                    _setup_sqlite(_async_engine.sync_engine, ASYNC_DATABASE_URL)
+                _async_sessionmaker = async_sessionmaker(_async_engine, expire_on_commit=False)
+    return _async_engine
+
+
+async def get_async_db():
+    get_async_engine()
+    async with _async_sessionmaker() as session:
+        yield session
+
+
+async def dispose_async_engine() -> None:
+    if _async_engine is not None:
+        await _async_engine.dispose()
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Utilization and checkout-wait metrics of the sync and async pools."""
+    out: Dict[str, Any] = {}
+    for name, eng in (("sync", engine), ("async", _async_engine and _async_engine.sync_engine)):
+        if eng is None:
+            continue
+        pool = eng.pool
+        item: Dict[str, Any] = {"pool": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            capacity = pool.size() + max(0, getattr(pool, "_max_overflow", 0))
+            item.update(
+                size=pool.size(),
+                checked_out=pool.checkedout(),
+                idle=pool.checkedin(),
+                overflow=max(0, pool.overflow()),
+                capacity=capacity,
+                utilization=round(pool.checkedout() / capacity, 3) if capacity else None,
+            )
+        if isinstance(pool, _TimedCheckoutMixin):
+            item.update(pool.stats.snapshot())
+        out[name] = item
+    return out
 
 
 def init_db():
+    """Create/patch the schema and cache the report_history insert plan (run once at startup)."""
     from app.models import user, history  # noqa: F401
     Base.metadata.create_all(bind=engine)
     _ensure_report_history_columns()
+    _reset_report_insert_plan()
+    _report_insert_plan()
 
 
 def get_db():
@@ -42,6 +310,15 @@ def get_db():
         db.close()
 
 
+def get_write_db():
+    """get_db() for routes that read and then write in one transaction (see WriteSessionLocal)."""
+    db = WriteSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
 # -----------------------------------------------------------------------------
 # Best-effort patch for convenience columns (safe no-ops if present)
 # -----------------------------------------------------------------------------
@@ -55,19 +332,35 @@ def _ensure_report_history_columns() -> None:
             Base.metadata.create_all(bind=engine)
 
         cols = {c["name"] for c in insp.get_columns(table_name)}
+        # dialect-specific type names (LONGTEXT only exists on MySQL)
+        datetime_type = DateTime().compile(dialect=engine.dialect)
+        long_text = "LONGTEXT" if engine.dialect.name == "mysql" else Text().compile(dialect=engine.dialect)
         ddl: List[str] = []
         if "uploaded_at" not in cols:
-            ddl.append(f"ALTER TABLE {table_name} ADD COLUMN uploaded_at DATETIME NULL")
+            ddl.append(f"ALTER TABLE {table_name} ADD COLUMN uploaded_at {datetime_type} NULL")
         if "filename" not in cols:
             ddl.append(f"ALTER TABLE {table_name} ADD COLUMN filename VARCHAR(255) NULL")
         # These are optional; original schema may already have summary_doctor/summary_patient
         if "doctor_summary" not in cols:
-            ddl.append(f"ALTER TABLE {table_name} ADD COLUMN doctor_summary LONGTEXT NULL")
+            ddl.append(f"ALTER TABLE {table_name} ADD COLUMN doctor_summary {long_text} NULL")
         if "patient_summary" not in cols:
-            ddl.append(f"ALTER TABLE {table_name} ADD COLUMN patient_summary LONGTEXT NULL")
+            ddl.append(f"ALTER TABLE {table_name} ADD COLUMN patient_summary {long_text} NULL")
+        if "archived_at" not in cols:
+            ddl.append(f"ALTER TABLE {table_name} ADD COLUMN archived_at {datetime_type} NULL")
+        if "summary_model" not in cols:
+            ddl.append(f"ALTER TABLE {table_name} ADD COLUMN summary_model VARCHAR(128) NULL")
+        if "summary_prompt_version" not in cols:
+            ddl.append(f"ALTER TABLE {table_name} ADD COLUMN summary_prompt_version VARCHAR(32) NULL")
+        if "summary_skipped_at" not in cols:
+            ddl.append(f"ALTER TABLE {table_name} ADD COLUMN summary_skipped_at {datetime_type} NULL")
+        if "content_hash" not in cols:
+            ddl.append(f"ALTER TABLE {table_name} ADD COLUMN content_hash VARCHAR(64) NULL")
+            ddl.append(f"CREATE INDEX ix_report_history_user_hash ON {table_name} (user_id, content_hash)")
+        if "ix_report_history_user_time" not in {ix["name"] for ix in insp.get_indexes(table_name)}:
+            ddl.append(f"CREATE INDEX ix_report_history_user_time ON {table_name} (user_id, uploaded_at, id)")
 
         if ddl:
-            with engine.begin() as conn:
+            with begin_write() as conn:
                 for stmt in ddl:
                     conn.execute(text(stmt))
             logger.info("🔧 ReportHistory table patched: %s", " | ".join(ddl))
@@ -75,85 +368,272 @@ def _ensure_report_history_columns() -> None:
         logger.warning("⚠️ Could not verify/patch ReportHistory columns: %s", e)
 
 
+def migrate_report_metadata_to_json(clear_invalid: bool = False) -> str:
+    """
+    Convert report_history.report_metadata from TEXT to a native JSON column
+    (MySQL JSON / PostgreSQL JSONB). Optional: MetadataJSON reads and writes
+    both. Rows whose text is not valid JSON (already read as empty metadata)
+    block the conversion unless clear_invalid=True, which sets them to NULL.
+    Returns a short description of what was done.
+    """
+    from app.models.history import ReportHistory  # local import
+    table_name = ReportHistory.__tablename__
+    dialect = engine.dialect.name
+
+    with engine.connect() as conn:
+        col = {c["name"]: c for c in inspect(conn).get_columns(table_name)}.get("report_metadata")
+    if col is None:
+        return "report_metadata column not found"
+    current = str(col["type"]).upper()
+    if dialect not in ("mysql", "postgresql"):
+        return f"{dialect} has no native JSON column type; keeping {current}"
+    if current in ("JSON", "JSONB"):
+        return f"report_metadata is already {current}"
+
+    with begin_write() as conn:
+        if dialect == "mysql":
+            invalid = conn.execute(text(
+                f"SELECT COUNT(*) FROM {table_name} "
+                "WHERE report_metadata IS NOT NULL AND JSON_VALID(report_metadata) = 0"
+            )).scalar()
+            if invalid and not clear_invalid:
+                raise ValueError(f"{invalid} rows hold invalid JSON metadata (use clear_invalid)")
+            if invalid:
+                conn.execute(text(
+                    f"UPDATE {table_name} SET report_metadata = NULL "
+                    "WHERE report_metadata IS NOT NULL AND JSON_VALID(report_metadata) = 0"
+                ))
+            conn.execute(text(f"UPDATE {table_name} SET report_metadata = NULL WHERE report_metadata = ''"))
+            conn.execute(text(f"ALTER TABLE {table_name} MODIFY report_metadata JSON NULL"))
+        else:
+            conn.execute(text(
+                f"ALTER TABLE {table_name} ALTER COLUMN report_metadata TYPE JSONB "
+                "USING NULLIF(report_metadata, '')::jsonb"
+            ))
+    _reset_report_insert_plan()
+    logger.info("🔧 report_metadata converted to native JSON (%s)", dialect)
+    return f"report_metadata converted from {current} to {'JSON' if dialect == 'mysql' else 'JSONB'}"
+
+
 # -----------------------------------------------------------------------------
 # Robust insert that satisfies legacy + new schemas
+#  - the column set is reflected once (init_db / first insert) and the INSERT
+#    statement is built once; each upload is a single INSERT, no metadata queries
 # -----------------------------------------------------------------------------
+# Which report field feeds each known column; ALL existing variants are filled
+# (legacy schemas may have NOT NULL summary_doctor/summary_patient etc.)
+_REPORT_COLUMN_SOURCES = {
+    "user_id": "user_id",
+    "uploaded_at": "uploaded_at",
+    "filename": "filename",
+    "content_hash": "content_hash",
+    "doctor_summary": "doctor_summary",
+    "summary_doctor": "doctor_summary",
+    "patient_summary": "patient_summary",
+    "summary_patient": "patient_summary",
+    "summary_model": "summary_model",
+    "summary_prompt_version": "summary_prompt_version",
+    "report_metadata": "metadata",
+    "metadata_json": "metadata",
+    "metadata": "metadata",
+    "report_data": "metadata",
+    "meta": "metadata",
+    "data": "metadata",
+}
+
+
+class _ReportInsertPlan(NamedTuple):
+    columns: List[str]
+    insert: Any                        # single row / plain executemany
+    insert_returning: Optional[Any]    # executemany + RETURNING id, if the backend supports it
+
+
+_insert_plan: Optional[_ReportInsertPlan] = None
+_insert_plan_lock = threading.Lock()
+
+
+def _build_report_insert_plan() -> _ReportInsertPlan:
+    from app.models.history import MetadataJSON, ReportHistory  # local import
+    table_name = getattr(ReportHistory, "__tablename__", "report_history")
+
+    with engine.connect() as conn:
+        cols_info = {c["name"]: c for c in inspect(conn).get_columns(table_name)}
+    columns = [c for c in _REPORT_COLUMN_SOURCES if c in cols_info]
+
+    # Sanity check: a NOT NULL column we don't know how to fill would fail every insert
+    for name, info in cols_info.items():
+        if (
+            name not in columns
+            and not info.get("nullable", True)
+            and info.get("default") is None
+            and not info.get("autoincrement")
+            and name != "id"
+        ):
+            logger.error("❌ NOT NULL column %r exists but wasn't included in insert.", name)
+
+    # private MetaData: the live column set may differ from the ORM model.
+    # Metadata columns bind dicts through MetadataJSON (native JSON or text).
+    tbl = Table(
+        table_name,
+        MetaData(),
+        Column("id", Integer, primary_key=True),
+        *[
+            Column(c, MetadataJSON() if _REPORT_COLUMN_SOURCES[c] == "metadata" else cols_info[c]["type"])
+            for c in columns
+        ],
+    )
+    returning = None
+    if engine.dialect.insert_executemany_returning_sort_by_parameter_order:
+        returning = insert(tbl).returning(tbl.c.id, sort_by_parameter_order=True)
+    return _ReportInsertPlan(columns=columns, insert=insert(tbl), insert_returning=returning)
+
+
+def _report_insert_plan() -> _ReportInsertPlan:
+    global _insert_plan
+    if _insert_plan is None:
+        with _insert_plan_lock:
+            if _insert_plan is None:
+                _insert_plan = _build_report_insert_plan()
+    return _insert_plan
+
+
+def _reset_report_insert_plan() -> None:
+    """Forget the cached column set (after DDL)."""
+    global _insert_plan
+    with _insert_plan_lock:
+        _insert_plan = None
+
+
 def store_report_in_db(
-    db: Session,
     user_id: int,
     doctor_summary: str,
     patient_summary: str,
     metadata: Optional[dict] = None,
     filename: Optional[str] = None,   # ✅ NEW: persist the uploaded filename
+    ranges: Optional[dict] = None,    # normal bands, used for report_metric.status
+    summary_model: Optional[str] = None,
+    summary_prompt_version: Optional[str] = None,
 ):
     """
     Insert a row into report_history using the actual columns present.
     Fills BOTH legacy names (summary_doctor/summary_patient) and new names
     (doctor_summary/patient_summary) if they exist, and always fills a
     metadata column if any of the known names exists.
+    The per-metric rows in report_metric and the user's trend aggregates
+    are written in the same transaction.
+    Runs in its own write transaction (begin_write), not in a caller's session.
+    Returns the new row id.
     """
-    from app.models.history import ReportHistory  # local import
+    return store_reports_in_db(
+        [
+            {
+                "user_id": user_id,
+                "doctor_summary": doctor_summary,
+                "patient_summary": patient_summary,
+                "metadata": metadata,
+                "filename": filename,
+                "ranges": ranges,
+                "summary_model": summary_model,
+                "summary_prompt_version": summary_prompt_version,
+            }
+        ],
+    )[0]
 
-    _ensure_report_history_columns()
 
-    insp = inspect(engine)
-    table_name = getattr(ReportHistory, "__tablename__", "report_history")
-    cols_info = {c["name"]: c for c in insp.get_columns(table_name)}
-    cols = set(cols_info.keys())
+def store_reports_in_db(reports: List[Dict[str, Any]]) -> List[int]:
+    """
+    Batch form of store_report_in_db: every report (dict with the same keyword
+    names, plus optional uploaded_at and content_hash) is inserted in ONE transaction.
+    report_history rows go in as one executemany with RETURNING id where the
+    backend supports it (SQLAlchemy batches it into multi-row INSERTs when it
+    can keep parameter order, e.g. PostgreSQL); otherwise (MySQL) rows are
+    inserted one by one to read each lastrowid. report_metric rows are always
+    a single executemany.
+    Returns the new ids in input order.
+    """
+    if not reports:
+        return []
+    plan = _report_insert_plan()
+    now = datetime.utcnow()
+    params = _report_params(plan, reports, now)
 
-    insert_cols: List[str] = []
-    params: Dict[str, object] = {}
+    with begin_write() as conn:
+        ids = _insert_reports(conn, plan, reports, params, now)
+    _invalidate_trend_cache(reports)
+    return ids
 
-    def add(col: str, value: object):
-        if col in cols:
-            insert_cols.append(col)
-            params[col] = value
 
-    # Required
-    add("user_id", user_id)
+async def store_reports_in_db_async(reports: List[Dict[str, Any]]) -> List[int]:
+    """
+    store_reports_in_db on the async engine (same statements, same transaction
+    scope). On SQLite it goes through the sync single-writer path in a thread.
+    """
+    if not reports:
+        return []
+    if IS_SQLITE:
+        return await asyncio.to_thread(store_reports_in_db, reports)
+    plan = _report_insert_plan()
+    now = datetime.utcnow()
+    params = _report_params(plan, reports, now)
+    async with get_async_engine().begin() as conn:
+        ids = await conn.run_sync(_insert_reports, plan, reports, params, now)
+    _invalidate_trend_cache(reports)
+    return ids
 
-    # Common optional
-    add("uploaded_at", datetime.utcnow())
-    add("filename", filename)  # ✅ save the filename if the column exists
 
-    # Doctor/patient — write to ANY that exist to satisfy NOT NULL legacy columns
-    for cand in ["doctor_summary", "summary_doctor"]:
-        add(cand, str(doctor_summary))
-    for cand in ["patient_summary", "summary_patient"]:
-        add(cand, str(patient_summary))
+def _report_params(plan: _ReportInsertPlan, reports: List[Dict[str, Any]], now: datetime) -> List[Dict[str, Any]]:
+    params: List[Dict[str, Any]] = []
+    for r in reports:
+        values = {
+            "user_id": r["user_id"],
+            "uploaded_at": r.get("uploaded_at") or now,
+            "filename": r.get("filename"),
+            "content_hash": r.get("content_hash"),
+            "doctor_summary": r.get("doctor_summary"),
+            "patient_summary": r.get("patient_summary"),
+            "summary_model": r.get("summary_model"),
+            "summary_prompt_version": r.get("summary_prompt_version"),
+            "metadata": r.get("metadata") or {},
+        }
+        params.append({c: values[_REPORT_COLUMN_SOURCES[c]] for c in plan.columns})
+    return params
 
-    # Metadata variants — write to ALL that exist
-    meta_json = json.dumps(metadata or {})
-    for cand in ["report_metadata", "metadata_json", "metadata", "report_data", "meta", "data"]:
-        add(cand, meta_json)
 
-    # Sanity check: if DB has a NOT NULL column among our targets that we didn't include,
-    # log loudly (extremely unlikely now that we fill ALL we find).
-    for name, info in cols_info.items():
-        lower = name.lower()
-        if lower in {
-            "doctor_summary", "summary_doctor",
-            "patient_summary", "summary_patient",
-            "report_metadata", "metadata_json", "metadata", "report_data", "meta", "data"
-        } and not info.get("nullable", True) and name not in insert_cols:
-            logger.error("❌ NOT NULL column %r exists but wasn't included in insert.", name)
+def _insert_reports(conn, plan: _ReportInsertPlan, reports, params, now: datetime) -> List[int]:
+    from app.models.history import ReportMetric  # local import
+    from app.services.metric_store import build_metric_rows
+    from app.services.trend_aggregates import apply_metric_rows
+
+    if len(params) == 1:
+        ids = [conn.execute(plan.insert, params[0]).lastrowid]
+    elif plan.insert_returning is not None:
+        ids = [row[0] for row in conn.execute(plan.insert_returning, params)]
+    else:
+        ids = [conn.execute(plan.insert, p).lastrowid for p in params]
 
-    # Build/execute INSERT
-    placeholders = ", ".join([f":{c}" for c in insert_cols])
-    cols_sql = ", ".join(insert_cols)
-    sql = text(f"INSERT INTO {table_name} ({cols_sql}) VALUES ({placeholders})")
+    metric_rows: List[Dict[str, Any]] = []
+    for report_id, r in zip(ids, reports):
+        metadata = r.get("metadata") if isinstance(r.get("metadata"), dict) else None
+        metric_rows.extend(
+            build_metric_rows(report_id, r["user_id"], metadata, r.get("uploaded_at") or now, r.get("ranges"))
+        )
+    if metric_rows:
+        conn.execute(ReportMetric.__table__.insert(), metric_rows)
+        apply_metric_rows(conn, metric_rows)
+    return ids
 
-    with engine.begin() as conn:
-        conn.execute(sql, params)
 
-    return None
+def _invalidate_trend_cache(reports: List[Dict[str, Any]]) -> None:
+    from app.services.trend_cache import trend_cache
+    for user_id in {r["user_id"] for r in reports}:
+        trend_cache.invalidate(user_id)
 
 
 def get_latest_report_for_user(db: Session, user_id: int):
-    from app.models.history import ReportHistory  # local import
+    from app.models.history import ReportHistory, history_order  # local import
     return (
         db.query(ReportHistory)
         .filter(ReportHistory.user_id == user_id)
-        .order_by(ReportHistory.id.desc())
+        .order_by(*history_order(descending=True))
         .first()
     )
@@ -1,15 +1,21 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse
 
 # Routers
 from app.api import auth
 from app.api.routes import router as api_router  # <-- single API router
-from app.core.database import init_db
+from app.core.database import init_db, dispose_async_engine
+from app.services.render_pool import start_render_pool, shutdown_render_pool
+from app.services.prerender import shutdown_prerender
+from app.utils.json_codec import HAS_ORJSON
 
 app = FastAPI(
     title="Health Trail API",
     description="RAG-based Health Report Analyzer",
     version="1.0",
+    # orjson serializes the large history/trend payloads several times faster
+    default_response_class=ORJSONResponse if HAS_ORJSON else JSONResponse,
 )
 
 app.add_middleware(
@@ -21,6 +27,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Last-Modified"],
 )
 
 # Ensure tables exist
@@ -29,3 +36,20 @@ init_db()
 # Register routes (only one /api prefix)
 app.include_router(auth.router, prefix="/auth", tags=["Auth"])
 app.include_router(api_router, prefix="/api", tags=["API"])
+
+
+# PDF render workers (WeasyPrint never runs inside API workers)
+@app.on_event("startup")
+def _start_render_pool():
+    start_render_pool()
+
+
+@app.on_event("shutdown")
+def _stop_render_pool():
+    shutdown_prerender()
+    shutdown_render_pool()
+
+
+@app.on_event("shutdown")
+async def _close_async_engine():
+    await dispose_async_engine()
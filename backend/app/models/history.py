@@ -1,7 +1,43 @@
 # app/models/history.py
-from sqlalchemy import Column, Integer, String, DateTime, Text, func, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, DateTime, Text, Float, LargeBinary, func, ForeignKey, Index, UniqueConstraint, and_, or_
+from sqlalchemy.orm import relationship, synonym
+from sqlalchemy.types import TypeDecorator
 from app.core.database import Base
+from app.utils.json_codec import dumps, loads_dict
+
+# dialects where MetadataJSON is a native JSON column
+_NATIVE_JSON_DIALECTS = ("mysql", "postgresql")
+
+
+class MetadataJSON(TypeDecorator):
+    """
+    Report metadata as a dict. A native JSON column on MySQL (JSON) and
+    PostgreSQL (JSONB), encoded by the engine's json_serializer (orjson, see
+    core/database.py); JSON text everywhere else. Also reads and writes
+    legacy TEXT columns, and gives None for empty ones.
+    """
+    impl = Text
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "mysql":
+            from sqlalchemy.dialects.mysql import JSON
+            return dialect.type_descriptor(JSON(none_as_null=True))
+        if dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import JSONB
+            return dialect.type_descriptor(JSONB(none_as_null=True))
+        return dialect.type_descriptor(Text())
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, (str, bytes)):
+            value = loads_dict(value)
+        return value if dialect.name in _NATIVE_JSON_DIALECTS else dumps(value)
+
+    def process_result_value(self, value, dialect):
+        return loads_dict(value) if value else None
+
 
 class ReportHistory(Base):
     __tablename__ = "report_history"
@@ -13,14 +49,191 @@ class ReportHistory(Base):
     uploaded_at = Column(DateTime, nullable=False, server_default=func.now())
     filename = Column(String(255), nullable=True)
 
-    doctor_summary = Column(Text, nullable=True)
-    patient_summary = Column(Text, nullable=True)
+    # Large text columns. Once a row is archived (archived_at set) they are
+    # NULL here and served transparently from report_archive, see below.
+    _doctor_summary = Column("doctor_summary", Text, nullable=True)
+    _patient_summary = Column("patient_summary", Text, nullable=True)
+    # which LLM and prompt version wrote the summaries (NULL = unknown / none)
+    summary_model = Column(String(128), nullable=True)
+    summary_prompt_version = Column(String(32), nullable=True)
+    # set when re-summarization found no metrics to summarize (provenance stays as is)
+    summary_skipped_at = Column(DateTime, nullable=True)
+
+    # metrics (and ranges) of the report, as a dict; read it via
+    # app.utils.json_codec.report_metadata() to always get a dict
+    _report_metadata = Column("report_metadata", MetadataJSON, nullable=True)
+
+    archived_at = Column(DateTime, nullable=True)
 
-    # JSON (string) of metrics for trend charts
-    report_metadata = Column(Text, nullable=True)
+    # sha256 of the source PDF (bulk ingestion skips files a user already has)
+    content_hash = Column(String(64), nullable=True)
 
     # backref for ORM convenience (matches User.reports)
     user = relationship("User", back_populates="reports")
+    archive = relationship("ReportArchive", uselist=False, lazy="select", passive_deletes=True)
+
+    def _archived_field(self, name: str):
+        if self.archived_at is None or self.archive is None:
+            return None
+        cache = self.__dict__.get("_archive_fields")
+        if cache is None:
+            from app.utils.archive_codec import decompress_fields  # local import
+            cache = self.__dict__["_archive_fields"] = decompress_fields(self.archive.payload)
+        return cache.get(name)
+
+    def _get_doctor_summary(self):
+        return self._doctor_summary if self._doctor_summary is not None else self._archived_field("doctor_summary")
+
+    def _set_doctor_summary(self, value):
+        self._doctor_summary = value
+
+    def _get_patient_summary(self):
+        return self._patient_summary if self._patient_summary is not None else self._archived_field("patient_summary")
+
+    def _set_patient_summary(self, value):
+        self._patient_summary = value
+
+    def _get_report_metadata(self):
+        if self._report_metadata is not None:
+            return self._report_metadata
+        archived = self._archived_field("report_metadata")
+        return loads_dict(archived) if archived else None
+
+    def _set_report_metadata(self, value):
+        self._report_metadata = value
+
+    doctor_summary = synonym("_doctor_summary", descriptor=property(_get_doctor_summary, _set_doctor_summary))
+    patient_summary = synonym("_patient_summary", descriptor=property(_get_patient_summary, _set_patient_summary))
+    report_metadata = synonym("_report_metadata", descriptor=property(_get_report_metadata, _set_report_metadata))
+
+    __table_args__ = (
+        Index("ix_report_history_user_hash", "user_id", "content_hash"),
+        # a user's reports in history order (latest report, keyset pages)
+        Index("ix_report_history_user_time", "user_id", "uploaded_at", "id"),
+    )
 
     def __repr__(self) -> str:
         return f"<ReportHistory id={self.id} user_id={self.user_id}>"
+
+
+# History order: by report date (uploaded_at, which imports and bulk ingestion
+# may backdate), then id. Used wherever "latest" or "oldest first" matters.
+def history_order(descending: bool = False):
+    if descending:
+        return ReportHistory.uploaded_at.desc(), ReportHistory.id.desc()
+    return ReportHistory.uploaded_at.asc(), ReportHistory.id.asc()
+
+
+def history_keyset(uploaded_at, report_id: int, before: bool):
+    """Reports strictly before / after (uploaded_at, report_id) in history order."""
+    if before:
+        return or_(
+            ReportHistory.uploaded_at < uploaded_at,
+            and_(ReportHistory.uploaded_at == uploaded_at, ReportHistory.id < report_id),
+        )
+    return or_(
+        ReportHistory.uploaded_at > uploaded_at,
+        and_(ReportHistory.uploaded_at == uploaded_at, ReportHistory.id > report_id),
+    )
+
+
+class ReportArchive(Base):
+    """
+    Cold storage for old report_history rows: their summaries and metadata as
+    one compressed payload (codec-prefixed, see app/utils/archive_codec.py).
+    Written by compact_report_history.py; read through ReportHistory's
+    doctor_summary / patient_summary / report_metadata attributes.
+    """
+    __tablename__ = "report_archive"
+
+    report_id = Column(Integer, ForeignKey("report_history.id", ondelete="CASCADE"), primary_key=True)
+    payload = Column(LargeBinary(length=2 ** 24 - 1), nullable=False)  # MEDIUMBLOB on MySQL
+    raw_bytes = Column(Integer, nullable=False, default=0)
+    archived_at = Column(DateTime, nullable=False, server_default=func.now())
+
+
+class ReportMetric(Base):
+    """
+    One row per (report, metric): the normalized time series behind trends and
+    sparklines. Filled on insert by store_report_in_db and backfilled from
+    report_metadata by backfill_report_metrics.py.
+    """
+    __tablename__ = "report_metric"
+
+    id = Column(Integer, primary_key=True)
+    report_id = Column(Integer, ForeignKey("report_history.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+
+    metric = Column(String(64), nullable=False)
+    value = Column(Float, nullable=False)
+    unit = Column(String(32), nullable=True)
+    status = Column(String(16), nullable=True)   # low / normal / high
+    measured_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        # serves "last N points of metric M for user U" as an index range scan
+        Index("ix_report_metric_user_metric_time", "user_id", "metric", "measured_at"),
+    )
+
+    def __repr__(self) -> str:
+        return f"<ReportMetric report_id={self.report_id} {self.metric}={self.value}>"
+
+
+class MetricAggregate(Base):
+    """
+    Running per-user, per-metric statistics, updated incrementally in the same
+    transaction as each report insert (see services/trend_aggregates.py).
+    The sum_* columns are the least-squares accumulators behind slope_per_day,
+    with x = days since first_at.
+    """
+    __tablename__ = "report_metric_agg"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    metric = Column(String(64), nullable=False)
+
+    count = Column(Integer, nullable=False, default=0)
+    min_value = Column(Float, nullable=True)
+    max_value = Column(Float, nullable=True)
+    mean_value = Column(Float, nullable=True)
+    last_value = Column(Float, nullable=True)
+    last_status = Column(String(16), nullable=True)
+    unit = Column(String(32), nullable=True)
+    first_at = Column(DateTime, nullable=True)
+    last_at = Column(DateTime, nullable=True)
+
+    sum_x = Column(Float, nullable=False, default=0.0)
+    sum_y = Column(Float, nullable=False, default=0.0)
+    sum_xx = Column(Float, nullable=False, default=0.0)
+    sum_xy = Column(Float, nullable=False, default=0.0)
+    slope_per_day = Column(Float, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "metric", name="uq_report_metric_agg_user_metric"),
+    )
+
+    def __repr__(self) -> str:
+        return f"<MetricAggregate user_id={self.user_id} {self.metric} n={self.count}>"
+
+
+class MetricCohortSketch(Base):
+    """
+    Population distribution of one metric within one cohort (each user's
+    latest value), as a serialized QuantileSketch (app/utils/quantile_sketch.py).
+    Rebuilt offline by compute_cohort_stats.py.
+    """
+    __tablename__ = "metric_cohort_sketch"
+
+    id = Column(Integer, primary_key=True)
+    metric = Column(String(64), nullable=False)
+    cohort = Column(String(32), nullable=False, default="all")
+    count = Column(Integer, nullable=False, default=0)
+    sketch = Column(Text, nullable=False)
+    updated_at = Column(DateTime, nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("metric", "cohort", name="uq_metric_cohort_sketch"),
+    )
+
+    def __repr__(self) -> str:
+        return f"<MetricCohortSketch {self.metric}/{self.cohort} n={self.count}>"
@@ -0,0 +1,280 @@
+# app/services/chart_cache.py
+"""
+Content-addressed chart store shared by all users and uploads.
+
+A band-and-marker chart depends only on (metric, value, min, max, unit), so
+the file name is a hash of exactly those inputs. The same "Glucose 95" chart
+is rendered once and every later upload gets the same stable URL.
+
+Rendered files are evicted LRU once the store passes CHART_CACHE_MAX_BYTES.
+The inputs of every chart are kept next to it (<key>.json, a few dozen
+bytes) in a separate LRU bounded by CHART_INPUTS_MAX_BYTES, so a URL that
+was handed out keeps working long after its chart was evicted: the chart is
+rendered again on its next request. Only once its inputs are evicted too
+does the URL stop resolving.
+"""
+from __future__ import annotations
+
+import os
+import json
+import base64
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from app.services.chart_generator import render_chart_svg, _render_chart_png
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------
+# Settings
+# -----------------------------
+CHART_CACHE_DIR = os.getenv("CHART_CACHE_DIR", os.path.join("app", "charts", "shared"))
+CHART_CACHE_MAX_BYTES = int(os.getenv("CHART_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Bound on the <key>.json input files (~100 bytes each: about 600k chart URLs)
+CHART_INPUTS_MAX_BYTES = int(os.getenv("CHART_INPUTS_MAX_BYTES", str(64 * 1024 * 1024)))
+CHART_URL_PREFIX = os.getenv("CHART_URL_PREFIX", "/api/charts").rstrip("/")
+# Charts at or below this size may be returned inline as data: URIs
+CHART_INLINE_MAX_BYTES = int(os.getenv("CHART_INLINE_MAX_BYTES", str(8 * 1024)))
+
+# Bump whenever render_chart_svg / _render_chart_png output changes,
+# so old files are never served for the new design.
+_RENDER_VERSION = "1"
+
+_FORMATS = ("svg", "png")
+_INPUTS = "json"
+MEDIA_TYPES = {"svg": "image/svg+xml", "png": "image/png"}
+
+
+# -----------------------------
+# Keys / paths
+# -----------------------------
+def chart_key(metric: str, value: float, rmin: float, rmax: float, unit: str = "", fmt: str = "svg") -> str:
+    """Stable hash of the chart inputs (floats normalised via repr)."""
+    payload = json.dumps(
+        [_RENDER_VERSION, fmt, metric, repr(float(value)), repr(float(rmin)), repr(float(rmax)), unit or ""],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def _path_for(key: str, fmt: str) -> str:
+    return os.path.join(CHART_CACHE_DIR, key[:2], f"{key}.{fmt}")
+
+
+def _inputs_path(key: str) -> str:
+    return _path_for(key, _INPUTS)
+
+
+def _write_atomic(path: str, write) -> None:
+    """write(tmp_path) then os.replace, so readers never see a partial file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def chart_url(key: str, fmt: str = "svg") -> str:
+    return f"{CHART_URL_PREFIX}/{key}.{fmt}"
+
+
+def parse_chart_name(name: str) -> Optional[Tuple[str, str]]:
+    """'<key>.<fmt>' -> (key, fmt), or None if it is not a valid chart name."""
+    return _parse_name(name, _FORMATS)
+
+
+def _parse_name(name: str, formats: Tuple[str, ...]) -> Optional[Tuple[str, str]]:
+    key, _, fmt = (name or "").partition(".")
+    if fmt not in formats or len(key) != 32:
+        return None
+    if any(c not in "0123456789abcdef" for c in key):
+        return None
+    return key, fmt
+
+
+# -----------------------------
+# LRU index (size-bounded)
+# -----------------------------
+class _ChartIndex:
+    """
+    In-process LRU of {(key, fmt): size} over the files with the given
+    extensions. Files on disk are the source of truth; the index only decides
+    what to evict once they grow past max_bytes.
+    """
+
+    def __init__(self, root: str, max_bytes: int, formats: Tuple[str, ...] = _FORMATS):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.formats = formats
+        self.total = 0
+        self._entries: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _load(self) -> None:
+        # Seed from disk, oldest first, so restarts keep the LRU order roughly intact
+        found = []
+        if os.path.isdir(self.root):
+            for sub in os.listdir(self.root):
+                subdir = os.path.join(self.root, sub)
+                if not os.path.isdir(subdir):
+                    continue
+                for fname in os.listdir(subdir):
+                    parsed = _parse_name(fname, self.formats)
+                    if not parsed:
+                        continue
+                    try:
+                        st = os.stat(os.path.join(subdir, fname))
+                    except OSError:
+                        continue
+                    found.append((st.st_mtime, parsed, st.st_size))
+        for _, entry, size in sorted(found):
+            self._entries[entry] = size
+            self.total += size
+        self._loaded = True
+
+    def touch(self, key: str, fmt: str) -> bool:
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            entry = (key, fmt)
+            if entry in self._entries:
+                self._entries.move_to_end(entry)
+                return True
+            return False
+
+    def add(self, key: str, fmt: str, size: int) -> None:
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            entry = (key, fmt)
+            if entry in self._entries:
+                self.total -= self._entries.pop(entry)
+            self._entries[entry] = size
+            self.total += size
+            while self.total > self.max_bytes and len(self._entries) > 1:
+                (old_key, old_fmt), old_size = self._entries.popitem(last=False)
+                self.total -= old_size
+                try:
+                    os.remove(_path_for(old_key, old_fmt))
+                except OSError:
+                    pass
+
+
+_index = _ChartIndex(CHART_CACHE_DIR, CHART_CACHE_MAX_BYTES)
+_inputs_index = _ChartIndex(CHART_CACHE_DIR, CHART_INPUTS_MAX_BYTES, (_INPUTS,))
+
+
+# -----------------------------
+# Public API
+# -----------------------------
+def get_or_render_chart(
+    metric: str,
+    value: float,
+    rmin: float,
+    rmax: float,
+    unit: str = "",
+    fmt: str = "svg",
+) -> str:
+    """
+    Return the content key for this chart, rendering it only if no identical
+    chart exists yet. Writes go through a temp file + os.replace, so concurrent
+    uploads never observe a half-written chart.
+    """
+    key = chart_key(metric, value, rmin, rmax, unit, fmt)
+    inputs = [metric, float(value), float(rmin), float(rmax), unit or ""]
+    # a URL handed out (again) now must outlive its chart: keep the inputs fresh
+    _keep_inputs(key, fmt, inputs)
+    if _index.touch(key, fmt):
+        return key
+
+    path = _path_for(key, fmt)
+    if os.path.exists(path):
+        # rendered by another worker process
+        _index.add(key, fmt, os.path.getsize(path))
+        return key
+
+    _render(key, fmt, inputs)
+    return key
+
+
+def _keep_inputs(key: str, fmt: str, inputs: list) -> None:
+    """Mark the chart's input file as recently used, writing it if it is missing or was evicted."""
+    if _inputs_index.touch(key, _INPUTS):
+        return
+    path = _inputs_path(key)
+    if not os.path.exists(path):
+        _write_atomic(path, lambda tmp: _write_inputs(tmp, fmt, inputs))
+    _inputs_index.add(key, _INPUTS, os.path.getsize(path))
+
+
+def _write_inputs(tmp: str, fmt: str, inputs: list) -> None:
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"fmt": fmt, "inputs": inputs}, f, ensure_ascii=False)
+
+
+def _render(key: str, fmt: str, inputs: list) -> str:
+    metric, value, rmin, rmax, unit = inputs
+
+    def _write(tmp: str) -> None:
+        if fmt == "png":
+            _render_chart_png(metric, value, rmin, rmax, unit, tmp)
+        else:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(render_chart_svg(metric, value, rmin, rmax, unit))
+
+    path = _path_for(key, fmt)
+    _write_atomic(path, _write)
+    _index.add(key, fmt, os.path.getsize(path))
+    return path
+
+
+def _rerender(key: str, fmt: str) -> Optional[str]:
+    """Render an evicted chart again from its stored inputs; None if they are unknown."""
+    try:
+        with open(_inputs_path(key), "r", encoding="utf-8") as f:
+            stored = json.load(f)
+        inputs = stored["inputs"]
+        if stored.get("fmt") != fmt or chart_key(*inputs, fmt=fmt) != key:
+            return None
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    logger.info("📊 Re-rendering evicted chart %s.%s", key, fmt)
+    _inputs_index.touch(key, _INPUTS)
+    return _render(key, fmt, inputs)
+
+
+def chart_file_path(key: str, fmt: str) -> Optional[str]:
+    """
+    Filesystem path of a cached chart (re-rendered if it was evicted), or None
+    if no such chart was ever rendered.
+    """
+    path = _path_for(key, fmt)
+    if not os.path.exists(path):
+        return _rerender(key, fmt)
+    _index.touch(key, fmt)
+    _inputs_index.touch(key, _INPUTS)
+    return path
+
+
+def chart_data_uri(url: str, max_bytes: int = CHART_INLINE_MAX_BYTES) -> Optional[str]:
+    """
+    data: URI for a chart URL returned by generate_charts, or None when the
+    chart is missing or larger than max_bytes (callers then use the URL).
+    """
+    parsed = parse_chart_name((url or "").rsplit("/", 1)[-1])
+    if not parsed:
+        return None
+    path = chart_file_path(*parsed)
+    if path is None or os.path.getsize(path) > max_bytes:
+        return None
+    with open(path, "rb") as f:
+        data = f.read()
+    return f"data:{MEDIA_TYPES[parsed[1]]};base64,{base64.b64encode(data).decode('ascii')}"
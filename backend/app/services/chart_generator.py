@@ -1,20 +1,27 @@
 # app/services/chart_generator.py
 
-import os
-from typing import Dict, Any, Optional
-
-# Use non-interactive backend for servers
-import matplotlib
-matplotlib.use("Agg")
-
-import matplotlib.pyplot as plt
+import math
+import html
+import importlib.util
+from typing import Dict, Any, Optional, List
 
 from app.utils.medical_ranges import get_normal_range_for_metric
 
+# Optional: matplotlib is only needed for opt-in PNG charts
+_HAS_MATPLOTLIB = importlib.util.find_spec("matplotlib") is not None
 
-def _ensure_dir(path: str) -> None:
-    if not os.path.exists(path):
-        os.makedirs(path, exist_ok=True)
+# Canvas for the band-and-marker chart (same 5:2.6 aspect as the old matplotlib figure)
+CHART_WIDTH = 500
+CHART_HEIGHT = 260
+_PAD_LEFT = 24
+_PAD_RIGHT = 24
+_PAD_TOP = 44
+_PAD_BOTTOM = 62
+
+_BAND_FILL = "#1f77b4"
+_MARKER_COLOR = "#1f77b4"
+_AXIS_COLOR = "#334155"
+_TEXT_COLOR = "#0f172a"
 
 
 def _safe_normal_range(metric: str):
@@ -57,20 +64,125 @@ def _get_range_for_metric(metric: str, ranges: Optional[Dict[str, Dict[str, Any]
     return None
 
 
+# -----------------------------
+# SVG renderer
+# -----------------------------
+def _nice_ticks(lo: float, hi: float, count: int = 5) -> List[float]:
+    """Round tick positions (1/2/5 x 10^n steps) covering [lo, hi]."""
+    span = hi - lo
+    if span <= 0:
+        return [lo]
+    raw = span / max(1, count)
+    mag = 10 ** math.floor(math.log10(raw))
+    step = mag
+    for mult in (1, 2, 5, 10):
+        step = mult * mag
+        if raw <= step:
+            break
+    first = math.ceil(lo / step) * step
+    ticks: List[float] = []
+    t = first
+    while t <= hi + step * 1e-9:
+        ticks.append(round(t, 10))
+        t += step
+    return ticks
+
+
+def render_chart_svg(metric: str, value: float, rmin: float, rmax: float, unit: str = "") -> str:
+    """
+    Band-and-marker chart as a standalone SVG document:
+      - normal band (rmin..rmax)
+      - actual value (vertical marker)
+    Pure string building, no plotting library involved.
+    """
+    val = float(value)
+    lo = min(val, rmin) - 1
+    hi = max(val, rmax) + 1
+    span = (hi - lo) or 1.0
+
+    plot_w = CHART_WIDTH - _PAD_LEFT - _PAD_RIGHT
+    plot_h = CHART_HEIGHT - _PAD_TOP - _PAD_BOTTOM
+    x0, y0 = _PAD_LEFT, _PAD_TOP
+    y1 = y0 + plot_h
+
+    def sx(x: float) -> float:
+        return x0 + (x - lo) / span * plot_w
+
+    band_x = sx(rmin)
+    band_w = max(0.0, sx(rmax) - band_x)
+    mx = sx(val)
+
+    ticks = []
+    for t in _nice_ticks(lo, hi):
+        tx = sx(t)
+        ticks.append(
+            f'<line x1="{tx:.2f}" y1="{y1}" x2="{tx:.2f}" y2="{y1 + 5}" stroke="{_AXIS_COLOR}" stroke-width="1"/>'
+            f'<text x="{tx:.2f}" y="{y1 + 18}" text-anchor="middle" font-size="11" fill="{_TEXT_COLOR}">{t:g}</text>'
+        )
+
+    label = f"{metric} ({unit})" if unit else metric
+    title = f"{metric}: {val:g}"
+
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{CHART_WIDTH}" height="{CHART_HEIGHT}" '
+        f'viewBox="0 0 {CHART_WIDTH} {CHART_HEIGHT}" font-family="DejaVu Sans, Arial, sans-serif">'
+        f'<rect width="{CHART_WIDTH}" height="{CHART_HEIGHT}" fill="#ffffff"/>'
+        f'<text x="{CHART_WIDTH / 2:g}" y="26" text-anchor="middle" font-size="14" fill="{_TEXT_COLOR}">'
+        f'{html.escape(title)}</text>'
+        f'<rect x="{x0}" y="{y0}" width="{plot_w}" height="{plot_h}" fill="none" stroke="{_AXIS_COLOR}" stroke-width="1"/>'
+        f'<rect x="{band_x:.2f}" y="{y0}" width="{band_w:.2f}" height="{plot_h}" fill="{_BAND_FILL}" fill-opacity="0.25"/>'
+        f'<line x1="{mx:.2f}" y1="{y0}" x2="{mx:.2f}" y2="{y1}" stroke="{_MARKER_COLOR}" stroke-width="2"/>'
+        f'{"".join(ticks)}'
+        f'<text x="{CHART_WIDTH / 2:g}" y="{CHART_HEIGHT - 14}" text-anchor="middle" font-size="12" fill="{_TEXT_COLOR}">'
+        f'{html.escape(label)}</text>'
+        f'</svg>'
+    )
+
+
+# -----------------------------
+# PNG renderer (opt-in only)
+# -----------------------------
+def _render_chart_png(metric: str, val: float, rmin: float, rmax: float, unit: str, out_path: str) -> None:
+    # matplotlib is only imported when a caller explicitly asks for PNGs
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig = plt.figure(figsize=(5, 2.6))
+    ax = plt.gca()
+    ax.axvspan(rmin, rmax, alpha=0.25)
+    ax.axvline(val, linewidth=2)
+    ax.set_xlim(min(val, rmin) - 1, max(val, rmax) + 1)
+    ax.set_yticks([])
+    ax.set_xlabel(f"{metric} ({unit})" if unit else metric)
+    ax.set_title(f"{metric}: {val}")
+    plt.tight_layout()
+    plt.savefig(out_path, dpi=160)
+    plt.close(fig)
+
+
 def generate_charts(
     *,
     metrics: Dict[str, float],
-    user_id: int,
+    user_id: Optional[int] = None,
     ranges: Optional[Dict[str, Dict[str, Any]]] = None,
+    fmt: str = "svg",
 ) -> Dict[str, str]:
     """
     Create simple charts for each metric showing:
       - normal band (min..max)
       - actual value (vertical line)
-    Saves PNGs under app/charts/user_{user_id}/ and returns {metric: path}.
+    Charts live in the shared content-addressed store (see chart_cache), so
+    identical inputs are rendered once for everyone. Returns {metric: url}.
+    user_id is accepted for backwards compatibility only.
     """
-    base_dir = os.path.join("app", "charts", f"user_{user_id}")
-    _ensure_dir(base_dir)
+    from app.services.chart_cache import get_or_render_chart, chart_url  # local import (cycle)
+
+    fmt = (fmt or "svg").lower()
+    if fmt not in ("svg", "png"):
+        raise ValueError(f"Unsupported chart format: {fmt!r}")
+    if fmt == "png" and not _HAS_MATPLOTLIB:
+        raise ValueError("PNG charts need matplotlib (pip install matplotlib)")
 
     saved: Dict[str, str] = {}
 
@@ -85,27 +197,7 @@ def generate_charts(
             continue
 
         rmin, rmax, unit = rr
-
-        fig = plt.figure(figsize=(5, 2.6))
-        ax = plt.gca()
-
-        # Normal band
-        ax.axvspan(rmin, rmax, alpha=0.25)
-
-        # Actual value
-        ax.axvline(val, linewidth=2)
-
-        # Frame
-        ax.set_xlim(min(val, rmin) - 1, max(val, rmax) + 1)
-        ax.set_yticks([])
-        ax.set_xlabel(f"{metric} ({unit})" if unit else metric)
-        ax.set_title(f"{metric}: {val}")
-
-        out_path = os.path.join(base_dir, f"{metric.replace(' ', '_')}.png")
-        plt.tight_layout()
-        plt.savefig(out_path, dpi=160)
-        plt.close(fig)
-
-        saved[metric] = out_path
+        key = get_or_render_chart(metric, val, rmin, rmax, unit, fmt)
+        saved[metric] = chart_url(key, fmt)
 
     return saved
@@ -0,0 +1,160 @@
+# app/services/cohort_stats.py
+"""
+Population ("how does my value compare") statistics per metric and cohort.
+
+refresh_cohort_sketches() is an offline batch job: it streams each user's
+latest value per metric from report_metric_agg (maintained on every insert)
+with a server-side cursor, folds them into quantile sketches (bounded memory
+regardless of table size) and replaces the persisted sketches in one
+transaction. One value per user keeps users with many reports from
+dominating the population.
+cohort_percentile() answers lookups from an in-process copy of the sketches.
+"""
+from __future__ import annotations
+
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.utils.quantile_sketch import QuantileSketch
+
+logger = logging.getLogger(__name__)
+
+COHORT_ALL = "all"
+COHORT_CACHE_TTL_SECONDS = float(os.getenv("COHORT_CACHE_TTL_SECONDS", "300"))
+REPORTED_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+def _cohorts_for(user_ids: np.ndarray) -> List[Tuple[str, np.ndarray]]:
+    """
+    (cohort, row mask) pairs for a chunk. Users carry no demographic fields
+    yet, so everyone is in COHORT_ALL; finer buckets (age band, sex, ...)
+    belong here once the user model has them.
+    """
+    return [(COHORT_ALL, np.ones(len(user_ids), dtype=bool))]
+
+
+# -----------------------------
+# Batch job
+# -----------------------------
+def refresh_cohort_sketches(chunk_size: int = 10000) -> int:
+    """
+    Rebuild the persisted sketches from report_metric_agg: one value per
+    (user, metric), the user's latest measurement. Reads O(users x metrics)
+    rows, never the report history; a report that commits late is simply
+    counted on the next run. Returns the number of user values folded in.
+    """
+    from app.core.database import begin_write, engine
+    from app.models.history import MetricAggregate, MetricCohortSketch  # local import
+
+    st = MetricCohortSketch.__table__
+    agg = MetricAggregate.__table__
+
+    sketches: Dict[Tuple[str, str], QuantileSketch] = {}
+    processed = 0
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(
+            select(agg.c.user_id, agg.c.metric, agg.c.last_value)
+            .where(agg.c.last_value.is_not(None))
+            .order_by(agg.c.id)
+        )
+        for chunk in result.partitions():
+            user_ids, metrics, values = zip(*chunk)
+            metric_arr = np.asarray(metrics, dtype=object)
+            value_arr = np.asarray(values, dtype=np.float64)
+            names, inverse = np.unique(metric_arr, return_inverse=True)
+            for cohort, mask in _cohorts_for(np.asarray(user_ids)):
+                for k, name in enumerate(names.tolist()):
+                    sel = mask & (inverse == k)
+                    if sel.any():
+                        sketches.setdefault((name, cohort), QuantileSketch()).add_many(value_arr[sel])
+            processed += len(user_ids)
+            logger.info("📊 Cohort sketches: %d user values folded", processed)
+
+    now = datetime.utcnow()
+    with begin_write() as conn:
+        conn.execute(st.delete())
+        for (metric, cohort), sk in sketches.items():
+            conn.execute(
+                st.insert().values(
+                    metric=metric, cohort=cohort, count=sk.count,
+                    sketch=json.dumps(sk.to_dict()), updated_at=now,
+                )
+            )
+
+    _cache.clear()
+    return processed
+
+
+# -----------------------------
+# Lookups
+# -----------------------------
+class _SketchCache:
+    """(metric, cohort) -> sketch, reloaded from the table after a TTL."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[Tuple[str, str], Tuple[float, QuantileSketch]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, metric: str, cohort: str) -> Optional[QuantileSketch]:
+        key = (metric, cohort)
+        with self._lock:
+            hit = self._entries.get(key)
+        if hit is not None and time.monotonic() - hit[0] < self.ttl:
+            return hit[1]
+
+        from app.models.history import MetricCohortSketch  # local import
+
+        raw = (
+            db.query(MetricCohortSketch.sketch)
+            .filter(MetricCohortSketch.metric == metric, MetricCohortSketch.cohort == cohort)
+            .scalar()
+        )
+        if not raw:
+            return None  # misses are not cached, so arbitrary names can't grow the cache
+        sk = QuantileSketch.from_dict(json.loads(raw))
+        with self._lock:
+            self._entries[key] = (time.monotonic(), sk)
+        return sk
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = _SketchCache(COHORT_CACHE_TTL_SECONDS)
+
+
+def cohort_percentile(
+    db: Session,
+    metric: str,
+    value: Optional[float] = None,
+    cohort: str = COHORT_ALL,
+) -> Optional[Dict[str, Any]]:
+    """
+    Population percentile of `value` plus reference quantiles for the metric,
+    or None if no sketch exists. Cost does not depend on the population size.
+    """
+    sk = _cache.get(db, metric, cohort)
+    if sk is None or not sk.count:
+        return None
+    out: Dict[str, Any] = {
+        "metric": metric,
+        "cohort": cohort,
+        "population": sk.count,
+        "quantiles": {f"p{int(q * 100)}": sk.quantile(q) for q in REPORTED_QUANTILES},
+    }
+    if value is not None:
+        out["value"] = value
+        out["percentile"] = round(100.0 * sk.rank(value), 1)
+    return out
+
@@ -3,10 +3,13 @@
 from typing import List, Dict, Any, Optional
 from sqlalchemy.orm import Session
 from datetime import datetime
-import json
 
 from app.models.history import ReportHistory
 from app.core.database import get_db
+from app.services.trend_cache import trend_cache
+from app.utils.downsample import downsample_rows
+
+_TREND_COLUMNS = ["Hemoglobin", "Platelets", "WBC", "RBC", "Glucose"]
 
 
 def save_report_summary(
@@ -25,9 +28,9 @@ def save_report_summary(
 
     entry = ReportHistory(
         user_id=user_id,
-        report_metadata=json.dumps(metadata),
-        summary_doctor=str(doctor_summary),
-        summary_patient=str(patient_summary),
+        report_metadata=metadata,
+        doctor_summary=str(doctor_summary),
+        patient_summary=str(patient_summary),
     )
     db.add(entry)
     db.commit()
@@ -35,46 +38,17 @@ def save_report_summary(
     return entry
 
 
-def get_user_metric_trends(db: Session, user_id: int) -> List[Dict[str, Any]]:
+def get_user_metric_trends(db: Session, user_id: int, points: Optional[int] = None) -> List[Dict[str, Any]]:
     """
-    Read past ReportHistory rows and build a time‑series table.
-    Expects each row's report_metadata to contain keys like:
-    Hemoglobin, Platelets, WBC, RBC, Glucose, and a report_date (dd/mm/YYYY).
+    The user's time-series table: one row per report with its upload date and
+    Hemoglobin, Platelets, WBC, RBC, Glucose (-1.0 when missing).
+    Served from the per-user trend cache (see services/trend_cache.py).
+    With points, the table is downsampled per metric (LTTB) to about that many rows.
     """
-    rows = (
-        db.query(ReportHistory)
-        .filter(ReportHistory.user_id == user_id)
-        .order_by(ReportHistory.id.asc())
-        .all()
-    )
-
-    def _f(v):
-        try:
-            return float(v)
-        except Exception:
-            return -1.0
-
-    out: List[Dict[str, Any]] = []
-    for r in rows:
-        try:
-            meta = json.loads(r.report_metadata or "{}")
-            raw_date = meta.get("report_date") or meta.get("date") or "Unknown"
-            try:
-                # normalize to YYYY-MM-DD when possible
-                dt = datetime.strptime(raw_date, "%d/%m/%Y").strftime("%Y-%m-%d")
-            except Exception:
-                dt = raw_date
-
-            out.append({
-                "date": dt,
-                "Hemoglobin": _f(meta.get("Hemoglobin")),
-                "Platelets": _f(meta.get("Platelets")),
-                "WBC": _f(meta.get("WBC")),
-                "RBC": _f(meta.get("RBC")),
-                "Glucose": _f(meta.get("Glucose")),
-            })
-        except Exception:
-            continue
+    series = trend_cache.get(db, user_id)
+    out = series.rows(series.select(), _TREND_COLUMNS)
+    if points:
+        out = downsample_rows(out, _TREND_COLUMNS, points)
     return out
 
 
@@ -0,0 +1,383 @@
+# app/services/lab_import.py
+"""
+Bulk import of structured lab results (CSV, JSON / NDJSON rows, FHIR
+Observation bundles) straight into report history, with no PDF extraction
+and no LLM call.
+
+Rows are validated and mapped to our metric names (app/utils/lab_codes.py),
+grouped into one report per (user, report key) and written with
+store_reports_in_db, one transaction per batch of reports. Summaries are left
+empty for a later summarization pass. Re-importing the same file is a no-op:
+each report is stored with filename "<source>:<report key>", and reports that
+already exist for the user are skipped.
+"""
+from __future__ import annotations
+
+import io
+import os
+import csv
+import math
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+
+from app.utils import json_codec
+from app.utils.lab_codes import LOINC_SYSTEM, normalize_unit, resolve_metric
+from app.utils.medical_ranges import get_normal_range_for_metric
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ("auto", "csv", "json", "fhir")
+# Upper bound for one HTTP import (the CLI reads files of any size)
+LAB_IMPORT_MAX_BYTES = int(os.getenv("LAB_IMPORT_MAX_BYTES", str(50 * 1024 * 1024)))
+
+# Accepted column / key names for each field (lower case)
+_FIELD_ALIASES = {
+    "user": ("user", "user_id", "username", "email", "patient", "patient_id"),
+    "report": ("report", "report_id", "accession", "accession_number", "order_id", "specimen_id"),
+    "code": ("code", "loinc", "loinc_code", "test_code"),
+    "name": ("metric", "test", "test_name", "analyte", "name"),
+    "value": ("value", "result", "result_value"),
+    "unit": ("unit", "units"),
+    "low": ("ref_low", "low", "range_low", "reference_low", "min"),
+    "high": ("ref_high", "high", "range_high", "reference_high", "max"),
+    "date": ("date", "observed_at", "collected_at", "collection_date", "effective", "result_date"),
+}
+_ALIAS_TO_FIELD = {alias: field for field, aliases in _FIELD_ALIASES.items() for alias in aliases}
+
+_SKIPPED_FHIR_STATUS = ("entered-in-error", "cancelled")
+
+
+class LabResult(NamedTuple):
+    """One validated measurement."""
+    line: int                  # source row / entry number (1-based)
+    user: Optional[str]        # user id, username or email as given
+    report_key: Optional[str]  # accession / report id, None = group by date
+    metric: str
+    value: float
+    unit: str
+    low: Optional[float]
+    high: Optional[float]
+    observed_at: datetime
+
+
+class ImportIssue(NamedTuple):
+    line: int
+    message: str
+
+
+class ImportResult(NamedTuple):
+    rows: int                  # valid measurements
+    reports: int               # reports written (or that would be, with dry_run)
+    duplicates: int            # reports skipped because they were imported before
+    report_ids: List[int]
+    errors: List[ImportIssue]  # the first max_errors problems
+    error_count: int
+
+
+# -----------------------------
+# Parsing
+# -----------------------------
+def _records_from_csv(text: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    reader = csv.reader(io.StringIO(text))
+    header = next(reader, None) or []
+    fields = [_ALIAS_TO_FIELD.get(h.strip().lower()) for h in header]
+    for line, values in enumerate(reader, start=2):
+        if not any(v.strip() for v in values):
+            continue
+        yield line, {f: v.strip() for f, v in zip(fields, values) if f and v.strip()}
+
+
+def _record_from_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for key, value in row.items():
+        field = _ALIAS_TO_FIELD.get(str(key).strip().lower())
+        if field and value not in (None, ""):
+            out[field] = value
+    return out
+
+
+def _record_from_observation(obs: Dict[str, Any], report_of: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    """Fields of a FHIR Observation; None for observations that should be skipped."""
+    if obs.get("status") in _SKIPPED_FHIR_STATUS:
+        return None
+    code = obs.get("code") or {}
+    codings = code.get("coding") or []
+    loinc = next((c for c in codings if c.get("system") == LOINC_SYSTEM), codings[0] if codings else {})
+    quantity = obs.get("valueQuantity") or {}
+    ref = (obs.get("referenceRange") or [{}])[0]
+    subject = obs.get("subject") or {}
+    period = obs.get("effectivePeriod") or {}
+    record = {
+        "code": loinc.get("code"),
+        "name": code.get("text") or loinc.get("display"),
+        "value": quantity.get("value"),
+        "unit": quantity.get("unit") or quantity.get("code"),
+        "low": (ref.get("low") or {}).get("value"),
+        "high": (ref.get("high") or {}).get("value"),
+        "date": obs.get("effectiveDateTime") or period.get("start") or obs.get("issued"),
+        "user": (subject.get("identifier") or {}).get("value") or (subject.get("reference") or "").rpartition("/")[2],
+        "report": report_of.get(obs.get("id") or ""),
+    }
+    return {k: v for k, v in record.items() if v not in (None, "")}
+
+
+def _records_from_json(items: List[Any]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    # bundle entries wrap the resource; DiagnosticReports group their Observations
+    resources = [i.get("resource", i) if isinstance(i, dict) else i for i in items]
+    report_of: Dict[str, str] = {}
+    for res in resources:
+        if isinstance(res, dict) and res.get("resourceType") == "DiagnosticReport":
+            key = next((i.get("value") for i in res.get("identifier") or [] if i.get("value")), None) or res.get("id")
+            for ref in res.get("result") or []:
+                report_of[(ref.get("reference") or "").rpartition("/")[2]] = str(key)
+
+    for line, res in enumerate(resources, start=1):
+        if not isinstance(res, dict):
+            yield line, {"error": "entry is not an object"}
+        elif res.get("resourceType") == "Observation":
+            record = _record_from_observation(res, report_of)
+            if record is not None:
+                yield line, record
+        elif "resourceType" not in res:
+            yield line, _record_from_row(res)
+
+
+def _parse_json(text: str) -> List[Any]:
+    try:
+        doc = json_codec.loads(text)
+    except ValueError:
+        # NDJSON (e.g. a FHIR bulk export): one resource or row per line
+        return [json_codec.loads(line) for line in text.splitlines() if line.strip()]
+    if isinstance(doc, list):
+        return doc
+    if isinstance(doc, dict):
+        if doc.get("resourceType") == "Bundle":
+            return doc.get("entry") or []
+        for key in ("results", "rows", "observations"):
+            if isinstance(doc.get(key), list):
+                return doc[key]
+        return [doc]
+    raise ValueError("JSON document must be a list, a FHIR Bundle or {\"results\": [...]}")
+
+
+def iter_lab_records(data: bytes, fmt: str = "auto") -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """(line, raw fields) for every row/observation in a CSV or JSON payload."""
+    text = data.decode("utf-8-sig")
+    if fmt == "auto":
+        fmt = "json" if text.lstrip()[:1] in ("[", "{") else "csv"
+    if fmt == "csv":
+        return _records_from_csv(text)
+    return _records_from_json(_parse_json(text))
+
+
+# -----------------------------
+# Validation
+# -----------------------------
+def _parse_date(raw: Any) -> datetime:
+    if isinstance(raw, datetime):
+        dt = raw
+    else:
+        s = str(raw).strip()
+        if s.endswith("Z"):
+            s = s[:-1] + "+00:00"
+        dt = datetime.fromisoformat(s)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _optional_float(raw: Any) -> Optional[float]:
+    if raw in (None, ""):
+        return None
+    value = float(raw)
+    return value if math.isfinite(value) else None
+
+
+def validate_record(line: int, record: Dict[str, Any]) -> LabResult:
+    """A LabResult for one raw record; raises ValueError describing the problem."""
+    if "error" in record:
+        raise ValueError(record["error"])
+    metric = resolve_metric(str(record.get("code") or ""), str(record.get("name") or ""))
+    if metric is None:
+        raise ValueError(f"unknown test {record.get('code') or record.get('name')!r}")
+    try:
+        value = float(record["value"])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f"{metric}: missing or non-numeric value {record.get('value')!r}")
+    if not math.isfinite(value):
+        raise ValueError(f"{metric}: value is not finite")
+    if "date" not in record:
+        raise ValueError(f"{metric}: missing date")
+    try:
+        observed_at = _parse_date(record["date"])
+    except ValueError:
+        raise ValueError(f"{metric}: invalid date {record['date']!r}")
+
+    ref_low, ref_high, ref_unit = get_normal_range_for_metric(metric)
+    unit = str(record.get("unit") or "").strip()
+    if unit and ref_unit and normalize_unit(unit) != normalize_unit(ref_unit):
+        # no unit conversion: mixing units would corrupt trends
+        raise ValueError(f"{metric}: unit {unit!r} does not match {ref_unit!r}")
+    try:
+        low, high = _optional_float(record.get("low")), _optional_float(record.get("high"))
+    except (TypeError, ValueError):
+        raise ValueError(f"{metric}: invalid reference range")
+    if low is None or high is None or high <= low:
+        low, high = ref_low, ref_high
+
+    return LabResult(
+        line=line,
+        user=str(record["user"]).strip() if record.get("user") not in (None, "") else None,
+        report_key=str(record["report"]).strip() if record.get("report") not in (None, "") else None,
+        metric=metric,
+        value=value,
+        unit=unit or ref_unit or "",
+        low=low,
+        high=high,
+        observed_at=observed_at,
+    )
+
+
+# -----------------------------
+# Import
+# -----------------------------
+def resolve_users(db: Session, keys: List[str]) -> Dict[str, int]:
+    """{user key: user id} for keys that are a user id, username or email."""
+    from app.models.user import User  # local import
+
+    out: Dict[str, int] = {}
+    ids = [int(k) for k in keys if k.isdigit()]
+    if ids:
+        for (uid,) in db.query(User.id).filter(User.id.in_(ids)):
+            out[str(uid)] = uid
+    names = [k for k in keys if k not in out]
+    if names:
+        for uid, username, email in db.query(User.id, User.username, User.email).filter(
+            or_(User.username.in_(names), User.email.in_(names))
+        ):
+            out[username] = uid
+            if email:
+                out[email] = uid
+    return out
+
+
+def _group_reports(results: List[LabResult], users: Dict[Optional[str], int], source: str) -> List[Dict[str, Any]]:
+    """One store_reports_in_db report per (user, report key or observation day)."""
+    reports: Dict[Tuple[int, str], Dict[str, Any]] = {}
+    for r in results:
+        user_id = users[r.user]
+        key = r.report_key or r.observed_at.date().isoformat()
+        rep = reports.get((user_id, key))
+        if rep is None:
+            rep = reports[(user_id, key)] = {
+                "user_id": user_id,
+                "doctor_summary": "",
+                "patient_summary": "",
+                "metadata": {"metrics": {}, "ranges": {}},
+                "ranges": {},
+                "filename": f"{source}:{key}"[:255],
+                "uploaded_at": r.observed_at,
+            }
+        rep["metadata"]["metrics"][r.metric] = r.value
+        if r.low is not None and r.high is not None:
+            rep["ranges"][r.metric] = {"min": r.low, "max": r.high, "unit": r.unit}
+        rep["uploaded_at"] = min(rep["uploaded_at"], r.observed_at)
+    for rep in reports.values():
+        rep["metadata"]["ranges"] = rep["ranges"]
+    return sorted(reports.values(), key=lambda rep: (rep["user_id"], rep["uploaded_at"]))
+
+
+def _existing_filenames(reports: List[Dict[str, Any]]) -> set:
+    """(user_id, filename) of reports already stored (fresh connection: sees every committed import)."""
+    from app.core.database import engine
+    from app.models.history import ReportHistory  # local import
+
+    rh = ReportHistory.__table__
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(rh.c.user_id, rh.c.filename).where(
+                rh.c.user_id.in_({rep["user_id"] for rep in reports}),
+                rh.c.filename.in_({rep["filename"] for rep in reports}),
+            )
+        )
+        return {(uid, name) for uid, name in rows}
+
+
+def import_lab_results(
+    db: Session,
+    data: bytes,
+    fmt: str = "auto",
+    source: str = "import",
+    user_id: Optional[int] = None,
+    batch_size: int = 500,
+    dry_run: bool = False,
+    max_errors: int = 100,
+) -> ImportResult:
+    """
+    Validate and store a CSV / JSON / FHIR payload of lab results.
+
+    With user_id, every row goes to that user (the file's user column is
+    ignored); otherwise each row's user id / username / email is resolved.
+    Invalid rows are reported, not fatal. With dry_run, nothing is written.
+    """
+    from app.core.database import store_reports_in_db
+
+    errors: List[ImportIssue] = []
+    error_count = 0
+
+    def _error(line: int, message: str) -> None:
+        nonlocal error_count
+        error_count += 1
+        if len(errors) < max_errors:
+            errors.append(ImportIssue(line, message))
+
+    results: List[LabResult] = []
+    try:
+        records = iter_lab_records(data, fmt)
+        for line, record in records:
+            try:
+                results.append(validate_record(line, record))
+            except ValueError as e:
+                _error(line, str(e))
+    except (UnicodeDecodeError, ValueError, csv.Error) as e:
+        _error(0, f"could not parse {fmt} payload: {e}")
+        return ImportResult(0, 0, 0, [], errors, error_count)
+
+    if user_id is not None:
+        users: Dict[Optional[str], int] = {r.user: user_id for r in results}
+    else:
+        users = dict(resolve_users(db, sorted({r.user for r in results if r.user})))
+        valid = []
+        for r in results:
+            if r.user is None or r.user not in users:
+                _error(r.line, f"unknown user {r.user!r}" if r.user else "missing user")
+            else:
+                valid.append(r)
+        results = valid
+
+    reports = _group_reports(results, users, source)
+    duplicates = 0
+    report_ids: List[int] = []
+    written = 0
+    for start in range(0, len(reports), batch_size):
+        batch = reports[start:start + batch_size]
+        seen = _existing_filenames(batch)
+        fresh = [rep for rep in batch if (rep["user_id"], rep["filename"]) not in seen]
+        duplicates += len(batch) - len(fresh)
+        if fresh and not dry_run:
+            report_ids.extend(store_reports_in_db(fresh))
+        written += len(fresh)
+        logger.info("📥 Lab import %s: %d/%d reports", source, start + len(batch), len(reports))
+
+    return ImportResult(
+        rows=len(results),
+        reports=written,
+        duplicates=duplicates,
+        report_ids=report_ids,
+        errors=errors,
+        error_count=error_count,
+    )
@@ -0,0 +1,229 @@
+# app/services/metric_store.py
+"""
+Normalized per-metric time series (report_metric table).
+
+report_history keeps the whole report as a JSON blob; trend and sparkline
+queries read from report_metric instead, via the (user_id, metric, measured_at)
+index, so they cost O(points requested) rather than O(history size).
+"""
+from __future__ import annotations
+
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from app.utils.json_codec import METADATA_COLUMNS, report_metadata
+from app.utils.medical_ranges import get_normal_range_for_metric
+
+logger = logging.getLogger(__name__)
+
+
+def _status(value: float, lo: Optional[float], hi: Optional[float]) -> Optional[str]:
+    if not isinstance(lo, (int, float)) or not isinstance(hi, (int, float)) or hi <= lo:
+        return None
+    if value < lo:
+        return "low"
+    if value > hi:
+        return "high"
+    return "normal"
+
+
+def build_metric_rows(
+    report_id: int,
+    user_id: int,
+    metadata: Optional[Dict[str, Any]],
+    measured_at: datetime,
+    ranges: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    report_metric rows for one report. Accepts the same metadata shapes as the
+    PDF builder ({"Glucose": 95, ...} or {"metrics": {...}, "ranges": {...}}).
+    Status comes from the given ranges, else the static reference ranges.
+    """
+    metadata = metadata or {}
+    src = metadata.get("metrics") if isinstance(metadata.get("metrics"), dict) else metadata
+    if ranges is None and isinstance(metadata.get("ranges"), dict):
+        ranges = metadata["ranges"]
+    ranges = ranges or {}
+
+    rows: List[Dict[str, Any]] = []
+    for metric, raw in (src or {}).items():
+        if metric == "ranges":
+            continue
+        try:
+            value = float(raw)
+        except Exception:
+            continue
+
+        r = ranges.get(metric) or {}
+        lo, hi, unit = r.get("min"), r.get("max"), r.get("unit") or ""
+        if not (isinstance(lo, (int, float)) and isinstance(hi, (int, float))):
+            lo, hi, static_unit = get_normal_range_for_metric(metric)
+            unit = unit or static_unit or ""
+
+        rows.append(
+            {
+                "report_id": report_id,
+                "user_id": user_id,
+                "metric": str(metric)[:64],
+                "value": value,
+                "unit": (unit or None) and str(unit)[:32],
+                "status": _status(value, lo, hi),
+                "measured_at": measured_at,
+            }
+        )
+    return rows
+
+
+# -----------------------------
+# Reads
+# -----------------------------
+def get_metric_series(
+    db: Session,
+    user_id: int,
+    metrics: Iterable[str],
+    limit: int,
+    until: Optional[datetime] = None,
+    until_report_id: Optional[int] = None,
+) -> Dict[str, List[float]]:
+    """
+    Last `limit` values per metric (oldest first), optionally only points at or
+    before (until, until_report_id). One bounded index range scan per metric.
+    """
+    from app.models.history import ReportMetric  # local import
+
+    out: Dict[str, List[float]] = {}
+    for metric in metrics:
+        q = db.query(ReportMetric.value).filter(
+            ReportMetric.user_id == user_id,
+            ReportMetric.metric == metric,
+        )
+        if until is not None:
+            bound = ReportMetric.measured_at < until
+            if until_report_id is not None:
+                bound = or_(bound, and_(ReportMetric.measured_at == until, ReportMetric.report_id <= until_report_id))
+            else:
+                bound = ReportMetric.measured_at <= until
+            q = q.filter(bound)
+        vals = (
+            q.order_by(ReportMetric.measured_at.desc(), ReportMetric.report_id.desc())
+            .limit(limit)
+            .all()
+        )
+        out[metric] = [float(v) for (v,) in reversed(vals)]
+    return out
+
+
+def metric_values_for_reports(
+    db: Session,
+    report_ids: List[int],
+    metrics: Optional[Iterable[str]] = None,
+) -> Dict[int, Dict[str, float]]:
+    """
+    {report_id: {metric: value}} for a page of reports, read from report_metric
+    by report_id. Reports without metric rows (not backfilled yet) fall back
+    to their metadata column only, never the summary text columns.
+    """
+    from sqlalchemy.orm import load_only
+    from app.models.history import ReportHistory, ReportMetric  # local import
+
+    out: Dict[int, Dict[str, float]] = {rid: {} for rid in report_ids}
+    if not report_ids:
+        return out
+    wanted = set(metrics) if metrics is not None else None
+
+    q = db.query(ReportMetric.report_id, ReportMetric.metric, ReportMetric.value).filter(
+        ReportMetric.report_id.in_(report_ids)
+    )
+    if wanted is not None:
+        q = q.filter(ReportMetric.metric.in_(wanted))
+    seen = set()
+    for rid, metric, value in q.all():
+        out[rid][metric] = float(value)
+        seen.add(rid)
+
+    missing = [rid for rid in report_ids if rid not in seen]
+    if missing:
+        if wanted is not None:
+            # a report may simply not contain the wanted metrics
+            have_any = {
+                rid for (rid,) in db.query(ReportMetric.report_id)
+                .filter(ReportMetric.report_id.in_(missing))
+                .distinct()
+            }
+            missing = [rid for rid in missing if rid not in have_any]
+    if missing:
+        legacy = (
+            db.query(ReportHistory)
+            .options(load_only(ReportHistory.id, ReportHistory.report_metadata))
+            .filter(ReportHistory.id.in_(missing))
+            .all()
+        )
+        for r in legacy:
+            meta = report_metadata(r)
+            src = meta.get("metrics") if isinstance(meta.get("metrics"), dict) else meta
+            for metric, raw in (src or {}).items():
+                if metric == "ranges" or (wanted is not None and metric not in wanted):
+                    continue
+                try:
+                    out[r.id][metric] = float(raw)
+                except Exception:
+                    continue
+    return out
+
+
+def has_metric_rows(db: Session, report_id: int) -> bool:
+    from app.models.history import ReportMetric  # local import
+    return db.query(ReportMetric.id).filter(ReportMetric.report_id == report_id).first() is not None
+
+
+# -----------------------------
+# Backfill
+# -----------------------------
+def backfill_report_metrics(batch_size: int = 500) -> int:
+    """
+    Populate report_metric for every report_history row that has no metric
+    rows yet. Idempotent and resumable: walks ids in batches, one transaction
+    per batch. Returns the number of metric rows inserted.
+    """
+    from sqlalchemy import select, exists
+    from app.core.database import begin_write
+    from app.models.history import ReportHistory, ReportMetric  # local import
+
+    rh = ReportHistory.__table__
+    rm = ReportMetric.__table__
+    meta_cols = [rh.c[name] for name in METADATA_COLUMNS if name in rh.c]
+
+    inserted = 0
+    last_id = 0
+    while True:
+        with begin_write() as conn:
+            batch = conn.execute(
+                select(rh.c.id, rh.c.user_id, rh.c.uploaded_at, *meta_cols)
+                .where(rh.c.id > last_id)
+                .where(~exists().where(rm.c.report_id == rh.c.id))
+                .order_by(rh.c.id)
+                .limit(batch_size)
+            ).mappings().all()
+            if not batch:
+                break
+
+            rows: List[Dict[str, Any]] = []
+            for r in batch:
+                rows.extend(
+                    build_metric_rows(
+                        report_id=r["id"],
+                        user_id=r["user_id"],
+                        metadata=report_metadata(r),
+                        measured_at=r["uploaded_at"] or datetime.utcnow(),
+                    )
+                )
+            if rows:
+                conn.execute(rm.insert(), rows)
+            inserted += len(rows)
+            last_id = batch[-1]["id"]
+        logger.info("🔁 report_metric backfill: up to report %s (%s rows)", last_id, inserted)
+    return inserted
@@ -0,0 +1,195 @@
+# app/services/pdf_cache.py
+"""
+In-process cache of rendered report PDFs.
+
+Entries are keyed by (report_id, sparkline window, content hash). The content hash
+covers everything that ends up in the PDF (summaries, metadata, sparkline
+series, renderer version), so it doubles as a strong ETag: identical inputs
+always produce the same key, and a newer upload that changes a report's
+sparklines produces a new key and drops the superseded entry.
+
+Memory is the primary tier. Setting PDF_CACHE_DIR adds an optional disk tier
+(shared by worker processes, survives restarts), bounded by
+PDF_CACHE_DISK_MAX_BYTES.
+"""
+from __future__ import annotations
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", "").strip()
+PDF_CACHE_DISK_MAX_BYTES = int(os.getenv("PDF_CACHE_DISK_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+# Bump whenever the PDF layout changes so stale renders are never served.
+PDF_RENDER_VERSION = "2"
+
+
+class CachedPdf(NamedTuple):
+    data: bytes
+    etag: str
+    last_modified: datetime  # when this content was rendered (naive UTC, whole seconds)
+
+
+def pdf_content_hash(payload: Dict[str, Any]) -> str:
+    """sha256 over a canonical JSON encoding of the render inputs."""
+    raw = json.dumps(
+        [PDF_RENDER_VERSION, payload],
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def pdf_cache_key(report_id: Any, trend_window: Any, content_hash: str) -> str:
+    return f"{report_id}:{trend_window}:{content_hash}"
+
+
+def etag_for(cache_key: str) -> str:
+    return '"' + hashlib.sha1(cache_key.encode("utf-8")).hexdigest() + '"'
+
+
+class _DiskTier:
+    """Flat directory of <sha1(key)>.pdf files, pruned oldest-first by total size."""
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".pdf")
+
+    def get(self, key: str) -> Optional[CachedPdf]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            mtime = datetime.utcfromtimestamp(os.path.getmtime(path)).replace(microsecond=0)
+        except OSError:
+            return None
+        return CachedPdf(data=data, etag=etag_for(key), last_modified=mtime)
+
+    def put(self, key: str, data: bytes) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self._prune()
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _prune(self) -> None:
+        files = []
+        total = 0
+        for fname in os.listdir(self.root):
+            if not fname.endswith(".pdf"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.root, fname))
+            except OSError:
+                continue
+            files.append((st.st_mtime, fname, st.st_size))
+            total += st.st_size
+        for _, fname, size in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.root, fname))
+                total -= size
+            except OSError:
+                pass
+
+
+class _PdfCache:
+    """LRU bounded by total bytes; one live entry per (report_id, trend window)."""
+
+    def __init__(self, max_bytes: int, disk: Optional[_DiskTier] = None):
+        self.max_bytes = max_bytes
+        self.disk = disk
+        self.total = 0
+        self._entries: "OrderedDict[str, CachedPdf]" = OrderedDict()
+        self._current: Dict[Tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _slot(key: str) -> Tuple[str, str]:
+        report_id, window, _ = key.split(":", 2)
+        return report_id, window
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total -= len(entry.data)
+            slot = self._slot(key)
+            if self._current.get(slot) == key:
+                del self._current[slot]
+
+    def get(self, key: str) -> Optional[CachedPdf]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+        if self.disk is not None:
+            entry = self.disk.get(key)
+            if entry is not None:
+                self._remember(key, entry)
+            return entry
+        return None
+
+    def put(self, key: str, data: bytes, last_modified: Optional[datetime] = None) -> CachedPdf:
+        entry = CachedPdf(data=data, etag=etag_for(key), last_modified=(last_modified or datetime.utcnow()).replace(microsecond=0))
+        superseded = self._remember(key, entry)
+        if self.disk is not None:
+            if superseded:
+                self.disk.delete(superseded)
+            self.disk.put(key, data)
+        return entry
+
+    def _remember(self, key: str, entry: CachedPdf) -> Optional[str]:
+        """Insert into the memory tier; returns the superseded key for this slot, if any."""
+        if len(entry.data) > self.max_bytes:
+            return None  # too large to keep in memory
+        with self._lock:
+            # newer content for the same report/window supersedes the old render
+            previous = self._current.get(self._slot(key))
+            if previous == key:
+                previous = None
+            if previous:
+                self._drop(previous)
+            self._drop(key)
+            self._entries[key] = entry
+            self._current[self._slot(key)] = key
+            self.total += len(entry.data)
+            while self.total > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+        return previous
+
+    def invalidate_report(self, report_id: Any) -> None:
+        with self._lock:
+            prefix = f"{report_id}:"
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                self._drop(key)
+
+
+pdf_cache = _PdfCache(
+    PDF_CACHE_MAX_BYTES,
+    disk=_DiskTier(PDF_CACHE_DIR, PDF_CACHE_DISK_MAX_BYTES) if PDF_CACHE_DIR else None,
+)
@@ -4,23 +4,27 @@ from __future__ import annotations
 import os
 import io
 import html
-from typing import Dict, Any, Tuple, List, Optional
+import logging
+from typing import Dict, Any, NamedTuple, Tuple, List, Optional
 
 # Fallback: ReportLab
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from reportlab.graphics.shapes import Drawing, Rect, Line, String
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib import colors
 
-# Pretty renderer (preferred)
-try:
-    from weasyprint import HTML, CSS  # type: ignore
-    _HAS_WEASY = True
-except Exception:
-    _HAS_WEASY = False
+# Pretty renderer (preferred). Only probed here: WeasyPrint itself is imported
+# inside the render pool workers, never in the API process.
+import importlib.util
+_HAS_WEASY = importlib.util.find_spec("weasyprint") is not None
 
 from app.utils.medical_ranges import get_normal_range_for_metric
 from app.services.suggestions import generate_suggestions
+from app.services.chart_generator import render_chart_svg
+from app.services.render_pool import render_html_pdf, render_pool_available
+
+logger = logging.getLogger(__name__)
 
 
 # -----------------------------
@@ -133,59 +137,146 @@ def _html_escape(s: str) -> str:
 # -----------------------------
 # Public entry used by /download-report
 # -----------------------------
-def generate_summary_pdf(
+RENDERER_HTML = "weasyprint"
+RENDERER_REPORTLAB = "reportlab"
+
+
+class RenderedPdf(NamedTuple):
+    data: bytes
+    renderer: str  # RENDERER_HTML, or RENDERER_REPORTLAB (also the fallback)
+
+
+def pdf_renderer() -> str:
+    """The renderer a render started now would use (part of PDF cache keys)."""
+    return RENDERER_HTML if _HAS_WEASY and render_pool_available() else RENDERER_REPORTLAB
+
+
+def render_summary_pdf(
     doctor_summary: str,
     patient_summary: str,
     metadata: Dict[str, Any],
     user_id: int,
-    trend_series: Optional[Dict[str, List[float]]] = None,  # NEW: for sparklines
-) -> str:
+    trend_series: Optional[Dict[str, List[float]]] = None,  # for sparklines
+) -> bytes:
+    """render_summary_doc() without the renderer: just the PDF bytes."""
+    return render_summary_doc(doctor_summary, patient_summary, metadata, user_id, trend_series).data
+
+
+def render_summary_doc(
+    doctor_summary: str,
+    patient_summary: str,
+    metadata: Dict[str, Any],
+    user_id: int,
+    trend_series: Optional[Dict[str, List[float]]] = None,
+) -> RenderedPdf:
     """
-    Build a PDF that mirrors the summary page:
+    Build a PDF that mirrors the summary page and return it with its renderer:
       - Health Metrics (donut gauge + range bar marker + sparkline)
       - Suggestions (home & meds)
       - Doctor / Patient summaries
-      - Optional PNG charts at the end
+      - Band-and-marker charts for this report's metrics (inline vectors)
+    Nothing is read from or written to disk; callers stream or cache the bytes.
+    user_id is kept for API compatibility.
     """
-    os.makedirs("generated_reports", exist_ok=True)
-    out_path = os.path.join("generated_reports", f"health_summary_{user_id}.pdf")
-
     metrics, incoming_ranges = _split_meta(metadata or {})
     ranges = _normalize_ranges(metrics, incoming_ranges)
     suggestions = generate_suggestions(metrics=metrics, ranges=ranges)
 
     # Prefer WeasyPrint HTML for a closer match; fall back to ReportLab.
-    if _HAS_WEASY:
-        html_str, css_str = _build_html_doc(
+    if pdf_renderer() == RENDERER_HTML:
+        html_str, _ = _build_html_doc(
             doctor_summary=doctor_summary,
             patient_summary=patient_summary,
             metrics=metrics,
             ranges=ranges,
             suggestions=suggestions,
-            user_id=user_id,
             series_map=trend_series or {},
         )
         try:
-            HTML(string=html_str).write_pdf(out_path, stylesheets=[CSS(string=css_str)])
-            return out_path
-        except Exception:
-            pass  # fall back
+            return RenderedPdf(render_html_pdf(html_str), RENDERER_HTML)
+        except Exception as e:
+            logger.warning("⚠️ WeasyPrint render failed, using ReportLab fallback: %s", e)
 
-    _build_reportlab_doc(
-        out_path=out_path,
+    data = _build_reportlab_doc(
         doctor_summary=doctor_summary,
         patient_summary=patient_summary,
         metrics=metrics,
         ranges=ranges,
         suggestions=suggestions,
+    )
+    return RenderedPdf(data, RENDERER_REPORTLAB)
+
+
+def generate_summary_pdf(
+    doctor_summary: str,
+    patient_summary: str,
+    metadata: Dict[str, Any],
+    user_id: int,
+    trend_series: Optional[Dict[str, List[float]]] = None,
+    out_path: Optional[str] = None,
+) -> str:
+    """
+    Legacy file-based entry point: render_summary_pdf + write to out_path
+    (default generated_reports/health_summary_{user_id}.pdf). Returns the path.
+    """
+    if out_path is None:
+        os.makedirs("generated_reports", exist_ok=True)
+        out_path = os.path.join("generated_reports", f"health_summary_{user_id}.pdf")
+
+    data = render_summary_pdf(
+        doctor_summary=doctor_summary,
+        patient_summary=patient_summary,
+        metadata=metadata,
         user_id=user_id,
+        trend_series=trend_series,
     )
+    with open(out_path, "wb") as f:
+        f.write(data)
     return out_path
 
 
 # -----------------------------
 # HTML (WeasyPrint)
 # -----------------------------
+# Module-level so render workers can parse it once (see render_pool)
+REPORT_CSS = """
+@page { size: A4; margin: 22mm; }
+body { font-family: Inter, Arial, Helvetica, sans-serif; color: #0f172a; }
+h1 { font-size: 22px; color: #166534; margin: 0 0 14px; }
+h2 { font-size: 16px; margin: 22px 0 10px; }
+.grid { display: grid; gap: 10px; grid-template-columns: repeat(3, 1fr); }
+.card { border: 1px solid #e5e7eb; border-radius: 12px; padding: 12px; background: #fff; }
+.row { display:flex; align-items:center; justify-content:space-between; }
+.badge { font-size: 11px; padding: 2px 8px; border-radius: 12px; }
+.badge-green { background: #ecfdf5; color: #059669; }
+.badge-red { background: #fef2f2; color: #dc2626; }
+.name { font-size: 13px; font-weight: 600; }
+.val { font-size: 16px; font-weight: 700; margin-top: 6px; }
+.unit { font-size: 11px; color:#6b7280; }
+.normal { font-size: 11px; color:#6b7280; margin-bottom:6px; }
+.bar-wrap { position: relative; height: 8px; background: #e5e7eb; border-radius: 999px; }
+.bar-fill { position:absolute; inset:0; background: rgba(34,197,94,0.18); border-radius: 999px; }
+.marker { position:absolute; top:-3px; width:2px; height:14px; background: #10b981; }
+.marker-red { background:#ef4444; }
+.section { margin-top: 18px; }
+ul { margin:6px 0 0 18px; padding:0; }
+li { margin: 2px 0; font-size: 12px; }
+.note { color:#6b7280; font-size:11px; margin-top: 4px; }
+.muted { font-size: 12px; color:#475569; white-space: pre-wrap; }
+.charts-grid { display:grid; gap:8px; grid-template-columns: repeat(2,1fr); margin-top: 8px; }
+.chart svg { width:100%; height:auto; border:1px solid #e5e7eb; border-radius:8px; }
+.chip { font-size:11px; padding:2px 8px; border-radius: 12px; background:#f1f5f9; color:#475569; }
+.row2 { display:grid; grid-template-columns: 86px 1fr; gap: 10px; align-items:center; }
+table.cmp { width:100%; border-collapse:collapse; font-size:11px; }
+table.cmp th, table.cmp td { border:1px solid #e2e8f0; padding:4px 6px; text-align:right; }
+table.cmp th { background:#f1f5f9; }
+table.cmp td.metric, table.cmp th.metric { text-align:left; font-weight:600; }
+.st-low, .st-high { color:#dc2626; font-weight:700; }
+.delta-up { color:#b45309; }
+.delta-down { color:#2563eb; }
+"""
+
+
 def _sparkline_path(series: List[float], w: int = 140, h: int = 28, pad: int = 3) -> str:
     pts = [float(x) for x in series if isinstance(x, (int, float))]
     if len(pts) < 2:
@@ -202,108 +293,84 @@ def _sparkline_path(series: List[float], w: int = 140, h: int = 28, pad: int = 3
     return " ".join(cmds)
 
 
+def _metric_card_html(m: str, v: float, r: Dict[str, Any], series: List[float]) -> str:
+    """One metric card: donut gauge + range bar marker + sparkline."""
+    lo = _coerce_float(r.get("min", 0.0))
+    hi = _coerce_float(r.get("max", 1.0))
+    unit = r.get("unit", "")
+    val = _coerce_float(v)
+    status = _status(val, lo, hi)
+    pct = 50.0 if not (hi > lo) else max(0.0, min(100.0, (val - lo) / (hi - lo) * 100.0))
+    is_abn = status != "normal"
+    badge_cls = "badge-red" if is_abn else "badge-green"
+    marker_cls = "marker-red" if is_abn else ""
+    color = "#ef4444" if is_abn else "#10b981"
+
+    # SVG donut ring (stroke dasharray)
+    size = 74
+    cx = cy = size / 2
+    rads = 30
+    circ = 2 * 3.14159265 * rads
+    dash = circ * pct / 100.0
+
+    # Sparkline path
+    sp_path = _sparkline_path(series, w=140, h=28, pad=3)
+
+    return f"""
+      <div class="card">
+        <div class="row">
+          <div class="name">{_html_escape(m)}</div>
+          <span class="badge {badge_cls}">{status.title()}</span>
+        </div>
+
+        <div class="row2" style="margin-top:8px">
+          <!-- Donut -->
+          <div>
+            <svg width="{size}" height="{size}" viewBox="0 0 {size} {size}">
+              <circle cx="{cx}" cy="{cy}" r="{rads}" stroke="#e5e7eb" stroke-width="8" fill="none"/>
+              <circle cx="{cx}" cy="{cy}" r="{rads}" stroke="{color}" stroke-width="8" fill="none"
+                      stroke-dasharray="{dash:.2f} {circ - dash:.2f}"
+                      transform="rotate(-90 {cx} {cy})"/>
+              <text x="{cx}" y="{cy - 2}" text-anchor="middle" font-size="13" font-weight="700" fill="{color}">{val:g}</text>
+              <text x="{cx}" y="{cy + 12}" text-anchor="middle" font-size="9" fill="#6b7280">{_html_escape(unit)}</text>
+            </svg>
+          </div>
+
+          <!-- Range bar + sparkline -->
+          <div>
+            <div class="normal">Normal: {_html_escape(f"{lo:g}")}–{_html_escape(f"{hi:g}")} {_html_escape(unit)}</div>
+            <div class="bar-wrap">
+              <div class="bar-fill"></div>
+              <div class="marker {marker_cls}" style="left: calc({pct}% - 1px)"></div>
+            </div>
+
+            <div style="margin-top:6px">
+              <svg width="140" height="28" viewBox="0 0 140 28">
+                <path d="{sp_path}" fill="none" stroke="{color}" stroke-width="2" />
+              </svg>
+            </div>
+          </div>
+        </div>
+      </div>
+    """
+
+
 def _build_html_doc(
     doctor_summary: str,
     patient_summary: str,
     metrics: Dict[str, float],
     ranges: Dict[str, Dict[str, Any]],
     suggestions: Dict[str, Any],
-    user_id: int,
     series_map: Dict[str, List[float]],
 ) -> Tuple[str, str]:
 
-    css = """
-    @page { size: A4; margin: 22mm; }
-    body { font-family: Inter, Arial, Helvetica, sans-serif; color: #0f172a; }
-    h1 { font-size: 22px; color: #166534; margin: 0 0 14px; }
-    h2 { font-size: 16px; margin: 22px 0 10px; }
-    .grid { display: grid; gap: 10px; grid-template-columns: repeat(3, 1fr); }
-    .card { border: 1px solid #e5e7eb; border-radius: 12px; padding: 12px; background: #fff; }
-    .row { display:flex; align-items:center; justify-content:space-between; }
-    .badge { font-size: 11px; padding: 2px 8px; border-radius: 12px; }
-    .badge-green { background: #ecfdf5; color: #059669; }
-    .badge-red { background: #fef2f2; color: #dc2626; }
-    .name { font-size: 13px; font-weight: 600; }
-    .val { font-size: 16px; font-weight: 700; margin-top: 6px; }
-    .unit { font-size: 11px; color:#6b7280; }
-    .normal { font-size: 11px; color:#6b7280; margin-bottom:6px; }
-    .bar-wrap { position: relative; height: 8px; background: #e5e7eb; border-radius: 999px; }
-    .bar-fill { position:absolute; inset:0; background: rgba(34,197,94,0.18); border-radius: 999px; }
-    .marker { position:absolute; top:-3px; width:2px; height:14px; background: #10b981; }
-    .marker-red { background:#ef4444; }
-    .section { margin-top: 18px; }
-    ul { margin:6px 0 0 18px; padding:0; }
-    li { margin: 2px 0; font-size: 12px; }
-    .note { color:#6b7280; font-size:11px; margin-top: 4px; }
-    .muted { font-size: 12px; color:#475569; white-space: pre-wrap; }
-    .charts-grid { display:grid; gap:8px; grid-template-columns: repeat(2,1fr); margin-top: 8px; }
-    .chip { font-size:11px; padding:2px 8px; border-radius: 12px; background:#f1f5f9; color:#475569; }
-    .row2 { display:grid; grid-template-columns: 86px 1fr; gap: 10px; align-items:center; }
-    """
+    css = REPORT_CSS
 
     # Build metric cards (donut + range bar + sparkline)
-    cards_html = []
-    for m, v in metrics.items():
-        r = ranges.get(m, {})
-        lo = _coerce_float(r.get("min", 0.0))
-        hi = _coerce_float(r.get("max", 1.0))
-        unit = r.get("unit", "")
-        val = _coerce_float(v)
-        status = _status(val, lo, hi)
-        pct = 50.0 if not (hi > lo) else max(0.0, min(100.0, (val - lo) / (hi - lo) * 100.0))
-        is_abn = status != "normal"
-        badge_cls = "badge-red" if is_abn else "badge-green"
-        marker_cls = "marker-red" if is_abn else ""
-        color = "#ef4444" if is_abn else "#10b981"
-
-        # SVG donut ring (stroke dasharray)
-        size = 74
-        cx = cy = size / 2
-        rads = 30
-        circ = 2 * 3.14159265 * rads
-        dash = circ * pct / 100.0
-
-        # Sparkline path
-        series = series_map.get(m, []) or []
-        sp_path = _sparkline_path(series, w=140, h=28, pad=3)
-
-        cards_html.append(f"""
-          <div class="card">
-            <div class="row">
-              <div class="name">{_html_escape(m)}</div>
-              <span class="badge {badge_cls}">{status.title()}</span>
-            </div>
-
-            <div class="row2" style="margin-top:8px">
-              <!-- Donut -->
-              <div>
-                <svg width="{size}" height="{size}" viewBox="0 0 {size} {size}">
-                  <circle cx="{cx}" cy="{cy}" r="{rads}" stroke="#e5e7eb" stroke-width="8" fill="none"/>
-                  <circle cx="{cx}" cy="{cy}" r="{rads}" stroke="{color}" stroke-width="8" fill="none"
-                          stroke-dasharray="{dash:.2f} {circ - dash:.2f}"
-                          transform="rotate(-90 {cx} {cy})"/>
-                  <text x="{cx}" y="{cy - 2}" text-anchor="middle" font-size="13" font-weight="700" fill="{color}">{val:g}</text>
-                  <text x="{cx}" y="{cy + 12}" text-anchor="middle" font-size="9" fill="#6b7280">{_html_escape(unit)}</text>
-                </svg>
-              </div>
-
-              <!-- Range bar + sparkline -->
-              <div>
-                <div class="normal">Normal: {_html_escape(f"{lo:g}")}–{_html_escape(f"{hi:g}")} {_html_escape(unit)}</div>
-                <div class="bar-wrap">
-                  <div class="bar-fill"></div>
-                  <div class="marker {marker_cls}" style="left: calc({pct}% - 1px)"></div>
-                </div>
-
-                <div style="margin-top:6px">
-                  <svg width="140" height="28" viewBox="0 0 140 28">
-                    <path d="{sp_path}" fill="none" stroke="{color}" stroke-width="2" />
-                  </svg>
-                </div>
-              </div>
-            </div>
-          </div>
-        """)
+    cards_html = [
+        _metric_card_html(m, v, ranges.get(m, {}), series_map.get(m, []) or [])
+        for m, v in metrics.items()
+    ]
 
     metrics_section = f"""
       <h2>📊 Health Metrics</h2>
@@ -342,16 +409,16 @@ def _build_html_doc(
     doc_sum = f"<h2>🩺 Doctor Summary</h2><div class='muted'>{_html_escape(doctor_summary)}</div>"
     pat_sum = f"<h2>👤 Patient Summary</h2><div class='muted'>{_html_escape(patient_summary)}</div>"
 
+    # Charts for exactly this report's metrics, inlined as SVG (no file:// fetches)
     charts_html = ""
-    charts_dir = os.path.join("app", "charts", f"user_{user_id}")
-    if os.path.isdir(charts_dir):
-        imgs = []
-        for fname in sorted(os.listdir(charts_dir)):
-            if fname.lower().endswith(".png"):
-                imgs.append(os.path.join(charts_dir, fname).replace("\\", "/"))
-        if imgs:
-            img_tags = "".join([f'<img src="file:///{_html_escape(p)}" style="width:100%;border:1px solid #e5e7eb;border-radius:8px" />' for p in imgs])
-            charts_html = f"<h2>📈 Metric Charts (reference)</h2><div class='charts-grid'>{img_tags}</div>"
+    chart_svgs = []
+    for m, v in metrics.items():
+        r = ranges.get(m, {})
+        chart_svgs.append(
+            f"<div class='chart'>{render_chart_svg(m, _coerce_float(v), _coerce_float(r.get('min', 0.0)), _coerce_float(r.get('max', 1.0)), r.get('unit', ''))}</div>"
+        )
+    if chart_svgs:
+        charts_html = f"<h2>📈 Metric Charts (reference)</h2><div class='charts-grid'>{''.join(chart_svgs)}</div>"
 
     html_doc = f"""
     <html>
@@ -370,17 +437,161 @@ def _build_html_doc(
 
 
 # -----------------------------
-# ReportLab fallback (unchanged layout)
+# Multi-report comparison
 # -----------------------------
+def _fmt_delta(d: Optional[float]) -> Tuple[str, str]:
+    if d is None:
+        return "–", ""
+    if d > 0:
+        return f"+{d:g}", "delta-up"
+    if d < 0:
+        return f"{d:g}", "delta-down"
+    return "0", ""
+
+
+def _build_comparison_html_doc(
+    reports: List[Dict[str, Any]],
+    rows: List[Dict[str, Any]],
+) -> str:
+    """
+    reports: [{"id", "date"}] oldest first; rows: per-metric dicts from
+    report_compare.compute_metric_deltas. Uses REPORT_CSS like the summary PDF.
+    """
+    # Latest value per metric, with the compared values as its sparkline
+    cards = []
+    for row in rows:
+        present = [v for v in row["values"] if v is not None]
+        if not present:
+            continue
+        cards.append(_metric_card_html(row["metric"], present[-1], row["range"], present))
+
+    head = "".join(
+        f"<th>#{_html_escape(str(r['id']))}<br/>{_html_escape(r['date'])}</th>" for r in reports
+    )
+    body = []
+    for row in rows:
+        rng = row["range"]
+        lo, hi = _coerce_float(rng.get("min")), _coerce_float(rng.get("max"))
+        cells = []
+        for v in row["values"]:
+            if v is None:
+                cells.append("<td>–</td>")
+            else:
+                cells.append(f"<td class='st-{_status(v, lo, hi)}'>{v:g}</td>")
+        d_prev, cls_prev = _fmt_delta(row["delta_prev"])
+        d_total, cls_total = _fmt_delta(row["delta_total"])
+        body.append(
+            f"<tr><td class='metric'>{_html_escape(row['metric'])}</td>"
+            f"<td>{lo:g}–{hi:g} {_html_escape(rng.get('unit', ''))}</td>"
+            f"{''.join(cells)}"
+            f"<td class='{cls_prev}'>{d_prev}</td><td class='{cls_total}'>{d_total}</td></tr>"
+        )
+
+    return f"""
+    <html>
+      <head><meta charset="utf-8" /></head>
+      <body>
+        <h1>Health Report Comparison</h1>
+        <div class="muted">{len(reports)} reports, {_html_escape(reports[0]['date'])} → {_html_escape(reports[-1]['date'])}</div>
+        <h2>📊 Latest values</h2>
+        <div class="grid">{''.join(cards)}</div>
+        <div class="section">
+          <h2>↔️ Side by side</h2>
+          <table class="cmp">
+            <thead><tr><th class="metric">Metric</th><th>Normal</th>{head}<th>Δ last</th><th>Δ total</th></tr></thead>
+            <tbody>{''.join(body)}</tbody>
+          </table>
+        </div>
+      </body>
+    </html>
+    """
+
+
+def render_comparison_pdf(
+    reports: List[Dict[str, Any]],
+    rows: List[Dict[str, Any]],
+) -> bytes:
+    """render_comparison_doc() without the renderer: just the PDF bytes."""
+    return render_comparison_doc(reports, rows).data
+
+
+def render_comparison_doc(
+    reports: List[Dict[str, Any]],
+    rows: List[Dict[str, Any]],
+) -> RenderedPdf:
+    """Single PDF comparing several reports side by side (see report_compare), with its renderer."""
+    if pdf_renderer() == RENDERER_HTML:
+        try:
+            return RenderedPdf(render_html_pdf(_build_comparison_html_doc(reports, rows)), RENDERER_HTML)
+        except Exception as e:
+            logger.warning("⚠️ WeasyPrint render failed, using ReportLab fallback: %s", e)
+
+    buf = io.BytesIO()
+    doc = SimpleDocTemplate(buf, pagesize=letter)
+    styles = getSampleStyleSheet()
+    data = [["Metric", "Normal"] + [f"#{r['id']}\n{r['date']}" for r in reports] + ["Δ last", "Δ total"]]
+    for row in rows:
+        rng = row["range"]
+        data.append(
+            [row["metric"], f"{_coerce_float(rng.get('min')):g}–{_coerce_float(rng.get('max')):g} {rng.get('unit', '')}".strip()]
+            + ["–" if v is None else f"{v:g}" for v in row["values"]]
+            + [_fmt_delta(row["delta_prev"])[0], _fmt_delta(row["delta_total"])[0]]
+        )
+    table = Table(data, repeatRows=1)
+    table.setStyle(
+        TableStyle(
+            [
+                ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#f1f5f9")),
+                ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+                ("FONTSIZE", (0, 0), (-1, -1), 8),
+                ("GRID", (0, 0), (-1, -1), 0.25, colors.HexColor("#e2e8f0")),
+            ]
+        )
+    )
+    doc.build([
+        Paragraph("<b>Health Report Comparison</b>", styles["Title"]),
+        Spacer(1, 10),
+        table,
+    ])
+    return RenderedPdf(buf.getvalue(), RENDERER_REPORTLAB)
+
+
+# -----------------------------
+# ReportLab fallback
+# -----------------------------
+def _reportlab_chart(metric: str, val: float, lo: float, hi: float, unit: str,
+                     w: float = 440, h: float = 120) -> Drawing:
+    """Vector band-and-marker chart (same design as render_chart_svg)."""
+    x_lo = min(val, lo) - 1
+    x_hi = max(val, hi) + 1
+    span = (x_hi - x_lo) or 1.0
+    pad, top, bottom = 10, 22, 22
+    plot_w = w - pad * 2
+    plot_h = h - top - bottom
+
+    def sx(x: float) -> float:
+        return pad + (x - x_lo) / span * plot_w
+
+    band = colors.HexColor("#1f77b4")
+    d = Drawing(w, h)
+    d.add(Rect(pad, bottom, plot_w, plot_h, strokeColor=colors.HexColor("#334155"), fillColor=None, strokeWidth=0.5))
+    d.add(Rect(sx(lo), bottom, max(0.0, sx(hi) - sx(lo)), plot_h, strokeColor=None,
+               fillColor=colors.Color(band.red, band.green, band.blue, alpha=0.25)))
+    d.add(Line(sx(val), bottom, sx(val), bottom + plot_h, strokeColor=band, strokeWidth=2))
+    d.add(String(w / 2, h - 14, f"{metric}: {val:g}", textAnchor="middle", fontSize=10))
+    label = f"{metric} ({unit})" if unit else metric
+    d.add(String(w / 2, 6, f"{label}   normal {lo:g}–{hi:g}", textAnchor="middle", fontSize=8,
+                 fillColor=colors.HexColor("#475569")))
+    return d
+
+
 def _build_reportlab_doc(
-    out_path: str,
     doctor_summary: str,
     patient_summary: str,
     metrics: Dict[str, float],
     ranges: Dict[str, Dict[str, Any]],
     suggestions: Dict[str, Any],
-    user_id: int,
-) -> None:
+) -> bytes:
     buf = io.BytesIO()
     doc = SimpleDocTemplate(buf, pagesize=letter)
     styles = getSampleStyleSheet()
@@ -443,20 +654,20 @@ def _build_reportlab_doc(
     elements.append(Paragraph(_html_escape(patient_summary).replace("\n", "<br/>"), styles["Normal"]))
     elements.append(Spacer(1, 12))
 
-    charts_dir = os.path.join("app", "charts", f"user_{user_id}")
-    if os.path.isdir(charts_dir):
+    if metrics:
         elements.append(Paragraph("📈 Metric Charts (reference)", styles["Heading2"]))
-        for fname in sorted(os.listdir(charts_dir)):
-            if not fname.lower().endswith(".png"):
-                continue
-            img_path = os.path.join(charts_dir, fname)
-            try:
-                elements.append(Image(img_path, width=440, height=200))
-                elements.append(Spacer(1, 8))
-            except Exception:
-                continue
+        for m, v in metrics.items():
+            r = ranges.get(m, {})
+            elements.append(
+                _reportlab_chart(
+                    m,
+                    _coerce_float(v),
+                    _coerce_float(r.get("min", 0.0)),
+                    _coerce_float(r.get("max", 1.0)),
+                    r.get("unit", ""),
+                )
+            )
+            elements.append(Spacer(1, 8))
 
     doc.build(elements)
-
-    with open(out_path, "wb") as f:
-        f.write(buf.getvalue())
+    return buf.getvalue()
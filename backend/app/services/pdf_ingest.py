@@ -0,0 +1,278 @@
+# app/services/pdf_ingest.py
+"""
+Offline bulk ingestion of a directory of PDF reports.
+
+The parent process walks the directory, hashes every file not yet in the
+checkpoint and drops duplicates: content the user already has in
+report_history (uploaded through /upload or ingested earlier; both store the
+file's sha256 in content_hash), or a copy seen earlier in the run. Reports
+uploaded before content_hash existed have no hash and are not matched.
+A process pool runs the upload pipeline (summary.build_report, without
+charts) on the rest. The parent stores the results with store_reports_in_db,
+batch_size reports per transaction, and appends each finished file to a
+JSONL checkpoint once its batch has committed. A rerun skips everything in the checkpoint, so a crash
+costs at most one batch of work, and the content hashes keep that batch
+from being stored twice.
+"""
+from __future__ import annotations
+
+import os
+import json
+import time
+import hashlib
+import logging
+import multiprocessing
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import select
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_NAME = ".ingest_checkpoint.jsonl"
+
+# files hashed (and checked against the database) per round trip
+_HASH_CHUNK = 500
+
+
+class PdfTask(NamedTuple):
+    path: str       # absolute path
+    rel: str        # path relative to the ingested root (checkpoint key)
+    size: int
+    mtime: float
+    user_id: int
+    sha256: str
+
+
+class IngestProgress(NamedTuple):
+    done: int        # files processed by the pipeline so far
+    total: int       # files the pipeline has to process in this run
+    stored: int
+    duplicates: int
+    failed: int
+    elapsed: float   # seconds since the pipeline started
+
+    @property
+    def rate(self) -> float:
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> Optional[float]:
+        """Seconds until the remaining files are done, at the current rate."""
+        return (self.total - self.done) / self.rate if self.rate > 0 else None
+
+
+# -----------------------------
+# Files / checkpoint
+# -----------------------------
+def _file_key(rel: str, size: int, mtime: float) -> str:
+    return f"{rel}|{size}|{int(mtime)}"
+
+
+def find_pdfs(root: str) -> Iterator[Tuple[str, str, int, float]]:
+    """(relative path, absolute path, size, mtime) of every PDF under root, sorted."""
+    root = os.path.abspath(root)
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for name in sorted(filenames):
+            if not name.lower().endswith(".pdf"):
+                continue
+            path = os.path.join(dirpath, name)
+            st = os.stat(path)
+            yield os.path.relpath(path, root), path, st.st_size, st.st_mtime
+
+
+def sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_checkpoint(path: str) -> Dict[str, Dict[str, Any]]:
+    """{file key: entry} from a checkpoint file; a torn last line (crash) is ignored."""
+    out: Dict[str, Dict[str, Any]] = {}
+    if not os.path.exists(path):
+        return out
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            out[entry["key"]] = entry
+    return out
+
+
+class _Checkpoint:
+    """Append-only JSONL checkpoint, fsynced after every write."""
+
+    def __init__(self, path: str):
+        self._f = open(path, "a", encoding="utf-8")
+
+    def write(self, entries: List[Dict[str, Any]]) -> None:
+        if not entries:
+            return
+        self._f.write("".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries))
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def close(self) -> None:
+        self._f.close()
+
+
+def _entry(task: PdfTask, status: str, **extra: Any) -> Dict[str, Any]:
+    return {"key": _file_key(task.rel, task.size, task.mtime), "path": task.rel, "sha256": task.sha256,
+            "user_id": task.user_id, "status": status, **extra}
+
+
+def _stored_hashes(pairs: Set[Tuple[int, str]]) -> Set[Tuple[int, str]]:
+    """The (user_id, content_hash) pairs that already exist in report_history."""
+    from app.core.database import engine
+    from app.models.history import ReportHistory  # local import
+
+    if not pairs:
+        return set()
+    rh = ReportHistory.__table__
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(rh.c.user_id, rh.c.content_hash).where(
+                rh.c.user_id.in_({u for u, _ in pairs}),
+                rh.c.content_hash.in_({h for _, h in pairs}),
+            )
+        )
+        return {(u, h) for u, h in rows} & pairs
+
+
+# -----------------------------
+# Pipeline
+# -----------------------------
+def process_pdf(task: PdfTask) -> Tuple[PdfTask, Optional[Dict[str, Any]], Optional[str]]:
+    """Pool worker: the upload pipeline for one file. No database access."""
+    from app.services.summary import build_report  # local import (loaded once per worker)
+
+    try:
+        return task, build_report(task.path, user_id=task.user_id, charts=False), None
+    except Exception as e:
+        return task, None, f"{type(e).__name__}: {e}"
+
+
+def _report_row(task: PdfTask, result: Dict[str, Any], use_mtime: bool) -> Dict[str, Any]:
+    return {
+        "user_id": task.user_id,
+        "doctor_summary": result.get("doctor_summary") or "",
+        "patient_summary": result.get("patient_summary") or "",
+        "summary_model": result.get("summary_model"),
+        "summary_prompt_version": result.get("summary_prompt_version"),
+        "metadata": result.get("metrics") or {},
+        "ranges": result.get("ranges") or {},
+        "filename": os.path.basename(task.path)[:255],
+        "content_hash": task.sha256,
+        "uploaded_at": datetime.utcfromtimestamp(task.mtime) if use_mtime else None,
+    }
+
+
+def ingest_pdf_directory(
+    root: str,
+    user_for: Callable[[str], Optional[int]],
+    workers: int = 0,
+    batch_size: int = 50,
+    checkpoint_path: Optional[str] = None,
+    retry_failed: bool = False,
+    use_mtime: bool = True,
+    on_progress: Optional[Callable[[IngestProgress], None]] = None,
+) -> IngestProgress:
+    """
+    Ingest every new PDF under root. user_for maps a file's relative path to
+    its user id (None = skip the file, it is retried on the next run).
+    workers=0 uses one process per CPU; workers=1 runs in this process.
+    With use_mtime, uploaded_at is the file's modification time, so trends
+    follow the original report dates rather than the ingestion date.
+    """
+    from app.core.database import store_reports_in_db
+
+    checkpoint_path = checkpoint_path or os.path.join(root, CHECKPOINT_NAME)
+    done = load_checkpoint(checkpoint_path)
+    checkpoint = _Checkpoint(checkpoint_path)
+    stored = duplicates = failed = 0
+
+    try:
+        # ---- select, hash and dedupe (parent) ----
+        candidates: List[Tuple[str, str, int, float, int]] = []
+        for rel, path, size, mtime in find_pdfs(root):
+            prev = done.get(_file_key(rel, size, mtime))
+            if prev is not None and (prev["status"] != "failed" or not retry_failed):
+                continue
+            user_id = user_for(rel)
+            if user_id is None:
+                logger.warning("⚠️ No user for %s, skipped", rel)
+                continue
+            candidates.append((rel, path, size, mtime, user_id))
+
+        pending: List[PdfTask] = []
+        seen: Set[Tuple[int, str]] = set()
+        for start in range(0, len(candidates), _HASH_CHUNK):
+            chunk = [
+                PdfTask(path, rel, size, mtime, user_id, sha256_file(path))
+                for rel, path, size, mtime, user_id in candidates[start:start + _HASH_CHUNK]
+            ]
+            known = _stored_hashes({(t.user_id, t.sha256) for t in chunk})
+            dups = []
+            for t in chunk:
+                key = (t.user_id, t.sha256)
+                if key in known or key in seen:
+                    dups.append(_entry(t, "duplicate"))
+                else:
+                    seen.add(key)
+                    pending.append(t)
+            checkpoint.write(dups)
+            duplicates += len(dups)
+        logger.info("📂 %d new PDFs to ingest (%d duplicates skipped)", len(pending), duplicates)
+
+        # ---- pipeline (pool) + batched writes (parent) ----
+        started = time.perf_counter()
+        buffer: List[Tuple[PdfTask, Dict[str, Any]]] = []
+        failures: List[Dict[str, Any]] = []
+        processed = 0
+
+        def _flush() -> None:
+            nonlocal stored
+            if buffer:
+                ids = store_reports_in_db([_report_row(t, r, use_mtime) for t, r in buffer])
+                checkpoint.write([_entry(t, "stored", report_id=rid) for (t, _), rid in zip(buffer, ids)])
+                stored += len(ids)
+                buffer.clear()
+            checkpoint.write(failures)
+            failures.clear()
+
+        def _progress() -> IngestProgress:
+            return IngestProgress(processed, len(pending), stored, duplicates, failed, time.perf_counter() - started)
+
+        if workers == 1:
+            results = map(process_pdf, pending)
+            pool = None
+        else:
+            pool = multiprocessing.get_context("spawn").Pool(workers or os.cpu_count() or 1)
+            results = pool.imap_unordered(process_pdf, pending)
+        try:
+            for task, result, error in results:
+                processed += 1
+                if error is not None:
+                    failed += 1
+                    failures.append(_entry(task, "failed", error=error[:500]))
+                    logger.warning("❌ %s: %s", task.rel, error)
+                else:
+                    buffer.append((task, result))
+                if len(buffer) >= batch_size:
+                    _flush()
+                if on_progress:
+                    on_progress(_progress())
+            _flush()
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+        return _progress()
+    finally:
+        checkpoint.close()
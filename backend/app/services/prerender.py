@@ -0,0 +1,104 @@
+# app/services/prerender.py
+"""
+Background pre-rendering of a report's PDF right after upload.
+
+Users almost always hit /download-report straight after /upload, so we render
+the PDF (with its trend series) into pdf_cache while they read the summary.
+Work is bounded (small thread pool + max pending jobs), skipped under load,
+and cancellable per user: a newer upload supersedes a pending render.
+"""
+from __future__ import annotations
+
+import os
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from app.core.database import SessionLocal
+from app.services.report_pdf import prepare_report_pdf, render_report_pdf
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------
+# Settings
+# -----------------------------
+PRERENDER_ENABLED = os.getenv("PDF_PRERENDER_ENABLED", "true").lower() == "true"
+PRERENDER_WORKERS = int(os.getenv("PDF_PRERENDER_WORKERS", "2"))
+# More queued/running jobs than this counts as "under load": new ones are skipped
+PRERENDER_MAX_PENDING = int(os.getenv("PDF_PRERENDER_MAX_PENDING", "8"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+# user_id -> (future, cancel flag) of that user's latest scheduled render
+_pending: Dict[int, Tuple[Future, threading.Event]] = {}
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=max(1, PRERENDER_WORKERS), thread_name_prefix="pdf-prerender")
+    return _executor
+
+
+def _run(user_id: int, report_id: int, cancelled: threading.Event) -> None:
+    db = SessionLocal()
+    try:
+        job = prepare_report_pdf(db, user_id=user_id, report_id=report_id)
+    finally:
+        db.close()
+    if job is None or cancelled.is_set():
+        return
+    render_report_pdf(job)
+    logger.info("📄 Pre-rendered PDF for report %s", report_id)
+
+
+def _cancel_locked(user_id: int) -> bool:
+    entry = _pending.pop(user_id, None)
+    if entry is None:
+        return False
+    fut, flag = entry
+    flag.set()        # a job already past the DB load will skip rendering
+    fut.cancel()      # a job still queued never starts
+    return True
+
+
+def schedule_prerender(user_id: int, report_id: int) -> bool:
+    """Queue a background render of report_id. Returns False if skipped."""
+    if not PRERENDER_ENABLED:
+        return False
+    with _lock:
+        _cancel_locked(user_id)
+        active = sum(1 for fut, _ in _pending.values() if not fut.done())
+        if active >= PRERENDER_MAX_PENDING:
+            logger.info("⏭️ Skipping PDF pre-render for report %s (%d jobs pending)", report_id, active)
+            return False
+
+        flag = threading.Event()
+        fut = _get_executor().submit(_run, user_id, report_id, flag)
+        _pending[user_id] = (fut, flag)
+
+    def _done(f: Future) -> None:
+        with _lock:
+            if _pending.get(user_id, (None,))[0] is f:
+                del _pending[user_id]
+        if not f.cancelled() and f.exception() is not None:
+            logger.warning("⚠️ PDF pre-render failed for report %s: %s", report_id, f.exception())
+
+    fut.add_done_callback(_done)
+    return True
+
+
+def cancel_prerender(user_id: int) -> bool:
+    with _lock:
+        return _cancel_locked(user_id)
+
+
+def shutdown_prerender() -> None:
+    global _executor
+    with _lock:
+        for user_id in list(_pending):
+            _cancel_locked(user_id)
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
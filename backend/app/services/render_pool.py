@@ -0,0 +1,194 @@
+# app/services/render_pool.py
+"""
+Dedicated pool of long-lived WeasyPrint worker processes.
+
+Each worker parses REPORT_CSS and builds its font configuration once (in the
+pool initializer) and then renders HTML jobs pulled from the executor's queue.
+The API process only submits HTML strings and waits with a per-job timeout;
+it never imports or runs WeasyPrint itself.
+
+A job that times out while running cannot be cancelled, so its worker is
+killed by recycling the whole pool (jobs caught in the recycle are
+resubmitted once). A pool that breaks (a worker crashed or failed to start)
+is rebuilt after an exponential backoff; until then PDFs use the fallback
+renderer.
+"""
+from __future__ import annotations
+
+import os
+import time
+import logging
+import threading
+import importlib.util
+import multiprocessing
+from concurrent.futures import CancelledError, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------
+# Settings
+# -----------------------------
+RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", str(os.cpu_count() or 2)))
+RENDER_TIMEOUT_SECONDS = float(os.getenv("PDF_RENDER_TIMEOUT_SECONDS", "60"))
+# Recycle workers periodically so fontconfig/cairo memory cannot creep up forever
+RENDER_MAX_TASKS_PER_CHILD = int(os.getenv("PDF_RENDER_MAX_TASKS_PER_CHILD", "200"))
+# Backoff before rebuilding a broken pool: doubles per consecutive failure, capped
+RENDER_RETRY_BASE_SECONDS = float(os.getenv("PDF_RENDER_RETRY_BASE_SECONDS", "5"))
+RENDER_RETRY_MAX_SECONDS = float(os.getenv("PDF_RENDER_RETRY_MAX_SECONDS", "300"))
+
+
+class RenderTimeout(RuntimeError):
+    """A render job did not finish within its timeout."""
+
+
+class RenderPoolUnavailable(RuntimeError):
+    """WeasyPrint workers cannot be started (missing library / broken pool)."""
+
+
+# -----------------------------
+# Worker side
+# -----------------------------
+_worker_css: Any = None
+_worker_fonts: Any = None
+
+
+def _init_worker() -> None:
+    """Runs once per worker process: parse the stylesheet and warm fonts."""
+    global _worker_css, _worker_fonts
+    from weasyprint import HTML, CSS  # type: ignore
+    try:
+        from weasyprint.text.fonts import FontConfiguration  # type: ignore  # weasyprint >= 53
+    except ImportError:
+        from weasyprint.fonts import FontConfiguration  # type: ignore
+
+    from app.services.pdf_generator import REPORT_CSS  # local import (cycle)
+
+    _worker_fonts = FontConfiguration()
+    _worker_css = CSS(string=REPORT_CSS, font_config=_worker_fonts)
+    # First layout loads fontconfig/pango caches; pay for it before real jobs arrive
+    HTML(string="<p>warm-up</p>").write_pdf(stylesheets=[_worker_css], font_config=_worker_fonts)
+
+
+def _restricted_url_fetcher(url: str, timeout: int = 10, ssl_context: Any = None) -> dict:
+    """
+    Report HTML is self-contained (inline SVG/CSS), so the only resources a
+    job may reference are data: URIs. Anything else (file://, http://) is
+    refused instead of touching the filesystem or network.
+    """
+    if not url.startswith("data:"):
+        raise ValueError(f"Blocked resource in report HTML: {url[:80]!r}")
+    from weasyprint import default_url_fetcher  # type: ignore
+    return default_url_fetcher(url, timeout=timeout, ssl_context=ssl_context)
+
+
+def _render_job(html_str: str) -> bytes:
+    from weasyprint import HTML  # type: ignore  # already imported by _init_worker
+    doc = HTML(string=html_str, url_fetcher=_restricted_url_fetcher)
+    return doc.write_pdf(stylesheets=[_worker_css], font_config=_worker_fonts)
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+# -----------------------------
+# API side
+# -----------------------------
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_failures = 0          # consecutive pool failures (drives the backoff)
+_retry_at = 0.0        # time.monotonic() before which no new pool is started
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            if time.monotonic() < _retry_at:
+                raise RenderPoolUnavailable("render pool restarting after a failure")
+            _pool = ProcessPoolExecutor(
+                max_workers=max(1, RENDER_WORKERS),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                max_tasks_per_child=RENDER_MAX_TASKS_PER_CHILD or None,
+            )
+            logger.info("🖨️ PDF render pool started (%s workers)", RENDER_WORKERS)
+        return _pool
+
+
+def render_pool_available() -> bool:
+    return time.monotonic() >= _retry_at and importlib.util.find_spec("weasyprint") is not None
+
+
+def start_render_pool() -> None:
+    """Spin workers up eagerly (app startup) so the first download is not a cold start."""
+    if importlib.util.find_spec("weasyprint") is None:
+        logger.info("WeasyPrint not installed; PDFs will use the ReportLab fallback")
+        return
+    pool = None
+    try:
+        pool = _get_pool()
+        for fut in [pool.submit(_ping) for _ in range(max(1, RENDER_WORKERS))]:
+            fut.result(timeout=RENDER_TIMEOUT_SECONDS)
+    except Exception as e:
+        _mark_broken(pool, e)
+
+
+def _retire_pool(pool: Optional[ProcessPoolExecutor], kill: bool) -> None:
+    """Stop using `pool` (if still current). kill=True also kills its workers, e.g. a stuck render."""
+    global _pool
+    if pool is None:
+        return
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    if kill:
+        # running jobs cannot be cancelled; killing the worker is the only way out
+        for proc in list((getattr(pool, "_processes", None) or {}).values()):
+            proc.kill()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_render_pool() -> None:
+    _retire_pool(_pool, kill=False)
+
+
+def _mark_broken(pool: Optional[ProcessPoolExecutor], err: Exception) -> None:
+    global _failures, _retry_at
+    with _pool_lock:
+        _failures += 1
+        delay = min(RENDER_RETRY_MAX_SECONDS, RENDER_RETRY_BASE_SECONDS * 2 ** (_failures - 1))
+        _retry_at = time.monotonic() + delay
+    logger.warning("⚠️ PDF render pool unavailable (%s); rebuilding in %.0fs", err, delay)
+    _retire_pool(pool, kill=True)
+
+
+def render_html_pdf(html_str: str, timeout: Optional[float] = None) -> bytes:
+    """
+    Render HTML to PDF bytes in a pool worker. Raises RenderTimeout if the job
+    exceeds its timeout and RenderPoolUnavailable if WeasyPrint cannot run.
+    """
+    global _failures
+    timeout = timeout or RENDER_TIMEOUT_SECONDS
+    for attempt in range(2):
+        pool = _get_pool()
+        try:
+            fut = pool.submit(_render_job, html_str)
+            data = fut.result(timeout=timeout)
+        except FutureTimeout:
+            if not fut.cancel():
+                logger.warning("⚠️ PDF render stuck for %gs; recycling the render pool", timeout)
+                _retire_pool(pool, kill=True)
+            raise RenderTimeout(f"PDF render exceeded {timeout:g}s")
+        except (BrokenProcessPool, CancelledError, RuntimeError) as e:
+            if pool is not _pool and attempt == 0:
+                continue  # the pool was recycled under this job (another job's timeout): resubmit
+            if isinstance(e, RuntimeError) and not isinstance(e, BrokenProcessPool):
+                raise  # an error from the render itself
+            _mark_broken(pool, e)
+            raise RenderPoolUnavailable(str(e))
+        _failures = 0
+        return data
+    raise RenderPoolUnavailable("render pool recycled twice during one job")
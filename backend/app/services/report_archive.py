@@ -0,0 +1,136 @@
+# app/services/report_archive.py
+"""
+Compaction of old report_history rows into report_archive.
+
+Rows older than ARCHIVE_AFTER_DAYS get their summaries and metadata
+compressed into one report_archive payload, and the large text columns in
+report_history are cleared, so the hot table keeps only small fixed-size
+columns. ORM reads stay transparent (see ReportHistory in models/history.py).
+
+Only rows whose metrics are already in report_metric are archived, so trend
+and sparkline queries never need the archived metadata.
+"""
+from __future__ import annotations
+
+import os
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, NamedTuple, Optional
+
+from sqlalchemy import bindparam, exists, inspect, select, text
+
+from app.utils.archive_codec import compress_fields
+from app.utils.json_codec import METADATA_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+
+# canonical field -> every report_history column that may hold it (legacy names too)
+_ARCHIVED_COLUMNS = {
+    "doctor_summary": ("doctor_summary", "summary_doctor"),
+    "patient_summary": ("patient_summary", "summary_patient"),
+    "report_metadata": METADATA_COLUMNS,
+}
+
+
+class CompactionResult(NamedTuple):
+    rows: int
+    raw_bytes: int
+    stored_bytes: int
+
+
+def compact_report_history(
+    older_than_days: int = ARCHIVE_AFTER_DAYS,
+    batch_size: int = 500,
+    max_rows: Optional[int] = None,
+) -> CompactionResult:
+    """
+    Archive eligible rows in id order, one write transaction per batch, so it
+    can run in the background next to uploads and resume after interruption.
+    """
+    from app.core.database import begin_write, engine
+    from app.models.history import ReportArchive, ReportHistory, ReportMetric  # local import
+
+    rh = ReportHistory.__table__
+    ra = ReportArchive.__table__
+    rm = ReportMetric.__table__
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+
+    # cleared value per live column: NULL, or '' where a legacy schema says NOT NULL
+    with engine.connect() as conn:
+        live = {c["name"]: c for c in inspect(conn).get_columns(rh.name)}
+    cleared: Dict[str, Optional[str]] = {
+        col: (None if live[col].get("nullable", True) else "")
+        for cols in _ARCHIVED_COLUMNS.values()
+        for col in cols
+        if col in live
+    }
+    select_cols = ", ".join(cleared)
+    set_clause = ", ".join(f"{col} = :{col}" for col in cleared)
+
+    rows = raw_total = stored_total = 0
+    last_id = 0
+    while max_rows is None or rows < max_rows:
+        limit = batch_size if max_rows is None else min(batch_size, max_rows - rows)
+        with begin_write() as conn:
+            ids = [
+                rid
+                for (rid,) in conn.execute(
+                    select(rh.c.id)
+                    .where(rh.c.id > last_id)
+                    .where(rh.c.archived_at.is_(None))
+                    .where(rh.c.uploaded_at < cutoff)
+                    .where(exists().where(rm.c.report_id == rh.c.id))
+                    .order_by(rh.c.id)
+                    .limit(limit)
+                )
+            ]
+            if not ids:
+                break
+            last_id = ids[-1]
+
+            batch = conn.execute(
+                text(f"SELECT id, {select_cols} FROM {rh.name} WHERE id IN :ids").bindparams(
+                    bindparam("ids", expanding=True)
+                ),
+                {"ids": ids},
+            ).mappings().all()
+
+            archives = []
+            now = datetime.utcnow()
+            for r in batch:
+                fields = {
+                    name: next((r[c] for c in cols if c in cleared and r[c]), None)
+                    for name, cols in _ARCHIVED_COLUMNS.items()
+                }
+                raw = len(json.dumps(fields, ensure_ascii=False).encode("utf-8"))
+                payload = compress_fields(fields)
+                archives.append({"report_id": r["id"], "payload": payload, "raw_bytes": raw, "archived_at": now})
+                raw_total += raw
+                stored_total += len(payload)
+
+            conn.execute(ra.insert(), archives)
+            conn.execute(
+                text(f"UPDATE {rh.name} SET {set_clause}, archived_at = :archived_at WHERE id = :id"),
+                [{**cleared, "archived_at": now, "id": a["report_id"]} for a in archives],
+            )
+            rows += len(archives)
+        logger.info("🗜️ Archived %d report rows (%d -> %d bytes)", rows, raw_total, stored_total)
+
+    return CompactionResult(rows=rows, raw_bytes=raw_total, stored_bytes=stored_total)
+
+
+def reclaim_space() -> None:
+    """Give freed pages back after a large compaction (OPTIMIZE TABLE / VACUUM)."""
+    from app.core.database import engine
+    from app.models.history import ReportHistory  # local import
+
+    name = ReportHistory.__tablename__
+    if engine.dialect.name == "mysql":
+        with engine.connect() as conn:
+            conn.exec_driver_sql(f"OPTIMIZE TABLE {name}")
+    elif engine.dialect.name == "sqlite":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.exec_driver_sql("VACUUM")
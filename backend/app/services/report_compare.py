@@ -0,0 +1,130 @@
+# app/services/report_compare.py
+"""
+Multi-report comparison: fetch N reports in one query, compute per-metric
+deltas and render them into a single PDF (cached like single reports).
+"""
+from __future__ import annotations
+
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session, selectinload
+
+from app.services.pdf_cache import CachedPdf, etag_for, pdf_cache, pdf_cache_key, pdf_content_hash
+from app.services.pdf_generator import _split_meta, _normalize_ranges, pdf_renderer, render_comparison_doc
+from app.utils.json_codec import report_metadata
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on reports per comparison (keeps the table printable)
+MAX_COMPARE_REPORTS = 12
+
+
+def compute_metric_deltas(reports: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    reports: oldest first, each {"metrics": {...}, "ranges": {...}}.
+    Returns one row per metric (first-seen order):
+      {"metric", "range", "values": [float|None per report],
+       "delta_prev": last - previous present value, "delta_total": last - first}
+    """
+    order: List[str] = []
+    for rep in reports:
+        for m in rep["metrics"]:
+            if m not in order:
+                order.append(m)
+
+    rows: List[Dict[str, Any]] = []
+    for m in order:
+        values: List[Optional[float]] = [rep["metrics"].get(m) for rep in reports]
+        present = [v for v in values if v is not None]
+        # newest report that has the metric decides the reference band
+        rng: Dict[str, Any] = {}
+        for rep in reversed(reports):
+            if m in rep["ranges"]:
+                rng = rep["ranges"][m]
+                break
+        rows.append(
+            {
+                "metric": m,
+                "range": rng,
+                "values": values,
+                "delta_prev": round(present[-1] - present[-2], 4) if len(present) >= 2 else None,
+                "delta_total": round(present[-1] - present[0], 4) if len(present) >= 2 else None,
+            }
+        )
+    return rows
+
+
+def load_comparison(
+    db: Session,
+    user_id: int,
+    report_ids: Optional[List[int]] = None,
+    last: int = 3,
+) -> List[Dict[str, Any]]:
+    """
+    The user's reports to compare, oldest first (history order, so by report
+    date), from a single query: the given ids, or the `last` most recent reports.
+    """
+    from app.models.history import ReportHistory, history_order  # local import
+
+    q = (
+        db.query(ReportHistory)
+        .options(selectinload(ReportHistory.archive))
+        .filter(ReportHistory.user_id == user_id)
+    )
+    if report_ids:
+        q = q.filter(ReportHistory.id.in_(list(dict.fromkeys(report_ids))[:MAX_COMPARE_REPORTS]))
+        rows = q.order_by(*history_order()).all()
+    else:
+        n = max(2, min(last, MAX_COMPARE_REPORTS))
+        rows = list(reversed(q.order_by(*history_order(descending=True)).limit(n).all()))
+
+    out: List[Dict[str, Any]] = []
+    for r in rows:
+        metrics, incoming = _split_meta(report_metadata(r))
+        out.append(
+            {
+                "id": r.id,
+                "date": r.uploaded_at.strftime("%Y-%m-%d") if getattr(r, "uploaded_at", None) else f"id-{r.id}",
+                "metrics": metrics,
+                "ranges": _normalize_ranges(metrics, incoming),
+            }
+        )
+    return out
+
+
+def comparison_cache_key(reports: List[Dict[str, Any]], renderer: Optional[str] = None) -> str:
+    """
+    Cache key of the comparison PDF (its ETag is etag_for(key)); needs no render.
+    Includes the renderer (default: the one a render now would use).
+    """
+    ids = "-".join(str(r["id"]) for r in reports)
+    payload = {"reports": reports, "renderer": renderer or pdf_renderer()}
+    return pdf_cache_key(f"cmp{ids}", len(reports), pdf_content_hash(payload))
+
+
+def comparison_etag(reports: List[Dict[str, Any]]) -> str:
+    return etag_for(comparison_cache_key(reports))
+
+
+def render_comparison(reports: List[Dict[str, Any]]) -> CachedPdf:
+    """Cached comparison PDF for already-loaded reports (oldest first)."""
+    renderer = pdf_renderer()
+    key = comparison_cache_key(reports, renderer)
+    cached = pdf_cache.get(key)
+    if cached is not None:
+        return cached
+
+    rows = compute_metric_deltas(reports)
+    ids = "-".join(str(r["id"]) for r in reports)
+    rendered = render_comparison_doc([{"id": r["id"], "date": r["date"]} for r in reports], rows)
+    logger.info("📄 Rendered comparison of reports %s (%d bytes, %s)", ids, len(rendered.data), rendered.renderer)
+    if rendered.renderer != renderer:
+        # fallback after a failed render: not cached under the expected renderer's key
+        return CachedPdf(
+            data=rendered.data,
+            etag=etag_for(comparison_cache_key(reports, rendered.renderer)),
+            last_modified=datetime.utcnow().replace(microsecond=0),
+        )
+    return pdf_cache.put(key, rendered.data)
@@ -0,0 +1,135 @@
+# app/services/report_export.py
+"""
+Streamed ZIP export of all of a user's reports (PDFs + one metrics CSV).
+
+Jobs come in lazily (report_pdf.iter_user_report_pdfs reads the history in
+keyset pages). PDFs are rendered in parallel (bounded by EXPORT_CONCURRENCY,
+reusing pdf_cache) and written into the ZIP in report order as soon as each
+one is ready. The ZIP is produced on an unseekable sink, so every entry is
+flushed to the client right after it is written. The CSV rows are spooled to
+a temporary file meanwhile (in memory while small), so memory stays at
+roughly EXPORT_CONCURRENCY PDFs no matter how big the archive gets.
+"""
+from __future__ import annotations
+
+import io
+import os
+import csv
+import zipfile
+import tempfile
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Iterable, Iterator, List
+
+from app.services.report_pdf import ReportPdfJob, render_report_pdf
+from app.services.pdf_generator import _split_meta, _normalize_ranges, _status
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CONCURRENCY = int(os.getenv("EXPORT_CONCURRENCY", "4"))
+
+_CSV_HEADER = ["report_id", "uploaded_at", "metric", "value", "unit", "normal_min", "normal_max", "status"]
+
+# metrics.csv is spooled in memory up to this size, then to a temporary file
+_CSV_SPOOL_BYTES = 1024 * 1024
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only, unseekable buffer that hands out whatever was written so far."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _zip_time(dt: datetime) -> tuple:
+    dt = dt if dt.year >= 1980 else datetime(1980, 1, 1)
+    return dt.timetuple()[:6]
+
+
+def _write_csv_rows(writer, job: ReportPdfJob) -> None:
+    metrics, incoming = _split_meta(job.metadata)
+    ranges = _normalize_ranges(metrics, incoming)
+    for metric, value in metrics.items():
+        r = ranges.get(metric, {})
+        writer.writerow([
+            job.report_id,
+            job.uploaded_at.isoformat(),
+            metric,
+            f"{value:g}",
+            r.get("unit", ""),
+            f"{r.get('min', 0.0):g}",
+            f"{r.get('max', 0.0):g}",
+            _status(value, r.get("min", 0.0), r.get("max", 0.0)),
+        ])
+
+
+def iter_report_archive(jobs: Iterable[ReportPdfJob]) -> Iterator[bytes]:
+    """Yield the ZIP archive for the given jobs (consumed once, lazily) chunk by chunk."""
+    sink = _ChunkSink()
+    exported = 0
+    with tempfile.SpooledTemporaryFile(max_size=_CSV_SPOOL_BYTES, mode="w+", encoding="utf-8", newline="") as spool:
+        # One long-format CSV with every metric of every report, filled while the PDFs stream
+        writer = csv.writer(spool)
+        writer.writerow(_CSV_HEADER)
+        with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+            with ThreadPoolExecutor(max_workers=max(1, EXPORT_CONCURRENCY), thread_name_prefix="export") as pool:
+                window: deque = deque()
+                it = iter(jobs)
+
+                def _fill() -> None:
+                    while len(window) < max(1, EXPORT_CONCURRENCY):
+                        job = next(it, None)
+                        if job is None:
+                            return
+                        window.append((job, pool.submit(render_report_pdf, job)))
+
+                _fill()
+                while window:
+                    job, fut = window.popleft()
+                    pdf = fut.result()
+                    info = zipfile.ZipInfo(
+                        f"reports/report_{job.report_id}_{job.uploaded_at:%Y-%m-%d}.pdf",
+                        date_time=_zip_time(job.uploaded_at),
+                    )
+                    # PDFs are already compressed internally; don't spend CPU deflating them again
+                    info.compress_type = zipfile.ZIP_STORED
+                    zf.writestr(info, pdf.data)
+                    _write_csv_rows(writer, job)
+                    exported += 1
+                    _fill()
+                    yield sink.drain()
+
+            csv_info = zipfile.ZipInfo("metrics.csv", date_time=_zip_time(datetime.utcnow()))
+            csv_info.compress_type = zipfile.ZIP_DEFLATED
+            spool.seek(0)
+            with zf.open(csv_info, mode="w") as raw:
+                text = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+                while True:
+                    block = spool.read(64 * 1024)
+                    if not block:
+                        break
+                    text.write(block)
+                    text.flush()
+                    chunk = sink.drain()
+                    if chunk:
+                        yield chunk
+                text.flush()
+                text.detach()
+
+    logger.info("📦 Exported %d reports", exported)
+    yield sink.drain()
@@ -0,0 +1,253 @@
+# app/services/report_pdf.py
+"""
+Everything /download-report needs to turn a history row into PDF bytes:
+pick the row, load its sparkline series, and render through pdf_cache.
+"""
+from __future__ import annotations
+
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterator, List, NamedTuple, Optional
+
+from sqlalchemy.orm import Session, selectinload
+
+from app.services.pdf_cache import CachedPdf, pdf_cache, pdf_cache_key, pdf_content_hash, etag_for
+from app.services.pdf_generator import pdf_renderer, render_summary_doc
+from app.services.metric_store import get_metric_series, has_metric_rows
+from app.utils.downsample import downsample_series
+from app.utils.json_codec import report_metadata
+
+logger = logging.getLogger(__name__)
+
+# Points drawn per sparkline, and how much history they are downsampled from
+# (LTTB, so a spike a few reports back survives the reduction)
+TREND_WINDOW = 8
+TREND_HISTORY = 64
+
+# Reports read per query by the export (iter_user_report_pdfs)
+EXPORT_PAGE_SIZE = 50
+
+
+class ReportPdfJob(NamedTuple):
+    """Inputs of one report PDF plus its cache identity."""
+    report_id: int
+    user_id: int
+    doctor_summary: str
+    patient_summary: str
+    metadata: Dict[str, Any]
+    trend_series: Dict[str, List[float]]
+    cache_key: str
+    etag: str
+    uploaded_at: datetime
+    renderer: str                      # renderer expected when the job was built (part of cache_key)
+
+
+def _current_metric_keys(metadata: Dict[str, Any]) -> List[str]:
+    """Metric names present in this report (the ones that get a sparkline)."""
+    keys: List[str] = []
+    base = metadata.get("metrics") if isinstance(metadata.get("metrics"), dict) else metadata
+    for k, v in (base or {}).items():
+        if k == "ranges":
+            continue
+        try:
+            float(v)
+        except Exception:
+            continue
+        keys.append(k)
+    return keys
+
+
+def _history_order(r) -> tuple:
+    return (getattr(r, "uploaded_at", None) or datetime.min, r.id)
+
+
+def _window_id(trend_window: int, trend_history: int) -> str:
+    """Cache-key component identifying the sparkline shape."""
+    return f"{trend_history}-{trend_window}"
+
+
+def _job_cache_key(
+    report_id: int,
+    window_id: str,
+    doctor_summary: str,
+    patient_summary: str,
+    metadata: Dict[str, Any],
+    series_map: Dict[str, List[float]],
+    renderer: str,
+) -> str:
+    content_hash = pdf_content_hash(
+        {
+            "doctor_summary": doctor_summary,
+            "patient_summary": patient_summary,
+            "metadata": metadata,
+            "series": series_map,
+            "renderer": renderer,
+        }
+    )
+    return pdf_cache_key(report_id, window_id, content_hash)
+
+
+def _build_job(row, series_map: Dict[str, List[float]], user_id: int, window_id: str) -> ReportPdfJob:
+    metadata = report_metadata(row)
+    doctor_summary = row.doctor_summary or getattr(row, "summary_doctor", "") or ""
+    patient_summary = row.patient_summary or getattr(row, "summary_patient", "") or ""
+
+    renderer = pdf_renderer()
+    cache_key = _job_cache_key(row.id, window_id, doctor_summary, patient_summary, metadata, series_map, renderer)
+    uploaded_at = (getattr(row, "uploaded_at", None) or datetime.utcnow()).replace(microsecond=0)
+
+    return ReportPdfJob(
+        report_id=row.id,
+        user_id=user_id,
+        doctor_summary=doctor_summary,
+        patient_summary=patient_summary,
+        metadata=metadata,
+        trend_series=series_map,
+        cache_key=cache_key,
+        etag=etag_for(cache_key),
+        uploaded_at=uploaded_at,
+        renderer=renderer,
+    )
+
+
+def _legacy_series(db: Session, row, keys: List[str], user_id: int, trend_history: int) -> Dict[str, List[float]]:
+    """
+    Sparkline series from report_metadata JSON, for reports that predate the
+    report_metric table and have not been backfilled yet.
+    """
+    from app.models.history import ReportHistory, history_order  # local import
+
+    rows = (
+        db.query(ReportHistory)
+        .options(selectinload(ReportHistory.archive))
+        .filter(ReportHistory.user_id == user_id)
+        .order_by(*history_order())
+        .all()
+    )
+    upto = _history_order(row)
+    series_map: Dict[str, List[float]] = {k: [] for k in keys}
+    for r in sorted(rows, key=_history_order):
+        if _history_order(r) > upto:
+            break
+        meta = report_metadata(r)
+        src = meta.get("metrics") if isinstance(meta.get("metrics"), dict) else meta
+        for k in series_map:
+            try:
+                series_map[k].append(float(src.get(k)))
+            except Exception:
+                pass
+    return {k: v[-trend_history:] for k, v in series_map.items()}
+
+
+def prepare_report_pdf(
+    db: Session,
+    user_id: int,
+    report_id: Optional[int] = None,
+    trend_window: int = TREND_WINDOW,
+    trend_history: int = TREND_HISTORY,
+) -> Optional[ReportPdfJob]:
+    """
+    Load the report (latest in history order when report_id is None) and its sparkline series:
+    the last trend_history values of each of its metrics up to and including
+    this report (one index range scan per metric on report_metric),
+    downsampled to trend_window points with LTTB.
+    Returns None if the user has no such report.
+    """
+    from app.models.history import ReportHistory, history_order  # local import
+
+    q = db.query(ReportHistory).filter(ReportHistory.user_id == user_id)
+    if report_id is not None:
+        q = q.filter(ReportHistory.id == report_id)
+    row = q.order_by(*history_order(descending=True)).first()
+    if not row:
+        return None
+
+    keys = _current_metric_keys(report_metadata(row))
+    if keys and has_metric_rows(db, row.id):
+        series_map = get_metric_series(
+            db,
+            user_id=user_id,
+            metrics=keys,
+            limit=trend_history,
+            until=row.uploaded_at,
+            until_report_id=row.id,
+        )
+    else:
+        series_map = _legacy_series(db, row, keys, user_id, trend_history)
+
+    series_map = {k: downsample_series(v, trend_window) for k, v in series_map.items()}
+    return _build_job(row, series_map, user_id, _window_id(trend_window, trend_history))
+
+
+def iter_user_report_pdfs(
+    user_id: int,
+    trend_window: int = TREND_WINDOW,
+    trend_history: int = TREND_HISTORY,
+    page_size: int = EXPORT_PAGE_SIZE,
+) -> Iterator[ReportPdfJob]:
+    """
+    Jobs for every report of a user, oldest first, built one at a time as the
+    caller consumes them. Rows are read in keyset pages of page_size (a fresh
+    session per page, so no session is held open while the caller streams),
+    so memory does not grow with the history. Sparklines use a rolling window
+    per metric and match what prepare_report_pdf builds for the same report.
+    """
+    from app.core.database import SessionLocal
+    from app.models.history import ReportHistory, history_keyset, history_order  # local import
+
+    windows: Dict[str, Deque[float]] = {}
+    window_id = _window_id(trend_window, trend_history)
+    after: Optional[tuple] = None
+    while True:
+        db = SessionLocal()
+        try:
+            q = (
+                db.query(ReportHistory)
+                .options(selectinload(ReportHistory.archive))
+                .filter(ReportHistory.user_id == user_id)
+            )
+            if after is not None:
+                q = q.filter(history_keyset(*after, before=False))
+            rows = q.order_by(*history_order()).limit(page_size).all()
+        finally:
+            db.close()
+        if not rows:
+            return
+        after = (rows[-1].uploaded_at, rows[-1].id)
+
+        for row in rows:
+            meta = report_metadata(row)
+            src = meta.get("metrics") if isinstance(meta.get("metrics"), dict) else meta
+            keys = _current_metric_keys(meta)
+            for k in keys:
+                windows.setdefault(k, deque(maxlen=trend_history)).append(float(src.get(k)))
+            series_map = {k: downsample_series(list(windows[k]), trend_window) for k in keys}
+            yield _build_job(row, series_map, user_id, window_id)
+        if len(rows) < page_size:
+            return
+
+
+def render_report_pdf(job: ReportPdfJob) -> CachedPdf:
+    """Return cached bytes for the job, rendering (and caching) on a miss."""
+    cached = pdf_cache.get(job.cache_key)
+    if cached is not None:
+        return cached
+
+    rendered = render_summary_doc(
+        doctor_summary=job.doctor_summary,
+        patient_summary=job.patient_summary,
+        metadata=job.metadata,
+        user_id=job.user_id,
+        trend_series=job.trend_series,
+    )
+
+    logger.info("📄 Rendered report %s (%d bytes, %s)", job.report_id, len(rendered.data), rendered.renderer)
+    if rendered.renderer != job.renderer:
+        # fallback after a failed render: served once under its own ETag, never cached
+        # under the key of the renderer that should have produced it
+        window_id = job.cache_key.split(":", 2)[1]
+        key = _job_cache_key(job.report_id, window_id, job.doctor_summary, job.patient_summary,
+                             job.metadata, job.trend_series, rendered.renderer)
+        return CachedPdf(data=rendered.data, etag=etag_for(key), last_modified=datetime.utcnow().replace(microsecond=0))
+    return pdf_cache.put(job.cache_key, rendered.data)
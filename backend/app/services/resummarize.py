@@ -0,0 +1,214 @@
+# app/services/resummarize.py
+"""
+Re-summarization backfill after an LLM model or prompt change.
+
+Rows whose summary_model / summary_prompt_version differ from the current
+OLLAMA_MODEL / PROMPT_VERSION (or are unknown) are re-summarized from their
+stored metrics, since the original PDF text is not kept. Calls are paced to
+a configurable rate. The pace backs off while the LLM is slow, which is the
+sign that it is busy with interactive uploads. Results are written in
+batched UPDATEs. The job is resumable: a rerun selects only rows that are
+still stale. Rows with no numeric metrics cannot be re-summarized; they keep
+their summaries and provenance and get summary_skipped_at instead, so they
+are not selected (and counted as stale) again on every run.
+"""
+from __future__ import annotations
+
+import time
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import and_, func, inspect, or_, select, text
+
+from app.utils.json_codec import report_metadata
+
+logger = logging.getLogger(__name__)
+
+# consecutive LLM failures after which the job stops (the LLM is probably down)
+MAX_CONSECUTIVE_FAILURES = 5
+
+
+class ResummarizeProgress(NamedTuple):
+    done: int        # rows attempted
+    total: int       # stale rows when the job started
+    updated: int
+    skipped: int     # rows without metrics to summarize
+    failed: int
+    elapsed: float
+
+    @property
+    def rate(self) -> float:
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> Optional[float]:
+        return (self.total - self.done) / self.rate if self.rate > 0 else None
+
+
+class _Pacer:
+    """
+    At most per_minute reports per minute. A report whose LLM calls take
+    longer than slow_seconds doubles the interval (up to max_interval); fast
+    ones shrink it back towards the base rate.
+    """
+
+    def __init__(self, per_minute: float, slow_seconds: float, max_interval: float = 300.0):
+        self.base = 60.0 / per_minute if per_minute > 0 else 0.0
+        self.interval = self.base
+        self.slow_seconds = slow_seconds
+        self.max_interval = max_interval
+        self._next = time.monotonic()
+
+    def wait(self) -> float:
+        """Sleep until the next call is allowed; returns the start time."""
+        delay = self._next - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        return time.monotonic()
+
+    def done(self, started: float) -> None:
+        latency = time.monotonic() - started
+        if self.slow_seconds and latency > self.slow_seconds:
+            self.interval = min(max(self.interval * 2, self.base, 1.0), self.max_interval)
+            logger.info("🐢 LLM slow (%.1fs), pacing at one report per %.1fs", latency, self.interval)
+        else:
+            self.interval = max(self.base, self.interval * 0.75)
+        self._next = started + self.interval
+
+
+def _stale(rh, model: str, prompt_version: str, only_model: Optional[str], include_archived: bool, user_id: Optional[int]):
+    cond = and_(
+        or_(
+            rh.c.summary_model.is_(None),
+            rh.c.summary_model != model,
+            rh.c.summary_prompt_version.is_(None),
+            rh.c.summary_prompt_version != prompt_version,
+        ),
+        rh.c.summary_skipped_at.is_(None),
+    )
+    if only_model is not None:
+        cond = and_(cond, rh.c.summary_model.is_(None) if only_model == "" else rh.c.summary_model == only_model)
+    if not include_archived:
+        cond = and_(cond, rh.c.archived_at.is_(None))
+    if user_id is not None:
+        cond = and_(cond, rh.c.user_id == user_id)
+    return cond
+
+
+def count_stale_summaries(
+    only_model: Optional[str] = None,
+    include_archived: bool = False,
+    user_id: Optional[int] = None,
+) -> int:
+    from app.core.database import engine
+    from app.models.history import ReportHistory  # local import
+    from app.services.summary import OLLAMA_MODEL, PROMPT_VERSION
+
+    rh = ReportHistory.__table__
+    with engine.connect() as conn:
+        return conn.execute(
+            select(func.count()).select_from(rh).where(
+                _stale(rh, OLLAMA_MODEL, PROMPT_VERSION, only_model, include_archived, user_id)
+            )
+        ).scalar() or 0
+
+
+def resummarize_reports(
+    per_minute: float = 30.0,
+    batch_size: int = 20,
+    limit: Optional[int] = None,
+    only_model: Optional[str] = None,
+    include_archived: bool = False,
+    user_id: Optional[int] = None,
+    slow_seconds: float = 60.0,
+    on_progress: Optional[Callable[[ResummarizeProgress], None]] = None,
+) -> ResummarizeProgress:
+    """
+    Re-summarize stale rows in id order, batch_size rows per UPDATE batch.
+    only_model narrows the selection to rows written by that model ("" =
+    rows with no recorded model). Archived rows are skipped unless
+    include_archived; their new summaries then live in report_history again.
+    """
+    from app.core.database import SessionLocal, begin_write, engine
+    from app.models.history import ReportHistory  # local import
+    from app.services.summary import OLLAMA_MODEL, PROMPT_VERSION, summarize_metrics
+
+    rh = ReportHistory.__table__
+    stale = _stale(rh, OLLAMA_MODEL, PROMPT_VERSION, only_model, include_archived, user_id)
+    total = count_stale_summaries(only_model, include_archived, user_id)
+    if limit is not None:
+        total = min(total, limit)
+
+    # legacy schemas may also have summary_doctor / summary_patient
+    with engine.connect() as conn:
+        live = {c["name"] for c in inspect(conn).get_columns(rh.name)}
+    targets = {"doctor_summary": "doctor_summary", "patient_summary": "patient_summary"}
+    targets.update({c: src for c, src in (("summary_doctor", "doctor_summary"), ("summary_patient", "patient_summary")) if c in live})
+    update = text(
+        f"UPDATE {rh.name} SET "
+        + ", ".join(f"{col} = :{src}" for col, src in targets.items())
+        + ", summary_model = :summary_model, summary_prompt_version = :summary_prompt_version WHERE id = :id"
+    )
+    mark_skipped = text(f"UPDATE {rh.name} SET summary_skipped_at = :skipped_at WHERE id = :id")
+
+    pacer = _Pacer(per_minute, slow_seconds)
+    started = time.perf_counter()
+    done = updated = skipped = failed = consecutive_failures = 0
+    last_id = 0
+
+    def _progress() -> ResummarizeProgress:
+        return ResummarizeProgress(done, total, updated, skipped, failed, time.perf_counter() - started)
+
+    while done < total:
+        # fresh session per batch: sees rows committed meanwhile, holds no snapshot while the LLM runs
+        db = SessionLocal()
+        try:
+            q = db.query(ReportHistory).filter(ReportHistory.id > last_id, stale.self_group())
+            rows = q.order_by(ReportHistory.id.asc()).limit(min(batch_size, total - done)).all()
+            batch = [(r.id, report_metadata(r)) for r in rows]
+        finally:
+            db.close()
+        if not batch:
+            break
+
+        results: List[Dict[str, Any]] = []
+        nothing_to_do: List[Dict[str, Any]] = []
+        for report_id, meta in batch:
+            last_id = report_id
+            done += 1
+            metrics = meta.get("metrics") if isinstance(meta.get("metrics"), dict) else meta
+            metrics = {k: v for k, v in (metrics or {}).items() if k != "ranges" and isinstance(v, (int, float))}
+            if not metrics:
+                skipped += 1
+                nothing_to_do.append({"id": report_id, "skipped_at": datetime.utcnow()})
+                continue
+
+            t0 = pacer.wait()
+            summary = summarize_metrics(metrics, meta.get("ranges") if isinstance(meta.get("ranges"), dict) else None)
+            pacer.done(t0)
+            if summary["summary_model"] is None:
+                failed += 1
+                consecutive_failures += 1
+                logger.warning("❌ Re-summarization failed for report %s", report_id)
+                if consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
+                    break
+                continue
+            consecutive_failures = 0
+            results.append({"id": report_id, **summary})
+            if on_progress:
+                on_progress(_progress())
+
+        if results or nothing_to_do:
+            with begin_write() as conn:
+                if results:
+                    conn.execute(update, results)
+                if nothing_to_do:
+                    conn.execute(mark_skipped, nothing_to_do)
+            updated += len(results)
+        logger.info("📝 Re-summarized %d/%d reports (up to id %s)", updated, total, last_id)
+        if consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
+            logger.error("❌ %d LLM failures in a row, stopping", consecutive_failures)
+            break
+
+    return _progress()
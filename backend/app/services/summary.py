@@ -1,7 +1,8 @@
 # app/services/summary.py
 import os
+import asyncio
 import logging
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, Optional, Tuple
 
 import httpx
 
@@ -17,6 +18,13 @@ LLM_PROVIDER = os.getenv("LLM_PROVIDER", "ollama").lower()
 OLLAMA_URL = os.getenv("OLLAMA_BASE_URL", "http://127.0.0.1:11434").rstrip("/")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "mistral")
 
+# Bump whenever the prompts in _summarize_with_llm change. Stored with every
+# summary (with the model) so resummarize_reports.py can find stale ones.
+PROMPT_VERSION = "1"
+
+# what _ollama_chat / _summarize_with_llm return instead of a summary
+_LLM_FAILURE_PREFIXES = ("(LLM error)", "(LLM not configured)", "(empty LLM response)")
+
 _http = httpx.Client(timeout=httpx.Timeout(connect=20, read=120, write=20, pool=20))
 
 
@@ -58,6 +66,41 @@ def _summarize_with_llm(text: str, audience: str) -> str:
     return _ollama_chat(system, (text or "")[:12000])
 
 
+def summary_provenance(doctor_summary: str, patient_summary: str) -> Dict[str, Optional[str]]:
+    """summary_model / summary_prompt_version to store with these summaries (None if the LLM failed)."""
+    ok = all(s and not s.startswith(_LLM_FAILURE_PREFIXES) for s in (doctor_summary, patient_summary))
+    return {
+        "summary_model": OLLAMA_MODEL if ok else None,
+        "summary_prompt_version": PROMPT_VERSION if ok else None,
+    }
+
+
+def metrics_report_text(metrics: Dict[str, float], ranges: Dict[str, Dict[str, Any]]) -> str:
+    """A lab-report-like text rebuilt from stored metrics (the PDF text itself is not kept)."""
+    lines = []
+    for metric, value in metrics.items():
+        r = ranges.get(metric) or {}
+        unit = f" {r['unit']}" if r.get("unit") else ""
+        line = f"{metric}: {value}{unit}"
+        if isinstance(r.get("min"), (int, float)) and isinstance(r.get("max"), (int, float)):
+            flag = "LOW" if value < r["min"] else "HIGH" if value > r["max"] else "normal"
+            line += f" (reference {r['min']}-{r['max']}{unit}) {flag}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def summarize_metrics(metrics: Dict[str, float], ranges: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """Doctor / patient summaries (plus provenance) from stored metrics, for re-summarization."""
+    text = metrics_report_text(metrics, _fixed_ranges(metrics, ranges or {}))
+    doctor_summary = _summarize_with_llm(text, "doctor")
+    patient_summary = _summarize_with_llm(text, "patient")
+    return {
+        "doctor_summary": doctor_summary,
+        "patient_summary": patient_summary,
+        **summary_provenance(doctor_summary, patient_summary),
+    }
+
+
 def _normalize_extractor_result(result: Any) -> Tuple[str, Dict[str, float], Dict[str, Dict[str, Any]]]:
     text: str = ""
     metrics: Dict[str, float] = {}
@@ -97,23 +140,23 @@ def _fixed_ranges(metrics: Dict[str, float], raw_ranges: Dict[str, Dict[str, Any
             fixed[metric] = {"min": float(rmin), "max": float(rmax), "unit": unit}
             continue
 
-        low, high = get_normal_range_for_metric(metric)
+        low, high, _unit = get_normal_range_for_metric(metric)
         if isinstance(low, (int, float)) and isinstance(high, (int, float)) and high > low:
-            fixed[metric] = {"min": float(low), "max": float(high), "unit": unit}
+            fixed[metric] = {"min": float(low), "max": float(high), "unit": unit or _unit}
 
     return fixed
 
 
-async def generate_summary(file, user_id: int):
+def build_report(file, user_id: Optional[int] = None, charts: bool = True) -> Dict[str, Any]:
     """
+    The report pipeline, synchronously (also run by the bulk PDF ingestor):
     1) Extract text & metrics (and optional ranges)
     2) Fix/complete ranges (so no 0–0 comes out)
-    3) Generate charts
+    3) Generate charts (optional)
     4) Ask LLMs
     5) Build abnormal-only suggestions (home + meds) using static KB
+    `file` is an UploadFile, bytes or a path.
     """
-    logger.info("📥 Inside generate_summary")
-
     extracted = extract_pdf_content(file)
     text, metrics, ranges = _normalize_extractor_result(extracted)
     logger.info("🧹 Text length=%s | metrics=%s", len(text or ""), list(metrics.keys()))
@@ -123,9 +166,11 @@ async def generate_summary(file, user_id: int):
     if ranges:
         logger.info("📐 Ranges prepared for: %s", list(ranges.keys()))
 
-    # Charts (saved to app/charts/user_{id})
-    charts = generate_charts(metrics=metrics, ranges=ranges, user_id=user_id)
-    logger.info("📊 Charts generated: %s", charts)
+    # Charts (SVG, shared content-addressed store -> stable URLs)
+    chart_urls: Dict[str, str] = {}
+    if charts:
+        chart_urls = generate_charts(metrics=metrics, ranges=ranges, user_id=user_id)
+        logger.info("📊 Charts generated: %s", chart_urls)
 
     # Summaries via local LLM
     doctor_summary = _summarize_with_llm(text or "", "doctor")
@@ -140,6 +185,16 @@ async def generate_summary(file, user_id: int):
         "patient_summary": patient_summary,
         "metrics": metrics,     # numeric values
         "ranges": ranges,       # cleaned normal bands
-        "charts": charts,
+        "charts": chart_urls,
         "suggestions": suggestions,  # ✅ new
+        **summary_provenance(doctor_summary, patient_summary),
     }
+
+
+async def generate_summary(file, user_id: int):
+    """
+    Pipeline for one uploaded report (see build_report). Extraction and the
+    LLM calls block, so it runs in a worker thread, off the event loop.
+    """
+    logger.info("📥 Inside generate_summary")
+    return await asyncio.to_thread(build_report, file, user_id=user_id)
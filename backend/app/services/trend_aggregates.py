@@ -0,0 +1,206 @@
+# app/services/trend_aggregates.py
+"""
+Incrementally maintained per-user trend aggregates (report_metric_agg).
+
+Every report insert folds its metric rows into the user's aggregates inside
+the same transaction, so the Trend Analysis summary is a single O(metrics)
+read. rebuild_aggregates() recomputes them from report_metric for backfills.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import bindparam, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+_SECONDS_PER_DAY = 86400.0
+
+# report_metric_agg columns written by _fold
+_AGG_COLUMNS = (
+    "count", "min_value", "max_value", "mean_value", "first_at", "sum_x", "sum_y", "sum_xx", "sum_xy",
+    "slope_per_day", "last_value", "last_status", "last_at", "unit",
+)
+
+
+def _slope(n: int, sx: float, sy: float, sxx: float, sxy: float) -> Optional[float]:
+    denom = n * sxx - sx * sx
+    if n < 2 or abs(denom) < 1e-12:
+        return None
+    return (n * sxy - sx * sy) / denom
+
+
+def _fold(agg: Dict[str, Any], row: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the aggregate after adding one report_metric row."""
+    value = float(row["value"])
+    at: datetime = row["measured_at"]
+    first_at = agg.get("first_at") or at
+    x = (at - first_at).total_seconds() / _SECONDS_PER_DAY
+
+    n = int(agg.get("count") or 0) + 1
+    sx = float(agg.get("sum_x") or 0.0) + x
+    sy = float(agg.get("sum_y") or 0.0) + value
+    sxx = float(agg.get("sum_xx") or 0.0) + x * x
+    sxy = float(agg.get("sum_xy") or 0.0) + x * value
+
+    out = {
+        "count": n,
+        "min_value": value if agg.get("min_value") is None else min(agg["min_value"], value),
+        "max_value": value if agg.get("max_value") is None else max(agg["max_value"], value),
+        "mean_value": sy / n,
+        "first_at": first_at,
+        "sum_x": sx,
+        "sum_y": sy,
+        "sum_xx": sxx,
+        "sum_xy": sxy,
+        "slope_per_day": _slope(n, sx, sy, sxx, sxy),
+        "last_value": agg.get("last_value"),
+        "last_status": agg.get("last_status"),
+        "last_at": agg.get("last_at"),
+        "unit": agg.get("unit") or row.get("unit"),
+    }
+    # out-of-order (older) measurements still count, but don't replace "last"
+    if agg.get("last_at") is None or at >= agg["last_at"]:
+        out["last_value"] = value
+        out["last_status"] = row.get("status")
+        out["last_at"] = at
+        out["unit"] = row.get("unit") or out["unit"]
+    return out
+
+
+def apply_metric_rows(conn: Connection, metric_rows: Iterable[Dict[str, Any]]) -> None:
+    """
+    Fold report_metric rows into report_metric_agg on the caller's connection
+    (i.e. inside the caller's transaction). Rows are locked FOR UPDATE where
+    the backend supports it, so concurrent uploads by one user serialize.
+    A batch costs one SELECT, one executemany UPDATE and one executemany
+    INSERT, however many reports it covers.
+    """
+    from app.models.history import MetricAggregate  # local import
+
+    t = MetricAggregate.__table__
+    groups: Dict[tuple, List[Dict[str, Any]]] = {}
+    for row in metric_rows:
+        groups.setdefault((row["user_id"], row["metric"]), []).append(row)
+    if not groups:
+        return
+
+    existing = {
+        (r["user_id"], r["metric"]): dict(r)
+        for r in conn.execute(
+            select(t)
+            .where(t.c.user_id.in_({k[0] for k in groups}), t.c.metric.in_({k[1] for k in groups}))
+            .with_for_update()
+        ).mappings()
+    }
+
+    updates: List[Dict[str, Any]] = []
+    inserts: List[Dict[str, Any]] = []
+    for key, rows in groups.items():
+        agg = existing.get(key, {})
+        for row in rows:
+            agg = {**agg, **_fold(agg, row)}
+        values = {c: agg[c] for c in _AGG_COLUMNS}
+        if key in existing:
+            updates.append({"_id": agg["id"], **{f"_{c}": v for c, v in values.items()}})
+        else:
+            inserts.append({"user_id": key[0], "metric": key[1], **values})
+
+    if updates:
+        conn.execute(
+            t.update().where(t.c.id == bindparam("_id")).values({c: bindparam(f"_{c}") for c in _AGG_COLUMNS}),
+            updates,
+        )
+    if inserts:
+        try:
+            with conn.begin_nested():
+                conn.execute(t.insert(), inserts)
+        except IntegrityError:
+            # another transaction created some of them first: fold into theirs
+            _apply_groups_one_by_one(conn, t, {(r["user_id"], r["metric"]): groups[(r["user_id"], r["metric"])] for r in inserts})
+
+
+def _apply_groups_one_by_one(conn: Connection, t, groups: Dict[tuple, List[Dict[str, Any]]]) -> None:
+    for (user_id, metric), rows in groups.items():
+        current = conn.execute(
+            select(t).where(t.c.user_id == user_id, t.c.metric == metric).with_for_update()
+        ).mappings().first()
+        agg = dict(current) if current is not None else {}
+        for row in rows:
+            agg = {**agg, **_fold(agg, row)}
+        values = {c: agg[c] for c in _AGG_COLUMNS}
+        if current is not None:
+            conn.execute(t.update().where(t.c.id == current["id"]).values(**values))
+        else:
+            conn.execute(t.insert().values(user_id=user_id, metric=metric, **values))
+
+
+def get_trend_summary(db: Session, user_id: int) -> List[Dict[str, Any]]:
+    """All aggregates of one user (one row per metric)."""
+    from app.models.history import MetricAggregate  # local import
+
+    rows = (
+        db.query(MetricAggregate)
+        .filter(MetricAggregate.user_id == user_id)
+        .order_by(MetricAggregate.metric.asc())
+        .all()
+    )
+    return [
+        {
+            "metric": a.metric,
+            "unit": a.unit or "",
+            "count": a.count,
+            "min": a.min_value,
+            "max": a.max_value,
+            "mean": a.mean_value,
+            "last_value": a.last_value,
+            "last_status": a.last_status,
+            "last_at": a.last_at.isoformat() if a.last_at else None,
+            "slope_per_day": a.slope_per_day,
+        }
+        for a in rows
+    ]
+
+
+def rebuild_aggregates(user_id: Optional[int] = None, batch_size: int = 5000) -> int:
+    """
+    Recompute report_metric_agg from report_metric (all users, or one).
+    Streams rows in (user, metric, time) order and writes each user's
+    aggregates in one transaction. Returns the number of aggregates written.
+    """
+    from app.core.database import begin_write, engine
+    from app.models.history import MetricAggregate, ReportMetric  # local import
+
+    agg_t = MetricAggregate.__table__
+    rm = ReportMetric.__table__
+
+    with engine.connect() as conn:
+        users_q = select(rm.c.user_id).distinct().order_by(rm.c.user_id)
+        if user_id is not None:
+            users_q = users_q.where(rm.c.user_id == user_id)
+        user_ids = [u for (u,) in conn.execute(users_q)]
+
+    written = 0
+    for uid in user_ids:
+        aggs: Dict[str, Dict[str, Any]] = {}
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(
+                select(rm.c.user_id, rm.c.metric, rm.c.value, rm.c.unit, rm.c.status, rm.c.measured_at)
+                .where(rm.c.user_id == uid)
+                .order_by(rm.c.metric, rm.c.measured_at, rm.c.report_id)
+            )
+            for row in result.mappings():
+                aggs[row["metric"]] = _fold(aggs.get(row["metric"], {}), dict(row))
+
+        with begin_write() as conn:
+            conn.execute(agg_t.delete().where(agg_t.c.user_id == uid))
+            if aggs:
+                conn.execute(agg_t.insert(), [dict(user_id=uid, metric=m, **v) for m, v in aggs.items()])
+        written += len(aggs)
+        logger.info("🔁 Rebuilt %d trend aggregates for user %s", len(aggs), uid)
+    return written
@@ -0,0 +1,230 @@
+# app/services/trend_analytics.py
+"""
+Vectorized trend analytics over report_metric.
+
+Rows are read once, ordered by (user, metric, time), and turned into flat
+NumPy columns. Every (user, metric) series is then a contiguous segment, so
+per-series statistics are np.add.reduceat over segment starts and per-point
+values (rolling average, rate of change, z-score) are whole-array
+operations. The same code path serves one user or a batch of many.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.utils.downsample import lttb_indices
+
+logger = logging.getLogger(__name__)
+
+_SECONDS_PER_DAY = 86400.0
+
+DEFAULT_ROLLING_WINDOW = 5
+DEFAULT_HORIZON_DAYS = 30.0
+DEFAULT_Z_THRESHOLD = 2.0
+
+
+class MetricColumns:
+    """Columnar view of report_metric rows sorted by (user, metric, time)."""
+
+    __slots__ = ("user_id", "metric", "unit", "t", "value", "out_of_band", "starts", "ends")
+
+    def __init__(self, rows: List[tuple]):
+        if rows:
+            user_id, metric, unit, measured_at, value, status = zip(*rows)
+        else:
+            user_id = metric = unit = measured_at = value = status = ()
+        self.user_id = np.asarray(user_id, dtype=np.int64)
+        self.metric = np.asarray(metric, dtype=object)
+        self.unit = np.asarray(unit, dtype=object)
+        self.t = np.asarray(measured_at, dtype="datetime64[us]")
+        self.value = np.asarray(value, dtype=np.float64)
+        self.out_of_band = np.isin(np.asarray(status, dtype=object), ("low", "high"))
+
+        n = len(self.value)
+        if n:
+            change = (self.user_id[1:] != self.user_id[:-1]) | (self.metric[1:] != self.metric[:-1])
+            self.starts = np.flatnonzero(np.r_[True, change])
+        else:
+            self.starts = np.zeros(0, dtype=np.int64)
+        self.ends = np.r_[self.starts[1:], n].astype(np.int64)
+
+    def __len__(self) -> int:
+        return len(self.value)
+
+
+def load_metric_columns(
+    db: Session,
+    user_ids: Iterable[int],
+    metrics: Optional[Iterable[str]] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> MetricColumns:
+    """One ordered scan of report_metric for the given users (index-backed)."""
+    from app.models.history import ReportMetric  # local import
+
+    rm = ReportMetric.__table__
+    q = select(rm.c.user_id, rm.c.metric, rm.c.unit, rm.c.measured_at, rm.c.value, rm.c.status).where(
+        rm.c.user_id.in_(list(user_ids))
+    )
+    if metrics:
+        q = q.where(rm.c.metric.in_(list(metrics)))
+    if since is not None:
+        q = q.where(rm.c.measured_at >= since)
+    if until is not None:
+        q = q.where(rm.c.measured_at < until)
+    q = q.order_by(rm.c.user_id, rm.c.metric, rm.c.measured_at, rm.c.report_id)
+    return MetricColumns(db.execute(q).all())
+
+
+def _segment_index(cols: MetricColumns) -> np.ndarray:
+    """Segment number of every point."""
+    return np.repeat(np.arange(len(cols.starts)), cols.ends - cols.starts)
+
+
+def compute_analytics(
+    cols: MetricColumns,
+    window: int = DEFAULT_ROLLING_WINDOW,
+    horizon_days: float = DEFAULT_HORIZON_DAYS,
+    z_threshold: float = DEFAULT_Z_THRESHOLD,
+    include_series: bool = True,
+    max_points: Optional[int] = None,
+) -> Dict[int, Dict[str, Dict[str, Any]]]:
+    """
+    {user_id: {metric: analytics}} for every series in cols.
+
+    Per series: count, mean, std, latest, least-squares slope per day and its
+    projection horizon_days after the last point, anomaly count. With
+    include_series, also the per-point columns: rolling average over the last
+    `window` points, rate of change per day, z-score and anomaly flag
+    (|z| > z_threshold or outside the reference range). Statistics always
+    use every point; with max_points, longer series are downsampled with LTTB
+    before being returned.
+    """
+    out: Dict[int, Dict[str, Dict[str, Any]]] = {}
+    if not len(cols):
+        return out
+
+    starts, ends = cols.starts, cols.ends
+    n = (ends - starts).astype(np.float64)
+    seg = _segment_index(cols)
+    v = cols.value
+
+    # time in days since the first point of each series
+    t_sec = cols.t.astype("int64") / 1e6
+    x = (t_sec - t_sec[starts][seg]) / _SECONDS_PER_DAY
+
+    # ---- per-series moments / regression ----
+    sy = np.add.reduceat(v, starts)
+    mean = sy / n
+    dev = v - mean[seg]
+    std = np.sqrt(np.add.reduceat(dev * dev, starts) / n)
+
+    sx = np.add.reduceat(x, starts)
+    sxx = np.add.reduceat(x * x, starts)
+    sxy = np.add.reduceat(x * v, starts)
+    denom = n * sxx - sx * sx
+    has_fit = (n >= 2) & (np.abs(denom) > 1e-12)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(has_fit, (n * sxy - sx * sy) / denom, 0.0)
+    intercept = (sy - slope * sx) / n
+    x_last = x[ends - 1]
+    projection = intercept + slope * (x_last + horizon_days)
+
+    # ---- per-point columns ----
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where(std[seg] > 0, dev / std[seg], 0.0)
+    anomaly = (np.abs(z) > z_threshold) | cols.out_of_band
+    anomaly_count = np.add.reduceat(anomaly.astype(np.int64), starts)
+
+    csum = np.cumsum(v)
+    idx = np.arange(len(v))
+    lo = np.maximum(idx - window, starts[seg] - 1)
+    rolling = (csum - np.where(lo >= 0, csum[np.maximum(lo, 0)], 0.0)) / (idx - lo)
+
+    dt = np.diff(x, prepend=x[0])
+    dv = np.diff(v, prepend=v[0])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = np.where(dt > 0, dv / dt, 0.0)
+    timestamps = np.datetime_as_string(cols.t, unit="s") if include_series else None
+
+    # ---- assemble (one dict per series; series data sliced as whole columns) ----
+    for i, (s, e) in enumerate(zip(starts.tolist(), ends.tolist())):
+        item: Dict[str, Any] = {
+            "unit": cols.unit[e - 1] or "",
+            "count": e - s,
+            "mean": float(mean[i]),
+            "std": float(std[i]),
+            "min": float(v[s:e].min()),
+            "max": float(v[s:e].max()),
+            "latest": float(v[e - 1]),
+            "latest_at": str(cols.t[e - 1].astype("datetime64[s]")),
+            "slope_per_day": float(slope[i]) if has_fit[i] else None,
+            "projection": {
+                "horizon_days": horizon_days,
+                "value": float(projection[i]) if has_fit[i] else None,
+            },
+            "anomalies": int(anomaly_count[i]),
+        }
+        if include_series:
+            if max_points and e - s > max_points:
+                keep = s + lttb_indices(v[s:e], max_points, x[s:e])
+            else:
+                keep = np.arange(s, e)
+            rate_kept = rate[keep].tolist()
+            if keep[0] == s:
+                rate_kept[0] = None  # the first point of a series has no predecessor
+            item["series"] = {
+                "t": timestamps[keep].tolist(),
+                "value": v[keep].tolist(),
+                "rolling_avg": rolling[keep].tolist(),
+                "rate_per_day": rate_kept,
+                "z": z[keep].tolist(),
+                "anomaly": anomaly[keep].tolist(),
+            }
+        out.setdefault(int(cols.user_id[s]), {})[cols.metric[s]] = item
+    return out
+
+
+def get_user_trend_analytics(
+    db: Session,
+    user_id: int,
+    metrics: Optional[Iterable[str]] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    window: int = DEFAULT_ROLLING_WINDOW,
+    horizon_days: float = DEFAULT_HORIZON_DAYS,
+    z_threshold: float = DEFAULT_Z_THRESHOLD,
+    max_points: Optional[int] = None,
+) -> Dict[str, Dict[str, Any]]:
+    cols = load_metric_columns(db, [user_id], metrics, since, until)
+    result = compute_analytics(cols, window, horizon_days, z_threshold, include_series=True, max_points=max_points)
+    return result.get(user_id, {})
+
+
+def batch_trend_analytics(
+    db: Session,
+    user_ids: List[int],
+    metrics: Optional[Iterable[str]] = None,
+    chunk_size: int = 500,
+    window: int = DEFAULT_ROLLING_WINDOW,
+    horizon_days: float = DEFAULT_HORIZON_DAYS,
+    z_threshold: float = DEFAULT_Z_THRESHOLD,
+    include_series: bool = False,
+):
+    """
+    Yield (user_id, {metric: analytics}) for many users, chunk_size users per
+    scan; each chunk is computed in one vectorized pass.
+    """
+    for i in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[i:i + chunk_size]
+        cols = load_metric_columns(db, chunk, metrics)
+        result = compute_analytics(cols, window, horizon_days, z_threshold, include_series)
+        logger.info("📈 Trend analytics for %d users (%d points)", len(chunk), len(cols))
+        for uid in chunk:
+            yield uid, result.get(uid, {})
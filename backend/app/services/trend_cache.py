@@ -0,0 +1,198 @@
+# app/services/trend_cache.py
+"""
+In-process cache of each user's trend table, stored column-wise as compact
+typed arrays (array('q') report ids, array('d') upload times and one
+array('d') per metric, NaN where a report lacks the metric) instead of a list
+of per-report dicts.
+
+store_report_in_db invalidates a user's entry as soon as it inserts a report.
+With several worker processes that is not enough on its own, so by default
+every read also checks a cheap (count, max id) stamp of the user's
+report_history rows (TREND_CACHE_VALIDATE=0 skips it for single-process
+deployments). The stamp doubles as the ETag of the trend endpoints.
+
+Rows are kept in history order (uploaded_at, then id): imported reports may
+be backdated, so a higher id is not necessarily a later report.
+"""
+from __future__ import annotations
+
+import os
+import hashlib
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.services.metric_store import metric_values_for_reports
+
+logger = logging.getLogger(__name__)
+
+TREND_CACHE_MAX_BYTES = int(os.getenv("TREND_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+TREND_CACHE_VALIDATE = os.getenv("TREND_CACHE_VALIDATE", "1").lower() in ("1", "true", "yes")
+
+# metric_values_for_reports is called with at most this many ids at once
+_LOAD_CHUNK = 1000
+
+Stamp = Tuple[int, int]  # (report count, max report id)
+
+
+class UserTrendSeries:
+    """One user's trend table, oldest report first (history order)."""
+
+    __slots__ = ("user_id", "stamp", "report_ids", "uploaded", "metrics")
+
+    def __init__(self, user_id: int, stamp: Stamp):
+        self.user_id = user_id
+        self.stamp = stamp
+        self.report_ids = array("q")
+        self.uploaded = array("d")  # epoch seconds (naive UTC), NaN if unknown
+        self.metrics: Dict[str, array] = {}
+
+    @property
+    def nbytes(self) -> int:
+        cols = 2 + len(self.metrics)
+        return cols * len(self.report_ids) * 8
+
+    def etag(self, *variant: Any) -> str:
+        """Strong ETag of this history version; `variant` = the request parameters."""
+        raw = f"{self.user_id}:{self.stamp[0]}:{self.stamp[1]}:{variant!r}"
+        return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest() + '"'
+
+    def select(
+        self,
+        after_id: Optional[int] = None,
+        since: Optional[date] = None,
+        until: Optional[date] = None,
+        limit: Optional[int] = None,
+    ) -> np.ndarray:
+        """
+        Row positions matching the filters (history order), at most `limit`.
+        after_id is a keyset cursor: only rows after that report are returned
+        (KeyError if the user has no such report).
+        """
+        ids = np.frombuffer(self.report_ids, dtype=np.int64)
+        ts = np.frombuffer(self.uploaded, dtype=np.float64)
+        mask = np.ones(len(ids), dtype=bool)
+        if after_id is not None:
+            hit = np.flatnonzero(ids == after_id)
+            if not len(hit):
+                raise KeyError(after_id)
+            mask[: int(hit[0]) + 1] = False
+        if since is not None:
+            mask &= ts >= _epoch(datetime.combine(since, datetime.min.time()))
+        if until is not None:
+            mask &= ts < _epoch(datetime.combine(until, datetime.min.time())) + 86400
+        pos = np.flatnonzero(mask)
+        return pos if limit is None else pos[:limit]
+
+    def rows(self, positions: np.ndarray, columns: List[str], missing: float = -1.0) -> List[Dict[str, Any]]:
+        """The classic trend-table shape ({date, <metric>: value}) for the given rows."""
+        out: List[Dict[str, Any]] = []
+        pos = positions.tolist()
+        cols = {}
+        for m in columns:
+            arr = self.metrics.get(m)
+            vals = np.frombuffer(arr, dtype=np.float64)[positions] if arr is not None else np.full(len(pos), np.nan)
+            cols[m] = np.where(np.isnan(vals), missing, vals).tolist()
+        for j, p in enumerate(pos):
+            ts = self.uploaded[p]
+            item: Dict[str, Any] = {
+                "date": datetime.utcfromtimestamp(ts).strftime("%Y-%m-%d") if ts == ts else f"id-{self.report_ids[p]}",
+            }
+            for m in columns:
+                item[m] = cols[m][j]
+            out.append(item)
+        return out
+
+
+def _epoch(dt: datetime) -> float:
+    return (dt - datetime(1970, 1, 1)).total_seconds()
+
+
+def _stamp(db: Session, user_id: int) -> Stamp:
+    from app.models.history import ReportHistory  # local import
+
+    count, max_id = (
+        db.query(func.count(ReportHistory.id), func.max(ReportHistory.id))
+        .filter(ReportHistory.user_id == user_id)
+        .one()
+    )
+    return int(count or 0), int(max_id or 0)
+
+
+def _load(db: Session, user_id: int) -> UserTrendSeries:
+    from app.models.history import ReportHistory, history_order  # local import
+
+    rows = (
+        db.query(ReportHistory.id, ReportHistory.uploaded_at)
+        .filter(ReportHistory.user_id == user_id)
+        .order_by(*history_order())
+        .all()
+    )
+    # same (count, max id) shape as _stamp(); the last row is not the max id
+    series = UserTrendSeries(user_id, (len(rows), max((r.id for r in rows), default=0)))
+    series.report_ids.extend(r.id for r in rows)
+    series.uploaded.extend(_epoch(r.uploaded_at) if r.uploaded_at else float("nan") for r in rows)
+
+    n = len(rows)
+    for start in range(0, n, _LOAD_CHUNK):
+        chunk = [r.id for r in rows[start:start + _LOAD_CHUNK]]
+        values = metric_values_for_reports(db, chunk)
+        for offset, rid in enumerate(chunk):
+            for metric, v in values.get(rid, {}).items():
+                col = series.metrics.get(metric)
+                if col is None:
+                    col = series.metrics[metric] = array("d", [float("nan")]) * n
+                col[start + offset] = v
+    return series
+
+
+class _TrendCache:
+    """LRU of UserTrendSeries bounded by total array bytes."""
+
+    def __init__(self, max_bytes: int, validate: bool):
+        self.max_bytes = max_bytes
+        self.validate = validate
+        self.total = 0
+        self._entries: "OrderedDict[int, UserTrendSeries]" = OrderedDict()
+        # bumped by invalidate(), so a load that raced an insert is not cached
+        self._generation: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, user_id: int) -> UserTrendSeries:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries.move_to_end(user_id)
+            generation = self._generation.get(user_id, 0)
+        if entry is not None and (not self.validate or entry.stamp == _stamp(db, user_id)):
+            return entry
+
+        entry = _load(db, user_id)
+        with self._lock:
+            old = self._entries.pop(user_id, None)
+            if old is not None:
+                self.total -= old.nbytes
+            if entry.nbytes <= self.max_bytes and self._generation.get(user_id, 0) == generation:
+                self._entries[user_id] = entry
+                self.total += entry.nbytes
+                while self.total > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.total -= evicted.nbytes
+        return entry
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._generation[user_id] = self._generation.get(user_id, 0) + 1
+            old = self._entries.pop(user_id, None)
+            if old is not None:
+                self.total -= old.nbytes
+
+
+trend_cache = _TrendCache(TREND_CACHE_MAX_BYTES, TREND_CACHE_VALIDATE)
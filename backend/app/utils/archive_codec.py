@@ -0,0 +1,44 @@
+# app/utils/archive_codec.py
+
+"""
+Compression for archived report text (report_archive.payload).
+
+The first byte of every payload names the codec, so rows written with
+different codecs (or before zstandard was installed) stay readable:
+  b"z" = zlib, b"s" = zstd (optional `zstandard` package)
+"""
+import os
+import json
+import zlib
+import importlib.util
+from typing import Any, Dict
+
+_HAS_ZSTD = importlib.util.find_spec("zstandard") is not None
+
+ARCHIVE_CODEC = os.getenv("ARCHIVE_CODEC", "zstd" if _HAS_ZSTD else "zlib").lower()
+ARCHIVE_LEVEL = int(os.getenv("ARCHIVE_LEVEL", "9"))
+
+_ZLIB = b"z"
+_ZSTD = b"s"
+
+
+def compress_fields(fields: Dict[str, Any]) -> bytes:
+    raw = json.dumps(fields, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if ARCHIVE_CODEC == "zstd" and _HAS_ZSTD:
+        import zstandard
+        return _ZSTD + zstandard.ZstdCompressor(level=ARCHIVE_LEVEL).compress(raw)
+    return _ZLIB + zlib.compress(raw, ARCHIVE_LEVEL)
+
+
+def decompress_fields(payload: bytes) -> Dict[str, Any]:
+    if not payload:
+        return {}
+    codec, body = payload[:1], payload[1:]
+    if codec == _ZSTD:
+        import zstandard  # raises ImportError if archived with zstd and the package was removed
+        raw = zstandard.ZstdDecompressor().decompress(body)
+    elif codec == _ZLIB:
+        raw = zlib.decompress(body)
+    else:
+        raise ValueError(f"Unknown archive codec prefix {codec!r}")
+    return json.loads(raw.decode("utf-8"))
@@ -0,0 +1,80 @@
+# app/utils/downsample.py
+
+"""
+Shape-preserving downsampling for metric series (Largest-Triangle-Three-Buckets).
+
+LTTB always keeps the first and last point and, from each of the n-2 buckets
+in between, the point forming the largest triangle with the previously kept
+point and the next bucket's average. Spikes and troughs therefore survive,
+unlike "keep the last N" or plain decimation.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def lttb_indices(y: Sequence[float], n_out: int, x: Optional[Sequence[float]] = None) -> np.ndarray:
+    """
+    Sorted indices of the points LTTB keeps (all indices when len(y) <= n_out).
+    x defaults to the point positions 0..len(y)-1.
+    """
+    yv = np.asarray(y, dtype=np.float64)
+    n = len(yv)
+    if n_out >= n or n <= 2:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1])[:max(n_out, 1)]
+    xv = np.arange(n, dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+
+    # bucket edges over the interior points 1..n-2
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    edges[-1] = n - 1
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        # average of the next bucket (or the last point for the final bucket)
+        if i + 2 < len(edges):
+            nlo, nhi = edges[i + 1], max(edges[i + 2], edges[i + 1] + 1)
+            cx, cy = xv[nlo:nhi].mean(), yv[nlo:nhi].mean()
+        else:
+            cx, cy = xv[-1], yv[-1]
+        area = np.abs((xv[a] - cx) * (yv[lo:hi] - yv[a]) - (xv[a] - xv[lo:hi]) * (cy - yv[a]))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+
+def downsample_series(values: Sequence[float], n_out: int) -> List[float]:
+    """LTTB over a plain value list (points assumed evenly spaced)."""
+    if len(values) <= n_out:
+        return list(values)
+    return [values[i] for i in lttb_indices(values, n_out).tolist()]
+
+
+def downsample_rows(
+    rows: List[Dict[str, Any]],
+    columns: Sequence[str],
+    n_out: int,
+    missing: Any = -1.0,
+) -> List[Dict[str, Any]]:
+    """
+    Reduce a trend table (one dict per report, one key per metric) to the
+    union of the rows LTTB keeps for each column, in original order. Cells
+    equal to `missing` are ignored when picking points for that column.
+    The result has at most n_out * len(columns) rows.
+    """
+    if len(rows) <= n_out:
+        return rows
+    keep = {0, len(rows) - 1}
+    for col in columns:
+        present = [i for i, r in enumerate(rows) if r.get(col, missing) != missing]
+        if not present:
+            continue
+        picked = lttb_indices([rows[i][col] for i in present], n_out)
+        keep.update(present[j] for j in picked.tolist())
+    return [rows[i] for i in sorted(keep)]
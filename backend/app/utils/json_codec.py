@@ -0,0 +1,59 @@
+# app/utils/json_codec.py
+
+"""
+JSON encoding for report metadata, and the one place that turns a stored
+report's metadata into a dict.
+
+orjson is used when installed (several times faster than the json module on
+both ends); the stdlib json module is the fallback.
+"""
+import json
+import importlib.util
+from typing import Any, Dict, Mapping
+
+HAS_ORJSON = importlib.util.find_spec("orjson") is not None
+if HAS_ORJSON:
+    import orjson
+
+# Where older schemas kept the metadata JSON, newest name first
+METADATA_COLUMNS = ("report_metadata", "metadata_json", "metadata", "report_data", "meta", "data")
+
+
+def dumps(obj: Any) -> str:
+    if HAS_ORJSON:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def loads(raw: Any) -> Any:
+    """Decode str/bytes JSON; values that are already decoded pass through."""
+    if not isinstance(raw, (str, bytes, bytearray, memoryview)):
+        return raw
+    if HAS_ORJSON:
+        return orjson.loads(raw)
+    return json.loads(bytes(raw) if isinstance(raw, memoryview) else raw)
+
+
+def loads_dict(raw: Any) -> Dict[str, Any]:
+    """loads() for metadata: empty, invalid or non-object JSON gives {}."""
+    if not raw:
+        return {}
+    try:
+        value = loads(raw)
+    except Exception:
+        return {}
+    return value if isinstance(value, dict) else {}
+
+
+def report_metadata(entry: Any) -> Dict[str, Any]:
+    """
+    Metadata of a report as a dict. `entry` is a ReportHistory row, a result
+    mapping from any (legacy) report_history schema, a JSON string or a dict.
+    """
+    if entry is None or isinstance(entry, (dict, str, bytes)):
+        return loads_dict(entry)
+    for name in METADATA_COLUMNS:
+        raw = entry.get(name) if isinstance(entry, Mapping) else getattr(entry, name, None)
+        if raw:
+            return loads_dict(raw)
+    return {}
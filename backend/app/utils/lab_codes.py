@@ -0,0 +1,89 @@
+# app/utils/lab_codes.py
+
+"""
+Maps the lab codes and test names partner labs send to our metric names
+(the keys of REFERENCE_RANGES in medical_ranges.py).
+"""
+from typing import Optional
+
+from app.utils.medical_ranges import REFERENCE_RANGES
+
+LOINC_SYSTEM = "http://loinc.org"
+
+# LOINC code -> metric
+LOINC_TO_METRIC = {
+    "718-7": "Hemoglobin",
+    "4544-3": "Hematocrit",
+    "20570-8": "Hematocrit",
+    "789-8": "RBC",
+    "6690-2": "WBC",
+    "26464-8": "WBC",
+    "777-3": "Platelets",
+    "26515-7": "Platelets",
+    "787-2": "MCV",
+    "785-6": "MCH",
+    "786-4": "MCHC",
+    "2345-7": "Glucose",
+    "2339-0": "Glucose",
+    "2160-0": "Creatinine",
+    "3091-6": "Urea",
+    "2093-3": "Cholesterol",
+    "2085-9": "HDL",
+    "2089-1": "LDL",
+    "13457-7": "LDL",
+    "18262-6": "LDL",
+    "2571-8": "Triglycerides",
+    "1989-3": "Vitamin D",
+    "62292-8": "Vitamin D",
+    "17861-6": "Calcium",
+    "1975-2": "Bilirubin",
+    "1920-8": "SGOT",
+    "1742-6": "SGPT",
+    "3016-3": "TSH",
+    "11580-8": "TSH",
+}
+
+# Common abbreviations / alternative names (lower case) -> metric
+METRIC_ALIASES = {
+    "hb": "Hemoglobin",
+    "hgb": "Hemoglobin",
+    "haemoglobin": "Hemoglobin",
+    "hct": "Hematocrit",
+    "pcv": "Hematocrit",
+    "red blood cells": "RBC",
+    "white blood cells": "WBC",
+    "tlc": "WBC",
+    "plt": "Platelets",
+    "platelet count": "Platelets",
+    "fasting glucose": "Glucose",
+    "blood glucose": "Glucose",
+    "total cholesterol": "Cholesterol",
+    "hdl cholesterol": "HDL",
+    "ldl cholesterol": "LDL",
+    "tg": "Triglycerides",
+    "25-oh vitamin d": "Vitamin D",
+    "vitamin d3": "Vitamin D",
+    "total bilirubin": "Bilirubin",
+    "ast": "SGOT",
+    "alt": "SGPT",
+}
+
+_BY_LOWER = {name.lower(): name for name in REFERENCE_RANGES}
+
+
+def resolve_metric(code: Optional[str] = None, name: Optional[str] = None) -> Optional[str]:
+    """Our metric name for a LOINC code and/or a test name; None if unknown."""
+    if code:
+        metric = LOINC_TO_METRIC.get(code.strip())
+        if metric:
+            return metric
+    if name:
+        key = " ".join(name.strip().lower().split())
+        return _BY_LOWER.get(key) or METRIC_ALIASES.get(key)
+    return None
+
+
+def normalize_unit(unit: Optional[str]) -> str:
+    """Comparable form of a unit string ("10*3/uL" == "10^3/µL", UCUM style included)."""
+    u = (unit or "").strip().lower().replace(" ", "")
+    return u.replace("µ", "u").replace("μ", "u").replace("*", "^").strip("{}")
@@ -0,0 +1,173 @@
+# app/utils/quantile_sketch.py
+
+"""
+Mergeable quantile sketch with relative-error guarantees (DDSketch-style).
+
+Values are counted in logarithmic buckets: bucket i covers (gamma^(i-1), gamma^i]
+with gamma = (1 + alpha) / (1 - alpha), so any quantile is reported within a
+relative error of alpha. Two sketches with the same alpha merge by adding
+bucket counts, which makes incremental and chunked builds exact w.r.t. a
+single pass. Size is bounded by the value range, not the number of values.
+"""
+from __future__ import annotations
+
+import bisect
+import math
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+DEFAULT_ALPHA = 0.01
+
+# |values| at or below this are counted as zero
+_MIN_INDEXABLE = 1e-9
+
+
+class QuantileSketch:
+    def __init__(self, alpha: float = DEFAULT_ALPHA):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.pos: Dict[int, int] = {}
+        self.neg: Dict[int, int] = {}
+        self.zero = 0
+        self.count = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self._cdf = None  # lazily built lookup table, see _lookup_table()
+
+    # -----------------------------
+    # Building
+    # -----------------------------
+    def _value(self, index: int) -> float:
+        # representative value of a bucket (relative error <= alpha)
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def add_many(self, values: Iterable[float]) -> None:
+        """Add a batch of values (vectorized bucket assignment)."""
+        arr = np.asarray(values, dtype=np.float64)
+        arr = arr[np.isfinite(arr)]
+        if not arr.size:
+            return
+        self._cdf = None
+        self.count += int(arr.size)
+        lo, hi = float(arr.min()), float(arr.max())
+        self.min = lo if self.min is None else min(self.min, lo)
+        self.max = hi if self.max is None else max(self.max, hi)
+
+        small = np.abs(arr) <= _MIN_INDEXABLE
+        self.zero += int(small.sum())
+        for store, part in ((self.pos, arr[~small & (arr > 0)]), (self.neg, -arr[~small & (arr < 0)])):
+            if not part.size:
+                continue
+            idx, counts = np.unique(np.ceil(np.log(part) / self._log_gamma).astype(np.int64), return_counts=True)
+            for i, n in zip(idx.tolist(), counts.tolist()):
+                store[i] = store.get(i, 0) + n
+
+    def add(self, value: float) -> None:
+        self.add_many([value])
+
+    def merge(self, other: "QuantileSketch") -> None:
+        if abs(other.alpha - self.alpha) > 1e-12:
+            raise ValueError("Cannot merge sketches with different alpha")
+        if not other.count:
+            return
+        self._cdf = None
+        for store, src in ((self.pos, other.pos), (self.neg, other.neg)):
+            for i, n in src.items():
+                store[i] = store.get(i, 0) + n
+        self.zero += other.zero
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+
+    # -----------------------------
+    # Queries
+    # -----------------------------
+    def _lookup_table(self):
+        """
+        Buckets in ascending value order: (lower bounds, upper bounds,
+        representative values, cumulative counts). Built once per change, so lookups are a bisect
+        over a bounded number of buckets.
+        """
+        if self._cdf is None:
+            lower: List[float] = []
+            keys: List[float] = []
+            values: List[float] = []
+            counts: List[int] = []
+            for i in sorted(self.neg, reverse=True):
+                lower.append(-(self.gamma ** i))
+                keys.append(-(self.gamma ** (i - 1)))
+                values.append(-self._value(i))
+                counts.append(self.neg[i])
+            if self.zero:
+                lower.append(-_MIN_INDEXABLE)
+                keys.append(_MIN_INDEXABLE)
+                values.append(0.0)
+                counts.append(self.zero)
+            for i in sorted(self.pos):
+                lower.append(self.gamma ** (i - 1))
+                keys.append(self.gamma ** i)
+                values.append(self._value(i))
+                counts.append(self.pos[i])
+            self._cdf = (lower, keys, values, np.cumsum(counts).tolist())
+        return self._cdf
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Value at quantile q in [0, 1] (None for an empty sketch)."""
+        if not self.count:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        _, _, values, cumulative = self._lookup_table()
+        rank = q * (self.count - 1)
+        pos = bisect.bisect_right(cumulative, rank)
+        return min(max(values[min(pos, len(values) - 1)], self.min), self.max)
+
+    def rank(self, value: float) -> Optional[float]:
+        """
+        Approximate fraction of counted values <= value (None for an empty
+        sketch), interpolated linearly inside the matching bucket.
+        """
+        if not self.count:
+            return None
+        if value < self.min:
+            return 0.0
+        if value >= self.max:
+            return 1.0
+        lower, keys, _, cumulative = self._lookup_table()
+        # bucket upper bounds are ascending; find the bucket that contains value
+        pos = bisect.bisect_left(keys, value)
+        below = cumulative[pos - 1] if pos > 0 else 0
+        if pos >= len(keys) or value <= lower[pos]:
+            return below / self.count
+        within = cumulative[pos] - below
+        frac = (value - lower[pos]) / (keys[pos] - lower[pos])
+        return (below + within * frac) / self.count
+
+    # -----------------------------
+    # Persistence
+    # -----------------------------
+    def to_dict(self) -> Dict:
+        return {
+            "alpha": self.alpha,
+            "count": self.count,
+            "zero": self.zero,
+            "min": self.min,
+            "max": self.max,
+            "pos": {str(k): v for k, v in self.pos.items()},
+            "neg": {str(k): v for k, v in self.neg.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "QuantileSketch":
+        sk = cls(alpha=float(data.get("alpha", DEFAULT_ALPHA)))
+        sk.count = int(data.get("count", 0))
+        sk.zero = int(data.get("zero", 0))
+        sk.min = data.get("min")
+        sk.max = data.get("max")
+        sk.pos = {int(k): int(v) for k, v in (data.get("pos") or {}).items()}
+        sk.neg = {int(k): int(v) for k, v in (data.get("neg") or {}).items()}
+        return sk
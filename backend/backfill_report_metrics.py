@@ -0,0 +1,22 @@
+# backfill_report_metrics.py
+#
+# Fill the normalized report_metric table from existing report_history rows.
+# Safe to re-run: reports that already have metric rows are skipped.
+#
+#   python backfill_report_metrics.py [--batch-size 500]
+
+import argparse
+import logging
+
+from app.core.database import init_db
+from app.services.metric_store import backfill_report_metrics
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill report_metric from report_history.")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    init_db()  # creates report_metric if missing
+    n = backfill_report_metrics(batch_size=args.batch_size)
+    print(f"✅ Inserted {n} report_metric rows")
@@ -0,0 +1,30 @@
+# compact_report_history.py
+#
+# Move the summaries/metadata of old reports into compressed cold storage
+# (report_archive). Incremental and resumable; safe to run next to the API.
+#
+#   python compact_report_history.py [--older-than-days 180] [--limit 10000] [--optimize]
+
+import argparse
+import logging
+
+from app.core.database import init_db
+from app.services.report_archive import ARCHIVE_AFTER_DAYS, compact_report_history, reclaim_space
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive old report_history text into report_archive.")
+    parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many reports.")
+    parser.add_argument("--optimize", action="store_true", help="OPTIMIZE TABLE / VACUUM afterwards.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+    result = compact_report_history(args.older_than_days, args.batch_size, args.limit)
+    if args.optimize and result.rows:
+        reclaim_space()
+    print(
+        f"✅ Archived {result.rows} reports "
+        f"({result.raw_bytes} -> {result.stored_bytes} bytes)"
+    )
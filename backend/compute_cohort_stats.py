@@ -0,0 +1,23 @@
+# compute_cohort_stats.py
+#
+# Rebuild the population quantile sketches (metric_cohort_sketch) from each
+# user's latest value per metric (report_metric_agg, one row per user and
+# metric). Schedule it (cron etc.); lookups never scan report data.
+#
+#   python compute_cohort_stats.py [--chunk-size 10000]
+
+import argparse
+import logging
+
+from app.core.database import init_db
+from app.services.cohort_stats import refresh_cohort_sketches
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh population cohort sketches.")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Rows fetched per cursor batch.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    init_db()  # creates metric_cohort_sketch if missing
+    n = refresh_cohort_sketches(chunk_size=args.chunk_size)
+    print(f"✅ Folded {n} user values into cohort sketches")
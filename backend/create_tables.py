@@ -1,6 +1,9 @@
 # create_tables.py
+#
+# Explicit migrate command: create missing tables, patch legacy report_history
+# columns and verify the insert column set. The API does the same once at startup.
 
-from app.core.database import engine, Base
+from app.core.database import init_db
 from app.models import user, history  # <-- important!
 
-Base.metadata.create_all(bind=engine)
+init_db()
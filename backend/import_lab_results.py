@@ -0,0 +1,57 @@
+# import_lab_results.py
+#
+# Bulk-import structured lab results (CSV, JSON/NDJSON rows or FHIR Observation
+# bundles) into report history, without PDF extraction or LLM calls.
+# Without --user-id, each row's user column (or FHIR subject) must be one of
+# our user ids, usernames or emails. Re-running on the same file skips reports
+# that were already imported.
+#
+#   python import_lab_results.py results.csv [results2.ndjson ...] [--user-id 42] [--dry-run]
+
+import os
+import time
+import argparse
+import logging
+
+from app.core.database import SessionLocal, init_db
+from app.services.lab_import import IMPORT_FORMATS, import_lab_results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import structured lab results into report history.")
+    parser.add_argument("paths", nargs="+", help="CSV / JSON / NDJSON / FHIR bundle files.")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, default="auto")
+    parser.add_argument("--user-id", type=int, default=None, help="Import every row for this user.")
+    parser.add_argument("--batch-size", type=int, default=500, help="Reports per transaction.")
+    parser.add_argument("--dry-run", action="store_true", help="Validate only, write nothing.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+    db = SessionLocal()
+    try:
+        for path in args.paths:
+            start = time.perf_counter()
+            with open(path, "rb") as f:
+                data = f.read()
+            result = import_lab_results(
+                db,
+                data,
+                fmt=args.format,
+                source=f"import:{os.path.basename(path)}",
+                user_id=args.user_id,
+                batch_size=args.batch_size,
+                dry_run=args.dry_run,
+            )
+            elapsed = time.perf_counter() - start
+            for issue in result.errors:
+                print(f"⚠️ {path}:{issue.line}: {issue.message}")
+            if result.error_count > len(result.errors):
+                print(f"⚠️ ... {result.error_count - len(result.errors)} more errors")
+            print(
+                f"✅ {path}: {result.rows} results -> {result.reports} reports "
+                f"({result.duplicates} already imported, {result.error_count} errors) "
+                f"in {elapsed:.1f}s ({result.rows / max(elapsed, 1e-9):.0f} rows/s)"
+                + (" [dry run]" if args.dry_run else "")
+            )
+    finally:
+        db.close()
@@ -0,0 +1,91 @@
+# ingest_pdf_dir.py
+#
+# Bulk-ingest a directory of historical PDF reports through the upload pipeline
+# (extract -> ranges -> summaries -> suggestions) in a process pool, writing
+# rows in batches. Resumable: progress is checkpointed in
+# <dir>/.ingest_checkpoint.jsonl, and files whose content a user already has
+# are skipped.
+#
+#   python ingest_pdf_dir.py /data/clinic --user-id 42
+#   python ingest_pdf_dir.py /data/clinic --by-subdir     # /data/clinic/<username>/*.pdf
+
+import os
+import time
+import argparse
+import logging
+
+from app.core.database import SessionLocal, init_db
+from app.services.lab_import import resolve_users
+from app.services.pdf_ingest import ingest_pdf_directory
+
+
+def _fmt_seconds(s):
+    if s is None:
+        return "?"
+    s = int(s)
+    return f"{s // 3600}h{s % 3600 // 60:02d}m" if s >= 3600 else f"{s // 60}m{s % 60:02d}s"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest a directory of PDF reports.")
+    parser.add_argument("root", help="Directory to ingest (searched recursively).")
+    who = parser.add_mutually_exclusive_group(required=True)
+    who.add_argument("--user-id", type=int, help="Every PDF belongs to this user.")
+    who.add_argument(
+        "--by-subdir",
+        action="store_true",
+        help="The first sub-directory names the user (id, username or email).",
+    )
+    parser.add_argument("--workers", type=int, default=0, help="Pipeline processes (default: one per CPU).")
+    parser.add_argument("--batch-size", type=int, default=50, help="Reports per transaction.")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file (default: inside root).")
+    parser.add_argument("--retry-failed", action="store_true", help="Retry files that failed before.")
+    parser.add_argument(
+        "--upload-date",
+        choices=("mtime", "now"),
+        default="mtime",
+        help="Date stored for each report: the file's mtime (default) or now.",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+
+    if args.user_id is not None:
+        user_for = lambda rel: args.user_id  # noqa: E731
+    else:
+        subdirs = [d for d in os.listdir(args.root) if os.path.isdir(os.path.join(args.root, d))]
+        db = SessionLocal()
+        try:
+            users = resolve_users(db, subdirs)
+        finally:
+            db.close()
+        user_for = lambda rel: users.get(rel.split(os.sep, 1)[0]) if os.sep in rel else None  # noqa: E731
+
+    last_print = [0.0]
+
+    def _print_progress(p):
+        now = time.perf_counter()
+        if now - last_print[0] < 2.0 and p.done < p.total:
+            return
+        last_print[0] = now
+        print(
+            f"⏳ {p.done}/{p.total} files | {p.rate * 60:.1f} files/min | "
+            f"stored {p.stored}, failed {p.failed} | ETA {_fmt_seconds(p.eta)}",
+            flush=True,
+        )
+
+    p = ingest_pdf_directory(
+        args.root,
+        user_for,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        checkpoint_path=args.checkpoint,
+        retry_failed=args.retry_failed,
+        use_mtime=args.upload_date == "mtime",
+        on_progress=_print_progress,
+    )
+    print(
+        f"✅ Ingested {p.stored} reports ({p.duplicates} duplicates skipped, {p.failed} failed) "
+        f"in {_fmt_seconds(p.elapsed)}"
+    )
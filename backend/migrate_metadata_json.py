@@ -0,0 +1,24 @@
+# migrate_metadata_json.py
+#
+# Optional: convert report_history.report_metadata to a native JSON column
+# (MySQL JSON / PostgreSQL JSONB). The app works with either column type.
+#
+#   python migrate_metadata_json.py [--clear-invalid]
+
+import argparse
+import logging
+
+from app.core.database import init_db, migrate_report_metadata_to_json
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert report_metadata to a native JSON column.")
+    parser.add_argument(
+        "--clear-invalid",
+        action="store_true",
+        help="Set metadata that is not valid JSON to NULL instead of aborting.",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+    print(f"✅ {migrate_report_metadata_to_json(clear_invalid=args.clear_invalid)}")
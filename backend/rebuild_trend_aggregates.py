@@ -0,0 +1,23 @@
+# rebuild_trend_aggregates.py
+#
+# Recompute the per-user trend aggregates (report_metric_agg) from report_metric.
+# Run after backfill_report_metrics.py, or to repair aggregates.
+#
+#   python rebuild_trend_aggregates.py [--user-id 42]
+
+import argparse
+import logging
+
+from app.core.database import init_db
+from app.services.trend_aggregates import rebuild_aggregates
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild report_metric_agg from report_metric.")
+    parser.add_argument("--user-id", type=int, default=None, help="Only rebuild this user.")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+    n = rebuild_aggregates(user_id=args.user_id, batch_size=args.batch_size)
+    print(f"✅ Wrote {n} trend aggregates")
@@ -0,0 +1,80 @@
+# resummarize_reports.py
+#
+# Regenerate summaries written by an older OLLAMA_MODEL or PROMPT_VERSION (or
+# with no recorded model) from the stored metrics. Runs at low CPU priority
+# and a capped rate, slows down while the LLM is busy, and is resumable:
+# rerunning only picks up rows that are still stale.
+#
+#   python resummarize_reports.py [--rate 30] [--only-model llama2] [--dry-run]
+
+import os
+import argparse
+import logging
+import time
+
+from app.core.database import init_db
+from app.services.resummarize import count_stale_summaries, resummarize_reports
+from app.services.summary import OLLAMA_MODEL, PROMPT_VERSION
+
+
+def _fmt_seconds(s):
+    if s is None:
+        return "?"
+    s = int(s)
+    return f"{s // 3600}h{s % 3600 // 60:02d}m" if s >= 3600 else f"{s // 60}m{s % 60:02d}s"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-summarize reports with the current model / prompts.")
+    parser.add_argument("--rate", type=float, default=30.0, help="Max reports per minute.")
+    parser.add_argument("--batch-size", type=int, default=20, help="Reports per UPDATE batch.")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many reports.")
+    parser.add_argument("--user-id", type=int, default=None, help="Only this user's reports.")
+    parser.add_argument(
+        "--only-model",
+        default=None,
+        help='Only rows written by this model ("" = rows with no recorded model).',
+    )
+    parser.add_argument("--include-archived", action="store_true", help="Also re-summarize archived reports.")
+    parser.add_argument("--slow-seconds", type=float, default=60.0, help="LLM latency that triggers back-off.")
+    parser.add_argument("--nice", type=int, default=10, help="CPU niceness increment for this process.")
+    parser.add_argument("--dry-run", action="store_true", help="Only count stale reports.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.nice and hasattr(os, "nice"):
+        os.nice(args.nice)
+    init_db()
+
+    if args.dry_run:
+        n = count_stale_summaries(args.only_model, args.include_archived, args.user_id)
+        print(f"✅ {n} reports would be re-summarized with {OLLAMA_MODEL} / prompt v{PROMPT_VERSION}")
+        raise SystemExit(0)
+
+    last_print = [0.0]
+
+    def _print_progress(p):
+        now = time.perf_counter()
+        if now - last_print[0] < 10.0:
+            return
+        last_print[0] = now
+        print(
+            f"⏳ {p.done}/{p.total} reports | {p.rate * 60:.1f}/min | "
+            f"updated {p.updated}, failed {p.failed} | ETA {_fmt_seconds(p.eta)}",
+            flush=True,
+        )
+
+    p = resummarize_reports(
+        per_minute=args.rate,
+        batch_size=args.batch_size,
+        limit=args.limit,
+        only_model=args.only_model,
+        include_archived=args.include_archived,
+        user_id=args.user_id,
+        slow_seconds=args.slow_seconds,
+        on_progress=_print_progress,
+    )
+    print(
+        f"✅ Re-summarized {p.updated} reports with {OLLAMA_MODEL} / prompt v{PROMPT_VERSION} "
+        f"({p.skipped} without metrics, {p.failed} failed) in {_fmt_seconds(p.elapsed)}"
+    )
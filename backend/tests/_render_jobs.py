@@ -0,0 +1,19 @@
+# tests/_render_jobs.py
+"""
+Stand-ins for the WeasyPrint worker functions in render_pool. They live in
+their own module so the pool's spawned worker processes can import them.
+"""
+import os
+import time
+
+
+def init_worker() -> None:
+    pass
+
+
+def render_job(html_str: str) -> bytes:
+    if html_str == "hang":
+        time.sleep(60)
+    if html_str == "crash":
+        os._exit(1)
+    return html_str.encode("utf-8")
@@ -0,0 +1,104 @@
+# tests/conftest.py
+"""
+Shared fixtures. The app reads its settings at import time, so the test
+environment (a throwaway SQLite database, chart store in a temp dir, no
+background pre-rendering) is set up before anything from app/ is imported.
+"""
+import os
+import uuid
+import tempfile
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+_TMP = tempfile.mkdtemp(prefix="health_trail_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP, 'test.db')}"
+os.environ["CHART_CACHE_DIR"] = os.path.join(_TMP, "charts")
+os.environ["PDF_CACHE_DIR"] = ""
+os.environ["PDF_PRERENDER_ENABLED"] = "false"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app  # noqa: E402
+from app.core.database import SessionLocal, store_reports_in_db  # noqa: E402
+from app.core.security import create_access_token  # noqa: E402
+from app.models.user import User  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def tmp_root() -> str:
+    return _TMP
+
+
+@pytest.fixture(scope="session")
+def client() -> TestClient:
+    return TestClient(app)
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def _create_user() -> SimpleNamespace:
+    username = f"user_{uuid.uuid4().hex[:12]}"
+    session = SessionLocal()
+    try:
+        u = User(username=username, email=f"{username}@example.com", hashed_password="x")
+        session.add(u)
+        session.commit()
+        user_id = u.id
+    finally:
+        session.close()
+    token = create_access_token({"sub": username})
+    return SimpleNamespace(id=user_id, username=username, headers={"Authorization": f"Bearer {token}"})
+
+
+@pytest.fixture
+def user() -> SimpleNamespace:
+    """A fresh user (own history, so tests never see each other's reports)."""
+    return _create_user()
+
+
+@pytest.fixture
+def make_user():
+    return _create_user
+
+
+@pytest.fixture
+def add_report():
+    """add_report(user_id, metrics, uploaded_at=None, **fields) -> report id."""
+
+    def _add(user_id: int, metrics: dict, uploaded_at: datetime = None, **fields) -> int:
+        row = {
+            "user_id": user_id,
+            "doctor_summary": fields.pop("doctor_summary", "doctor summary"),
+            "patient_summary": fields.pop("patient_summary", "patient summary"),
+            "metadata": metrics,
+            "filename": fields.pop("filename", "report.pdf"),
+            "uploaded_at": uploaded_at,
+            **fields,
+        }
+        return store_reports_in_db([row])[0]
+
+    return _add
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Replace the Ollama call; returns the list of prompts it received."""
+    import app.services.summary as summary
+
+    calls = []
+
+    def _fake(text: str, audience: str) -> str:
+        calls.append((audience, text))
+        return f"{audience} summary"
+
+    monkeypatch.setattr(summary, "_summarize_with_llm", _fake)
+    return calls
@@ -0,0 +1,85 @@
+import os
+
+from app.services import chart_cache
+from app.services.chart_cache import (
+    chart_data_uri,
+    chart_file_path,
+    chart_key,
+    chart_url,
+    get_or_render_chart,
+    parse_chart_name,
+)
+
+
+def test_key_depends_only_on_inputs():
+    assert chart_key("Glucose", 95, 70, 99, "mg/dL") == chart_key("Glucose", 95.0, 70.0, 99.0, "mg/dL")
+    assert chart_key("Glucose", 95, 70, 99) != chart_key("Glucose", 96, 70, 99)
+    assert chart_key("Glucose", 95, 70, 99, fmt="svg") != chart_key("Glucose", 95, 70, 99, fmt="png")
+
+
+def test_identical_charts_are_rendered_once():
+    key = get_or_render_chart("Hemoglobin", 13.1, 12, 16, "g/dL")
+    path = chart_file_path(key, "svg")
+    mtime = os.stat(path).st_mtime_ns
+    assert get_or_render_chart("Hemoglobin", 13.1, 12, 16, "g/dL") == key
+    assert os.stat(path).st_mtime_ns == mtime
+
+
+def test_parse_chart_name():
+    key = chart_key("WBC", 7, 4, 11)
+    assert parse_chart_name(f"{key}.svg") == (key, "svg")
+    assert parse_chart_name(f"{key}.gif") is None
+    assert parse_chart_name("../../etc/passwd.svg") is None
+    assert parse_chart_name(f"{key.upper()}.svg") is None
+
+
+def test_evicted_chart_is_rendered_again(monkeypatch):
+    monkeypatch.setattr(chart_cache._index, "max_bytes", 1)
+    first = get_or_render_chart("Platelets", 250, 150, 450)
+    first_path = chart_cache._path_for(first, "svg")
+    with open(first_path, encoding="utf-8") as f:
+        original = f.read()
+
+    get_or_render_chart("Platelets", 260, 150, 450)  # evicts the first chart
+    assert not os.path.exists(first_path)
+
+    assert chart_file_path(first, "svg") == first_path
+    with open(first_path, encoding="utf-8") as f:
+        assert f.read() == original
+
+
+def test_chart_inputs_are_bounded_too(monkeypatch):
+    monkeypatch.setattr(chart_cache._inputs_index, "max_bytes", 1)
+    first = get_or_render_chart("Ferritin", 80, 30, 400)
+    second = get_or_render_chart("Ferritin", 90, 30, 400)  # evicts the inputs of the first chart
+    assert not os.path.exists(chart_cache._inputs_path(first))
+    assert os.path.exists(chart_cache._inputs_path(second))
+    assert chart_cache._inputs_index.total == os.path.getsize(chart_cache._inputs_path(second))
+
+    # the chart itself is still served; once it is evicted as well, its URL is gone
+    assert chart_file_path(first, "svg") is not None
+    os.remove(chart_cache._path_for(first, "svg"))
+    assert chart_file_path(first, "svg") is None
+
+    # handing the URL out again restores its inputs
+    assert get_or_render_chart("Ferritin", 80, 30, 400) == first
+    assert os.path.exists(chart_cache._inputs_path(first))
+
+
+def test_unknown_chart_has_no_path():
+    assert chart_file_path("0" * 32, "svg") is None
+
+
+def test_tampered_inputs_are_not_rendered(monkeypatch):
+    key = get_or_render_chart("RBC", 4.9, 4.5, 5.9)
+    with open(chart_cache._inputs_path(key), "w", encoding="utf-8") as f:
+        f.write('{"fmt": "svg", "inputs": ["RBC", 1.0, 4.5, 5.9, ""]}')
+    os.remove(chart_cache._path_for(key, "svg"))
+    assert chart_file_path(key, "svg") is None
+
+
+def test_data_uri_for_small_charts_only():
+    url = chart_url(get_or_render_chart("Glucose", 91, 70, 99))
+    assert chart_data_uri(url).startswith("data:image/svg+xml;base64,")
+    assert chart_data_uri(url, max_bytes=10) is None
+    assert chart_data_uri("/api/charts/nope.svg") is None
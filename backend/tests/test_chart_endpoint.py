@@ -0,0 +1,24 @@
+from app.services.chart_cache import chart_url, get_or_render_chart
+
+
+def test_chart_is_served_immutable_with_etag(client):
+    key = get_or_render_chart("Glucose", 101, 70, 99, "mg/dL")
+    r = client.get(chart_url(key))
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("image/svg+xml")
+    assert r.headers["etag"] == f'"{key}"'
+    assert "immutable" in r.headers["cache-control"]
+    assert r.content.startswith(b"<svg")
+
+
+def test_matching_etag_gives_304(client):
+    key = get_or_render_chart("Glucose", 102, 70, 99, "mg/dL")
+    r = client.get(chart_url(key), headers={"If-None-Match": f'W/"{key}", "other"'})
+    assert r.status_code == 304
+    assert r.content == b""
+    assert r.headers["etag"] == f'"{key}"'
+
+
+def test_unknown_or_invalid_chart_is_404(client):
+    assert client.get(f"/api/charts/{'a' * 32}.svg").status_code == 404
+    assert client.get("/api/charts/not-a-chart.svg").status_code == 404
@@ -0,0 +1,62 @@
+import re
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from app.services import chart_generator
+from app.services.chart_generator import CHART_WIDTH, generate_charts, render_chart_svg
+
+_SVG = "{http://www.w3.org/2000/svg}"
+
+
+def _marker_and_band(svg: str):
+    root = ET.fromstring(svg)
+    line = next(el for el in root.iter(f"{_SVG}line") if el.get("stroke-width") == "2")
+    band = [el for el in root.iter(f"{_SVG}rect") if el.get("fill-opacity")][0]
+    return float(line.get("x1")), float(band.get("x")), float(band.get("width"))
+
+
+def test_svg_is_well_formed_and_labelled():
+    svg = render_chart_svg("Glucose", 95, 70, 99, "mg/dL")
+    root = ET.fromstring(svg)
+    assert root.tag == f"{_SVG}svg"
+    assert root.get("width") == str(CHART_WIDTH)
+    texts = [el.text for el in root.iter(f"{_SVG}text")]
+    assert "Glucose: 95" in texts
+    assert "Glucose (mg/dL)" in texts
+
+
+def test_marker_inside_band_for_normal_value():
+    x, band_x, band_w = _marker_and_band(render_chart_svg("Glucose", 85, 70, 99))
+    assert band_x < x < band_x + band_w
+
+
+def test_marker_right_of_band_for_high_value():
+    x, band_x, band_w = _marker_and_band(render_chart_svg("Glucose", 140, 70, 99))
+    assert x > band_x + band_w
+
+
+def test_labels_are_escaped():
+    svg = render_chart_svg("A<B & C", 1, 0, 2)
+    ET.fromstring(svg)
+    assert "A&lt;B &amp; C" in svg
+
+
+def test_generate_charts_returns_svg_urls_and_skips_non_numeric():
+    urls = generate_charts(
+        metrics={"Glucose": 95, "Note": "n/a"},
+        ranges={"Glucose": {"min": 70, "max": 99, "unit": "mg/dL"}},
+    )
+    assert list(urls) == ["Glucose"]
+    assert re.fullmatch(r"/api/charts/[0-9a-f]{32}\.svg", urls["Glucose"])
+
+
+def test_generate_charts_rejects_unknown_format():
+    with pytest.raises(ValueError):
+        generate_charts(metrics={"Glucose": 95}, fmt="gif")
+
+
+def test_png_charts_need_matplotlib(monkeypatch):
+    monkeypatch.setattr(chart_generator, "_HAS_MATPLOTLIB", False)
+    with pytest.raises(ValueError, match="matplotlib"):
+        generate_charts(metrics={"Glucose": 95}, fmt="png")
@@ -0,0 +1,38 @@
+import uuid
+
+import pytest
+
+from app.services.cohort_stats import cohort_percentile, refresh_cohort_sketches
+
+
+def test_each_user_counts_once_with_their_latest_value(make_user, add_report, db):
+    metric = f"Cohort_{uuid.uuid4().hex[:8]}"
+    heavy = make_user()
+    for value in (10, 10, 10, 10, 10, 10, 10, 10, 10, 100):
+        add_report(heavy.id, {metric: value})
+    for value in (20, 30, 40, 50):
+        add_report(make_user().id, {metric: value})
+
+    assert refresh_cohort_sketches(chunk_size=3) > 0
+    result = cohort_percentile(db, metric, value=45)
+    assert result["population"] == 5
+    assert result["quantiles"]["p50"] == pytest.approx(40, rel=0.01)
+    assert 55 <= result["percentile"] <= 65
+
+
+def test_unknown_metric_has_no_statistics(db):
+    assert cohort_percentile(db, f"Missing_{uuid.uuid4().hex[:8]}", value=1.0) is None
+
+
+def test_percentile_endpoint_defaults_to_the_users_latest_value(client, user, add_report):
+    metric = f"Cohort_{uuid.uuid4().hex[:8]}"
+    add_report(user.id, {metric: 1})
+    add_report(user.id, {metric: 5})
+    refresh_cohort_sketches()
+
+    r = client.get("/api/cohort/percentile", params={"metric": metric}, headers=user.headers)
+    assert r.status_code == 200
+    body = r.json()
+    assert (body["population"], body["value"], body["percentile"]) == (1, 5.0, 100.0)
+    assert client.get("/api/cohort/percentile", params={"metric": "nope"}, headers=user.headers).status_code == 404
+
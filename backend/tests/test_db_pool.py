@@ -0,0 +1,76 @@
+import asyncio
+import threading
+
+from sqlalchemy import select
+
+from app.api import routes
+from app.core.database import DB_MAX_OVERFLOW, DB_POOL_SIZE, _PoolStats, dispose_async_engine, get_async_db, pool_stats, store_reports_in_db_async
+from app.models.history import ReportHistory
+from app.services import summary
+
+
+def test_wait_histogram_buckets():
+    stats = _PoolStats()
+    for seconds in (0.0005, 0.003, 0.003, 0.2, 5.0):
+        stats.record(seconds)
+    stats.record(30.0, timed_out=True)
+    snap = stats.snapshot()
+    assert (snap["checkouts"], snap["timeouts"]) == (5, 1)
+    assert snap["wait_ms_max"] == 5000.0
+    assert snap["wait_ms_histogram"] == {
+        "le_1": 1, "le_5": 2, "le_25": 0, "le_100": 0, "le_500": 1, "le_2000": 0, "inf": 1,
+    }
+
+
+def test_pool_stats_report_the_sync_pool(user, add_report):
+    add_report(user.id, {"Glucose": 90})
+    sync = pool_stats()["sync"]
+    assert (sync["size"], sync["capacity"]) == (DB_POOL_SIZE, DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    assert sync["checked_out"] <= sync["capacity"]
+    assert sync["checkouts"] > 0
+
+
+def test_db_pool_endpoint_requires_a_token(client, user, monkeypatch):
+    assert client.get("/api/metrics/db-pool").status_code == 401
+    assert client.get("/api/metrics/db-pool", headers={"Authorization": "Bearer junk"}).status_code == 401
+
+    r = client.get("/api/metrics/db-pool", headers=user.headers)
+    assert r.status_code == 200
+    assert "sync" in r.json()
+
+    monkeypatch.setattr(routes, "DB_METRICS_USERS", {"ops"})
+    assert client.get("/api/metrics/db-pool", headers=user.headers).status_code == 403
+
+
+def test_async_insert_and_session(user):
+    async def _run():
+        (report_id,) = await store_reports_in_db_async(
+            [{"user_id": user.id, "doctor_summary": "d", "patient_summary": "p", "metadata": {"Glucose": 91}}]
+        )
+        agen = get_async_db()
+        session = await agen.__anext__()
+        try:
+            row = (await session.execute(select(ReportHistory).where(ReportHistory.id == report_id))).scalars().one()
+            return row.user_id, row.report_metadata
+        finally:
+            await agen.aclose()
+            await dispose_async_engine()  # its connections belong to this event loop
+
+    assert asyncio.run(_run()) == (user.id, {"Glucose": 91})
+
+
+def test_upload_pipeline_runs_off_the_event_loop(monkeypatch):
+    threads = []
+
+    def build_report(file, user_id=None, charts=True):
+        threads.append(threading.get_ident())
+        return {"metrics": {}, "user_id": user_id}
+
+    monkeypatch.setattr(summary, "build_report", build_report)
+
+    async def _run():
+        return threading.get_ident(), await summary.generate_summary(b"%PDF", user_id=7)
+
+    loop_thread, result = asyncio.run(_run())
+    assert result["user_id"] == 7
+    assert threads and threads[0] != loop_thread
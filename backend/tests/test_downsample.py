@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.core.database import store_reports_in_db
+from app.utils.downsample import downsample_rows, downsample_series, lttb_indices
+
+
+def test_short_input_is_returned_unchanged():
+    assert downsample_series([1.0, 2.0, 3.0], 5) == [1.0, 2.0, 3.0]
+    assert lttb_indices([1.0, 2.0], 1).tolist() == [0, 1]
+
+
+def test_keeps_endpoints_and_exact_length():
+    y = np.sin(np.linspace(0, 20, 1000))
+    idx = lttb_indices(y, 50)
+    assert len(idx) == 50
+    assert idx[0] == 0 and idx[-1] == 999
+    assert (np.diff(idx) > 0).all()
+
+
+def test_spikes_and_troughs_survive():
+    y = [10.0] * 500
+    y[123], y[377] = 250.0, -80.0
+    out = downsample_series(y, 20)
+    assert len(out) == 20
+    assert 250.0 in out and -80.0 in out
+    # keeping the last N points would have lost both
+    assert 250.0 not in y[-20:]
+
+
+def test_uneven_x_positions_are_respected():
+    x = np.r_[np.arange(50), 1000 + np.arange(50)]
+    y = np.r_[np.zeros(50), np.ones(50)]
+    idx = lttb_indices(y, 4, x)
+    assert idx[0] == 0 and idx[-1] == 99
+    assert set(idx.tolist()) & set(range(49, 51))
+
+
+def test_rows_are_reduced_per_column_ignoring_missing_cells():
+    rows = [{"id": i, "A": float(i % 10), "B": -1.0} for i in range(300)]
+    rows[150]["B"] = 42.0
+    rows[151]["B"] = 1.0
+    out = downsample_rows(rows, ["A", "B"], 10)
+    assert len(out) <= 20
+    ids = [r["id"] for r in out]
+    assert ids == sorted(ids) and ids[0] == 0 and ids[-1] == 299
+    assert 150 in ids and 151 in ids
+    assert downsample_rows(rows[:5], ["A"], 10) == rows[:5]
+
+
+def test_history_metrics_points_keeps_the_peak(client, user):
+    values = [90.0] * 60
+    values[31] = 300.0
+    store_reports_in_db([
+        {"user_id": user.id, "doctor_summary": "", "patient_summary": "", "metadata": {"Glucose": v},
+         "uploaded_at": datetime(2024, 1, 1) + timedelta(days=i)}
+        for i, v in enumerate(values)
+    ])
+    r = client.get("/api/history/metrics", params={"metrics": ["Glucose"], "points": 10}, headers=user.headers)
+    assert r.status_code == 200
+    out = [row["Glucose"] for row in r.json()]
+    assert len(out) <= 10
+    assert 300.0 in out
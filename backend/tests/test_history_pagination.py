@@ -0,0 +1,70 @@
+from datetime import datetime
+
+
+def _reports(client, user, **params):
+    pages, cursor = [], None
+    while True:
+        if cursor:
+            params["before_id"] = cursor
+        r = client.get("/api/history/reports", params=params, headers=user.headers)
+        assert r.status_code == 200
+        pages.append([row["id"] for row in r.json()])
+        cursor = r.headers.get("x-next-cursor")
+        if not cursor:
+            return pages
+
+
+def test_report_list_pages_newest_first_without_gaps(client, user, add_report):
+    # inserted out of date order: the cursor follows report dates, not ids
+    dates = [datetime(2024, 1, d) for d in (5, 1, 9, 3, 7, 2, 8)]
+    ids = {add_report(user.id, {"Glucose": 90}, uploaded_at=d): d for d in dates}
+    expected = sorted(ids, key=lambda i: ids[i], reverse=True)
+
+    pages = _reports(client, user, limit=3)
+    assert [len(p) for p in pages] == [3, 3, 1]
+    assert [i for p in pages for i in p] == expected
+
+
+def test_report_list_filters(client, user, add_report):
+    a = add_report(user.id, {"Glucose": 90}, uploaded_at=datetime(2024, 1, 10))
+    b = add_report(user.id, {"WBC": 7}, uploaded_at=datetime(2024, 2, 10))
+    c = add_report(user.id, {"Glucose": 95}, uploaded_at=datetime(2024, 3, 10))
+
+    assert _reports(client, user, since="2024-02-01") == [[c, b]]
+    assert _reports(client, user, until="2024-02-10") == [[b, a]]
+    assert _reports(client, user, metric="Glucose") == [[c, a]]
+
+    rows = client.get("/api/history/reports", headers=user.headers).json()
+    assert rows[0]["metric_keys"] == ["Glucose"]
+    assert set(rows[0]) == {"id", "filename", "uploaded_at", "metric_keys"}
+
+
+def test_report_list_rejects_foreign_cursor(client, user, make_user, add_report):
+    other = make_user()
+    foreign = add_report(other.id, {"Glucose": 90})
+    r = client.get("/api/history/reports", params={"before_id": foreign}, headers=user.headers)
+    assert r.status_code == 400
+
+
+def test_metrics_table_pages_oldest_first_with_projection(client, user, add_report):
+    for d, g in ((3, 93), (1, 91), (2, 92), (4, 94)):
+        add_report(user.id, {"Glucose": g, "WBC": 7}, uploaded_at=datetime(2024, 1, d))
+
+    r = client.get("/api/history/metrics", params={"limit": 3, "metrics": ["Glucose"]}, headers=user.headers)
+    assert r.status_code == 200
+    page = r.json()
+    assert [row["Glucose"] for row in page] == [91, 92, 93]
+    assert "WBC" not in page[0]
+
+    cursor = r.headers["x-next-cursor"]
+    rest = client.get(
+        "/api/history/metrics", params={"limit": 3, "metrics": ["Glucose"], "after_id": cursor}, headers=user.headers
+    )
+    assert [row["Glucose"] for row in rest.json()] == [94]
+    assert "x-next-cursor" not in rest.headers
+
+
+def test_metrics_table_rejects_unknown_cursor(client, user, add_report):
+    add_report(user.id, {"Glucose": 90})
+    r = client.get("/api/history/metrics", params={"after_id": 10 ** 9}, headers=user.headers)
+    assert r.status_code == 400
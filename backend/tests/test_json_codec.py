@@ -0,0 +1,69 @@
+from types import MappingProxyType
+
+import numpy as np
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.schema import CreateTable
+
+from app.core.database import begin_write
+from app.models.history import MetadataJSON, ReportHistory
+from app.utils import json_codec
+from app.utils.json_codec import dumps, loads, loads_dict, report_metadata
+
+_META = {"metrics": {"Glucose": 95.5, "Hemoglobin": 13}, "ranges": {"Glucose": {"min": 70, "max": 99, "unit": "mg/dL"}}}
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_round_trip_with_either_backend(use_orjson, monkeypatch):
+    if use_orjson and not json_codec.HAS_ORJSON:
+        pytest.skip("orjson not installed")
+    monkeypatch.setattr(json_codec, "HAS_ORJSON", use_orjson)
+    raw = dumps({**_META, "note": "µg/dL"})
+    assert isinstance(raw, str) and " " not in raw.replace("µg/dL", "")
+    assert loads(raw) == {**_META, "note": "µg/dL"}
+    assert loads(raw.encode("utf-8")) == loads(raw)
+
+
+def test_numpy_values_are_serialized():
+    if not json_codec.HAS_ORJSON:
+        pytest.skip("orjson not installed")
+    assert loads(dumps({"v": np.float64(1.5), "a": np.array([1, 2])})) == {"v": 1.5, "a": [1, 2]}
+
+
+@pytest.mark.parametrize("raw", [None, "", "not json", "[1, 2]", "{'Glucose': 95}", b"null"])
+def test_unusable_metadata_reads_as_empty(raw):
+    assert loads_dict(raw) == {}
+
+
+def test_report_metadata_accepts_every_stored_shape():
+    assert report_metadata({"Glucose": 95}) == {"Glucose": 95}
+    assert report_metadata('{"Glucose": 95}') == {"Glucose": 95}
+    # result mapping of a legacy schema
+    assert report_metadata(MappingProxyType({"metadata_json": '{"Glucose": 95}'})) == {"Glucose": 95}
+    row = type("Row", (), {"report_metadata": None, "meta": '{"WBC": 7}'})()
+    assert report_metadata(row) == {"WBC": 7}
+
+
+def test_native_json_column_types():
+    table = ReportHistory.__table__
+    assert "report_metadata JSON" in str(CreateTable(table).compile(dialect=mysql.dialect()))
+    assert "report_metadata JSONB" in str(CreateTable(table).compile(dialect=postgresql.dialect()))
+    assert "report_metadata TEXT" in str(CreateTable(table).compile(dialect=sqlite.dialect()))
+
+
+def test_bind_values_per_dialect():
+    col = MetadataJSON()
+    assert col.process_bind_param(_META, mysql.dialect()) == _META
+    assert loads(col.process_bind_param(_META, sqlite.dialect())) == _META
+    assert col.process_bind_param('{"Glucose": 1}', postgresql.dialect()) == {"Glucose": 1}
+    assert col.process_result_value("", sqlite.dialect()) is None
+
+
+def test_stored_metadata_reads_back_as_dict(user, add_report, db):
+    good = add_report(user.id, _META)
+    legacy = add_report(user.id, {"Glucose": 1})
+    with begin_write() as conn:
+        conn.execute(text("UPDATE report_history SET report_metadata = 'Glucose=95' WHERE id = :id"), {"id": legacy})
+    assert db.get(ReportHistory, good).report_metadata == _META
+    assert report_metadata(db.get(ReportHistory, legacy)) == {}
@@ -0,0 +1,104 @@
+import json
+from datetime import datetime
+
+from app.core.database import get_latest_report_for_user
+from app.models.history import ReportHistory
+from app.services.lab_import import import_lab_results, iter_lab_records, validate_record
+
+_CSV = (
+    "Patient,Accession,LOINC,Test_Name,Result,Units,Ref_Low,Ref_High,Collected_At\n"
+    "p1,A-1,2345-7,,105,mg/dL,70,100,2024-02-01T08:00:00Z\n"
+    "p1,A-1,,hgb,13.9,g/dL,,,2024-02-01T08:05:00Z\n"
+    "p1,A-2,2345-7,,92,mg/dL,,,2023-11-15\n"
+    "p1,A-2,6690-2,,7.1,mmol/L,,,2023-11-15\n"
+    "p1,A-3,9999-9,,1,,,,2023-11-15\n"
+    "p1,A-3,2345-7,,abc,,,,2023-11-15\n"
+    "\n"
+)
+
+
+def _bundle(username: str) -> bytes:
+    def obs(oid, code, value, unit, status="final"):
+        return {"resource": {
+            "resourceType": "Observation", "id": oid, "status": status,
+            "code": {"coding": [{"system": "http://loinc.org", "code": code}]},
+            "valueQuantity": {"value": value, "unit": unit},
+            "effectiveDateTime": "2024-03-03T09:30:00+02:00",
+            "subject": {"identifier": {"value": username}},
+        }}
+
+    return json.dumps({"resourceType": "Bundle", "entry": [
+        {"resource": {"resourceType": "DiagnosticReport", "id": "dr1", "identifier": [{"value": "ACC-9"}],
+                      "result": [{"reference": "Observation/o1"}, {"reference": "Observation/o2"}]}},
+        obs("o1", "718-7", 14.2, "g/dL"),
+        obs("o2", "2345-7", 88, "mg/dL"),
+        obs("o3", "777-3", 250, "10^3/µL", status="entered-in-error"),
+    ]}).encode("utf-8")
+
+
+def test_csv_rows_are_validated_and_grouped_per_report(user, db):
+    result = import_lab_results(db, _CSV.encode("utf-8"), source="labcorp", user_id=user.id)
+    db.rollback()
+    assert (result.rows, result.reports, result.duplicates) == (3, 2, 0)
+    assert result.error_count == 3
+    assert [e.line for e in result.errors] == [5, 6, 7]
+    assert "does not match" in result.errors[0].message  # WBC in mmol/L is rejected, not converted
+
+    rows = {r.filename: r for r in db.query(ReportHistory).filter(ReportHistory.id.in_(result.report_ids))}
+    a1 = rows["labcorp:A-1"]
+    assert a1.uploaded_at == datetime(2024, 2, 1, 8, 0)
+    assert a1.report_metadata["metrics"] == {"Glucose": 105.0, "Hemoglobin": 13.9}
+    assert a1.report_metadata["ranges"]["Glucose"] == {"min": 70.0, "max": 100.0, "unit": "mg/dL"}
+    assert a1.doctor_summary == ""
+
+
+def test_reimport_is_a_no_op_and_dry_run_writes_nothing(user, db):
+    data = _CSV.encode("utf-8")
+    dry = import_lab_results(db, data, source="dup", user_id=user.id, dry_run=True)
+    assert (dry.reports, dry.report_ids) == (2, [])
+    assert db.query(ReportHistory).filter(ReportHistory.user_id == user.id).count() == 0
+
+    first = import_lab_results(db, data, source="dup", user_id=user.id)
+    again = import_lab_results(db, data, source="dup", user_id=user.id)
+    db.rollback()  # the import commits through its own session
+    assert (again.reports, again.duplicates, again.report_ids) == (0, 2, [])
+    assert db.query(ReportHistory).filter(ReportHistory.user_id == user.id).count() == len(first.report_ids)
+
+
+def test_fhir_bundle_resolves_users_and_groups_by_diagnostic_report(user, db):
+    result = import_lab_results(db, _bundle(user.username), source="fhir")
+    assert (result.rows, result.reports, result.error_count) == (2, 1, 0)
+    db.rollback()
+    row = db.get(ReportHistory, result.report_ids[0])
+    assert (row.user_id, row.filename) == (user.id, "fhir:ACC-9")
+    assert row.uploaded_at == datetime(2024, 3, 3, 7, 30)  # normalised to naive UTC
+    assert row.report_metadata["metrics"] == {"Hemoglobin": 14.2, "Glucose": 88.0}
+
+
+def test_unknown_users_are_reported(db):
+    records = [{"user": "nobody-here", "code": "2345-7", "value": 90, "date": "2024-01-01"}]
+    data = "\n".join(json.dumps(r) for r in records).encode("utf-8")  # NDJSON
+    assert [rec for _, rec in iter_lab_records(data)] == [{"user": "nobody-here", "code": "2345-7", "value": 90, "date": "2024-01-01"}]
+    result = import_lab_results(db, data)
+    assert result.reports == 0
+    assert result.errors[0].message == "unknown user 'nobody-here'"
+
+
+def test_validate_record_defaults_to_reference_ranges():
+    r = validate_record(3, {"name": "Fasting Glucose", "value": "101", "date": "2024-01-02"})
+    assert (r.metric, r.value, r.unit, r.low, r.high) == ("Glucose", 101.0, "mg/dL", 70, 99)
+
+
+def test_backdated_imports_keep_history_in_date_order(user, add_report, db):
+    uploaded = add_report(user.id, {"Glucose": 95}, uploaded_at=datetime(2025, 1, 1))
+    import_lab_results(db, _CSV.encode("utf-8"), source="old", user_id=user.id)
+    assert get_latest_report_for_user(db, user.id).id == uploaded
+
+
+def test_import_endpoint(client, user):
+    files = {"file": ("results.csv", _CSV.encode("utf-8"), "text/csv")}
+    r = client.post("/api/import/lab-results", files=files, headers=user.headers)
+    assert r.status_code == 200
+    body = r.json()
+    assert (body["rows"], body["reports"], body["error_count"]) == (3, 2, 3)
+    assert client.post("/api/import/lab-results", params={"format": "xml"}, files=files, headers=user.headers).status_code == 422
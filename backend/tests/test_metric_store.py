@@ -0,0 +1,60 @@
+from datetime import datetime
+
+from sqlalchemy import text
+
+from app.core.database import begin_write
+from app.services.metric_store import (
+    backfill_report_metrics,
+    build_metric_rows,
+    get_metric_series,
+    has_metric_rows,
+    metric_values_for_reports,
+)
+
+_AT = datetime(2024, 1, 1)
+
+
+def test_rows_from_flat_metadata_use_static_ranges():
+    rows = build_metric_rows(1, 2, {"Glucose": 140, "Note": "text"}, _AT)
+    assert len(rows) == 1
+    row = rows[0]
+    assert (row["report_id"], row["user_id"], row["metric"], row["value"]) == (1, 2, "Glucose", 140.0)
+    assert row["status"] == "high"
+    assert row["measured_at"] == _AT
+
+
+def test_rows_from_nested_metadata_use_its_ranges():
+    meta = {"metrics": {"Glucose": 140}, "ranges": {"Glucose": {"min": 100, "max": 200, "unit": "mg/dL"}}}
+    (row,) = build_metric_rows(1, 2, meta, _AT)
+    assert row["status"] == "normal"
+    assert row["unit"] == "mg/dL"
+
+
+def test_series_is_bounded_and_stops_at_the_given_report(user, add_report, db):
+    ids = [add_report(user.id, {"Glucose": 90 + i}, uploaded_at=datetime(2024, 1, 1 + i)) for i in range(6)]
+    assert get_metric_series(db, user.id, ["Glucose"], limit=3) == {"Glucose": [93.0, 94.0, 95.0]}
+
+    upto = get_metric_series(db, user.id, ["Glucose", "WBC"], limit=10, until=datetime(2024, 1, 3), until_report_id=ids[2])
+    assert upto == {"Glucose": [90.0, 91.0, 92.0], "WBC": []}
+
+
+def test_values_for_reports_reads_legacy_rows_from_metadata(user, add_report, db):
+    new = add_report(user.id, {"Glucose": 95, "WBC": 7})
+    legacy = add_report(user.id, {"Glucose": 88})
+    with begin_write() as conn:
+        conn.execute(text("DELETE FROM report_metric WHERE report_id = :id"), {"id": legacy})
+    assert not has_metric_rows(db, legacy)
+
+    values = metric_values_for_reports(db, [new, legacy], metrics=["Glucose"])
+    assert values == {new: {"Glucose": 95.0}, legacy: {"Glucose": 88.0}}
+
+
+def test_backfill_fills_only_missing_rows(user, add_report, db):
+    report_id = add_report(user.id, {"Glucose": 95, "Hemoglobin": 13})
+    with begin_write() as conn:
+        conn.execute(text("DELETE FROM report_metric WHERE report_id = :id"), {"id": report_id})
+
+    assert backfill_report_metrics(batch_size=2) >= 2  # other tests' rows may be missing too
+    assert metric_values_for_reports(db, [report_id]) == {report_id: {"Glucose": 95.0, "Hemoglobin": 13.0}}
+    assert has_metric_rows(db, report_id)
+    assert backfill_report_metrics() == 0
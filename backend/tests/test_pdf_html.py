@@ -0,0 +1,29 @@
+import pytest
+
+from app.services.pdf_generator import _build_html_doc, _normalize_ranges
+from app.services.render_pool import _restricted_url_fetcher
+
+
+def test_report_html_is_self_contained():
+    metrics = {"Glucose": 140.0, "Hemoglobin": 13.5}
+    html_doc, css = _build_html_doc(
+        doctor_summary="doc <b>",
+        patient_summary="pat",
+        metrics=metrics,
+        ranges=_normalize_ranges(metrics, {}),
+        suggestions={},
+        series_map={"Glucose": [90, 120, 140]},
+    )
+    assert "<img" not in html_doc
+    assert "file:" not in html_doc and "http://" not in html_doc.replace("http://www.w3.org/2000/svg", "")
+    assert "src=" not in html_doc
+    # one band-and-marker chart per metric, inline
+    assert html_doc.count("<div class='chart'><svg") == len(metrics)
+    assert "doc &lt;b&gt;" in html_doc
+    assert "@page" in css
+
+
+@pytest.mark.parametrize("url", ["file:///etc/passwd", "http://example.com/x.png", "https://example.com/a.css", "x.svg"])
+def test_only_data_uris_may_be_fetched(url):
+    with pytest.raises(ValueError):
+        _restricted_url_fetcher(url)
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+from app.models.history import ReportHistory
+from app.services import summary
+from app.services.pdf_ingest import CHECKPOINT_NAME, ingest_pdf_directory, load_checkpoint
+
+
+@pytest.fixture
+def built(monkeypatch):
+    """Stand-in for the upload pipeline; "bad" files fail to parse."""
+    calls = []
+
+    def build_report(path, user_id=None, charts=True):
+        calls.append(os.path.basename(path))
+        if "bad" in path:
+            raise ValueError("not a PDF")
+        return {"doctor_summary": "d", "patient_summary": "p", "metrics": {"Glucose": 90.0}, "ranges": {}}
+
+    monkeypatch.setattr(summary, "build_report", build_report)
+    return calls
+
+
+def _write(root, rel, data, mtime=None):
+    path = os.path.join(root, rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_ingest_dedupes_and_backdates(tmp_path, user, add_report, db, built):
+    root = str(tmp_path)
+    uploaded = b"%PDF uploaded earlier"
+    add_report(user.id, {"Glucose": 88}, content_hash=hashlib.sha256(uploaded).hexdigest())
+    mtime = datetime(2022, 6, 1, 12, 0).timestamp()
+    _write(root, "a/one.pdf", b"%PDF one", mtime=mtime)
+    _write(root, "a/two.pdf", b"%PDF one")
+    _write(root, "b/uploaded.pdf", uploaded)
+    _write(root, "b/bad.pdf", b"garbage")
+    _write(root, "notes.txt", b"not a pdf")
+
+    progress = ingest_pdf_directory(root, lambda rel: user.id, workers=1, batch_size=1)
+    assert (progress.stored, progress.duplicates, progress.failed) == (1, 2, 1)
+    assert sorted(built) == ["bad.pdf", "one.pdf"]
+
+    row = db.query(ReportHistory).filter(ReportHistory.user_id == user.id, ReportHistory.filename == "one.pdf").one()
+    assert row.uploaded_at == datetime.utcfromtimestamp(mtime)
+    assert row.content_hash == hashlib.sha256(b"%PDF one").hexdigest()
+
+    statuses = {e["path"]: e["status"] for e in load_checkpoint(os.path.join(root, CHECKPOINT_NAME)).values()}
+    assert statuses == {
+        os.path.join("a", "one.pdf"): "stored",
+        os.path.join("a", "two.pdf"): "duplicate",
+        os.path.join("b", "bad.pdf"): "failed",
+        os.path.join("b", "uploaded.pdf"): "duplicate",
+    }
+
+
+def test_rerun_resumes_from_checkpoint(tmp_path, user, built):
+    root = str(tmp_path)
+    _write(root, "x.pdf", b"%PDF x")
+    _write(root, "bad.pdf", b"garbage")
+    ingest_pdf_directory(root, lambda rel: user.id, workers=1)
+    built.clear()
+
+    _write(root, "y.pdf", b"%PDF y")
+    progress = ingest_pdf_directory(root, lambda rel: user.id, workers=1)
+    assert built == ["y.pdf"]
+    assert (progress.done, progress.stored) == (1, 1)
+
+    built.clear()
+    ingest_pdf_directory(root, lambda rel: user.id, workers=1, retry_failed=True)
+    assert built == ["bad.pdf"]
+
+
+def test_files_without_a_user_are_retried_later(tmp_path, user, built):
+    root = str(tmp_path)
+    _write(root, "orphan.pdf", b"%PDF orphan")
+    assert ingest_pdf_directory(root, lambda rel: None, workers=1).total == 0
+    assert ingest_pdf_directory(root, lambda rel: user.id, workers=1).stored == 1
+
+
+def test_torn_checkpoint_line_is_ignored(tmp_path):
+    path = str(tmp_path / CHECKPOINT_NAME)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"key": "a.pdf|1|2", "status": "stored"}) + "\n")
+        f.write('{"key": "b.pdf|1|2", "sta')
+    assert list(load_checkpoint(path)) == ["a.pdf|1|2"]
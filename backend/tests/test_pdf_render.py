@@ -0,0 +1,38 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.extractor import extract_pdf_text
+from app.services.pdf_generator import generate_summary_pdf, render_summary_pdf
+
+
+def _render(doctor_summary: str) -> bytes:
+    return render_summary_pdf(
+        doctor_summary=doctor_summary,
+        patient_summary="patient text",
+        metadata={"Glucose": 95, "Hemoglobin": 13.5},
+        user_id=1,
+    )
+
+
+def test_render_returns_pdf_bytes_without_touching_disk(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data = _render("doctor text")
+    assert data.startswith(b"%PDF")
+    assert os.listdir(tmp_path) == []
+
+
+def test_concurrent_renders_do_not_mix_up_reports():
+    names = [f"Summary for patient {i}" for i in range(6)]
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        pdfs = list(pool.map(_render, names))
+    for name, data in zip(names, pdfs):
+        text = extract_pdf_text(data)
+        assert name in text
+        assert all(other not in text for other in names if other != name)
+
+
+def test_legacy_entry_point_writes_to_the_given_path(tmp_path):
+    out = tmp_path / "report.pdf"
+    path = generate_summary_pdf("doc", "pat", {"Glucose": 95}, user_id=1, out_path=str(out))
+    assert path == str(out)
+    assert out.read_bytes().startswith(b"%PDF")
@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+
+from app.services import prerender
+from app.services.pdf_cache import pdf_cache
+from app.services.report_pdf import prepare_report_pdf
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(prerender, "PRERENDER_ENABLED", True)
+    yield prerender
+    prerender.shutdown_prerender()
+
+
+def test_prerender_warms_the_pdf_cache(enabled, user, add_report, db):
+    report_id = add_report(user.id, {"Glucose": 95, "Hemoglobin": 13.2})
+    job = prepare_report_pdf(db, user_id=user.id, report_id=report_id)
+    assert pdf_cache.get(job.cache_key) is None
+
+    assert prerender.schedule_prerender(user.id, report_id)
+    fut, _ = prerender._pending[user.id]
+    fut.result(timeout=30)
+    assert pdf_cache.get(job.cache_key) is not None
+
+
+def test_newer_upload_supersedes_pending_render(enabled, monkeypatch):
+    release = threading.Event()
+    ran = []
+
+    def _run(user_id, report_id, cancelled):
+        release.wait(5)
+        if not cancelled.is_set():
+            ran.append(report_id)
+
+    monkeypatch.setattr(prerender, "_run", _run)
+    assert prerender.schedule_prerender(1, 10)
+    first, first_flag = prerender._pending[1]
+    assert prerender.schedule_prerender(1, 11)
+    second, _ = prerender._pending[1]
+    assert first_flag.is_set()
+
+    release.set()
+    second.result(timeout=5)
+    if not first.cancelled():
+        first.result(timeout=5)
+    assert ran == [11]
+
+
+def test_skipped_under_load_and_when_disabled(enabled, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(prerender, "_run", lambda *_: release.wait(5))
+    monkeypatch.setattr(prerender, "PRERENDER_MAX_PENDING", 2)
+    try:
+        assert prerender.schedule_prerender(1, 1)
+        assert prerender.schedule_prerender(2, 2)
+        assert not prerender.schedule_prerender(3, 3)
+    finally:
+        release.set()
+
+    monkeypatch.setattr(prerender, "PRERENDER_ENABLED", False)
+    assert not prerender.schedule_prerender(4, 4)
+
+
+def test_cancel_prerender(enabled, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(prerender, "_run", lambda *_: release.wait(5))
+    prerender.schedule_prerender(5, 50)
+    assert prerender.cancel_prerender(5)
+    assert not prerender.cancel_prerender(5)
+    release.set()
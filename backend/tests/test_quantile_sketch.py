@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from app.utils.quantile_sketch import QuantileSketch
+
+_RNG = np.random.default_rng(7)
+
+
+@pytest.mark.parametrize("values", [_RNG.lognormal(4, 1, 20000), _RNG.normal(0, 50, 20000)])
+def test_quantiles_within_relative_error(values):
+    sk = QuantileSketch(alpha=0.01)
+    sk.add_many(values)
+    ordered = np.sort(values)
+    for q in (0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99):
+        exact = ordered[int(q * (len(ordered) - 1))]
+        assert abs(sk.quantile(q) - exact) <= 0.01 * abs(exact) + 1e-9
+
+
+def test_extremes_and_empty_sketch():
+    sk = QuantileSketch()
+    assert sk.quantile(0.5) is None and sk.rank(1.0) is None
+    sk.add_many([3.0, 0.0, -2.0, 10.0])
+    assert (sk.quantile(0), sk.quantile(1)) == (-2.0, 10.0)
+    assert (sk.rank(-5), sk.rank(10.0)) == (0.0, 1.0)
+
+
+def test_rank_is_close_to_the_empirical_cdf():
+    values = _RNG.uniform(50, 150, 10000)
+    sk = QuantileSketch()
+    sk.add_many(values)
+    for v in (60.0, 100.0, 140.0):
+        assert sk.rank(v) == pytest.approx((values <= v).mean(), abs=0.01)
+
+
+def test_merge_equals_single_pass():
+    values = _RNG.lognormal(3, 0.5, 5000)
+    whole = QuantileSketch()
+    whole.add_many(values)
+    merged = QuantileSketch()
+    for chunk in np.array_split(values, 7):
+        part = QuantileSketch()
+        part.add_many(chunk)
+        merged.merge(part)
+    assert merged.to_dict() == whole.to_dict()
+
+
+def test_merge_rejects_different_alpha():
+    with pytest.raises(ValueError):
+        QuantileSketch(0.01).merge(QuantileSketch(0.02))
+
+
+def test_dict_round_trip():
+    sk = QuantileSketch()
+    sk.add_many([-1.5, 0.0, 2.0, 2.0, 300.0, float("nan")])
+    back = QuantileSketch.from_dict(sk.to_dict())
+    assert back.to_dict() == sk.to_dict()
+    assert back.count == 5
+    assert back.quantile(0.5) == sk.quantile(0.5)
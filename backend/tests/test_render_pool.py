@@ -0,0 +1,66 @@
+import time
+
+import pytest
+
+import _render_jobs
+from app.services import render_pool
+from app.services.render_pool import RenderPoolUnavailable, RenderTimeout, render_html_pdf
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """render_pool with one worker running the stand-in jobs, reset afterwards."""
+    monkeypatch.setattr(render_pool, "_init_worker", _render_jobs.init_worker)
+    monkeypatch.setattr(render_pool, "_render_job", _render_jobs.render_job)
+    monkeypatch.setattr(render_pool, "RENDER_WORKERS", 1)
+    monkeypatch.setattr(render_pool, "RENDER_RETRY_BASE_SECONDS", 30.0)
+    monkeypatch.setattr(render_pool, "_failures", 0)
+    monkeypatch.setattr(render_pool, "_retry_at", 0.0)
+    yield render_pool
+    render_pool.shutdown_render_pool()
+
+
+def test_jobs_run_in_a_worker(pool):
+    assert render_html_pdf("<p>a</p>") == b"<p>a</p>"
+    assert render_html_pdf("<p>b</p>") == b"<p>b</p>"
+
+
+def test_stuck_render_kills_its_worker_and_pool_recovers(pool):
+    assert render_html_pdf("warm") == b"warm"
+    stuck = pool._pool
+    worker = next(iter(stuck._processes.values()))
+
+    with pytest.raises(RenderTimeout):
+        render_html_pdf("hang", timeout=0.5)
+    worker.join(timeout=5)
+    assert not worker.is_alive()
+    assert pool._pool is None
+
+    # a timeout is not a broken pool: no backoff, the next job gets a fresh pool
+    assert pool._failures == 0
+    assert render_html_pdf("after") == b"after"
+    assert pool._pool is not stuck
+
+
+def test_broken_pool_backs_off_then_rebuilds(pool):
+    with pytest.raises(RenderPoolUnavailable):
+        render_html_pdf("crash")
+    assert pool._failures == 1
+    assert pool._retry_at > time.monotonic() + 20
+    assert not pool.render_pool_available()
+    with pytest.raises(RenderPoolUnavailable):
+        render_html_pdf("<p>during backoff</p>")
+
+    pool._retry_at = 0.0
+    assert render_html_pdf("<p>rebuilt</p>") == b"<p>rebuilt</p>"
+    assert pool._failures == 0
+
+
+def test_backoff_doubles_and_is_capped(pool, monkeypatch):
+    monkeypatch.setattr(render_pool, "RENDER_RETRY_MAX_SECONDS", 100.0)
+    delays = []
+    for _ in range(4):
+        before = time.monotonic()
+        pool._mark_broken(None, RuntimeError("boom"))
+        delays.append(round(pool._retry_at - before))
+    assert delays == [30, 60, 100, 100]
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from app.core.database import engine
+from app.models.history import ReportHistory
+from app.services.extractor import extract_pdf_text
+from app.services.report_archive import compact_report_history
+from app.utils import archive_codec
+from app.utils.archive_codec import compress_fields, decompress_fields
+
+_FIELDS = {"doctor_summary": "Ärztlicher Befund " * 50, "patient_summary": None, "report_metadata": '{"Glucose":95}'}
+
+
+@pytest.mark.parametrize("codec", ["zlib", "zstd"])
+def test_codec_round_trip(codec, monkeypatch):
+    if codec == "zstd" and not archive_codec._HAS_ZSTD:
+        pytest.skip("zstandard not installed")
+    monkeypatch.setattr(archive_codec, "ARCHIVE_CODEC", codec)
+    payload = compress_fields(_FIELDS)
+    assert payload[:1] == (b"s" if codec == "zstd" else b"z")
+    assert len(payload) < len(_FIELDS["doctor_summary"].encode("utf-8"))
+    assert decompress_fields(payload) == _FIELDS
+
+
+def test_unknown_codec_prefix_and_empty_payload():
+    assert decompress_fields(b"") == {}
+    with pytest.raises(ValueError):
+        decompress_fields(b"x123")
+
+
+def test_old_rows_are_archived_and_read_transparently(user, add_report, db):
+    old = add_report(
+        user.id, {"Glucose": 95}, uploaded_at=datetime.utcnow() - timedelta(days=400),
+        doctor_summary="old doctor " * 40, patient_summary="old patient",
+    )
+    recent = add_report(user.id, {"Glucose": 96}, doctor_summary="recent")
+
+    result = compact_report_history(older_than_days=180, batch_size=1)
+    assert result.rows >= 1
+    assert result.stored_bytes < result.raw_bytes
+
+    with engine.connect() as conn:
+        raw = conn.execute(
+            text("SELECT doctor_summary, patient_summary, report_metadata, archived_at FROM report_history WHERE id = :id"),
+            {"id": old},
+        ).one()
+    assert raw[:3] == (None, None, None) and raw[3] is not None
+
+    row = db.get(ReportHistory, old)
+    assert row.doctor_summary == "old doctor " * 40
+    assert row.patient_summary == "old patient"
+    assert row.report_metadata == {"Glucose": 95}
+    assert db.get(ReportHistory, recent).archived_at is None
+
+    # already archived rows are not picked up again
+    assert compact_report_history(older_than_days=180).rows == 0
+
+
+def test_downloads_still_work_for_archived_reports(client, user, add_report):
+    add_report(user.id, {"Glucose": 95}, uploaded_at=datetime.utcnow() - timedelta(days=400), doctor_summary="archived text")
+    compact_report_history(older_than_days=180)
+    r = client.get("/api/download-report", headers=user.headers)
+    assert r.status_code == 200
+    assert "archived text" in extract_pdf_text(r.content)
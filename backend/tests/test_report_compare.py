@@ -0,0 +1,56 @@
+from datetime import datetime
+
+from app.services import report_compare
+from app.services.report_compare import compute_metric_deltas, load_comparison
+
+
+def test_deltas_skip_missing_values():
+    rows = compute_metric_deltas(
+        [
+            {"metrics": {"Glucose": 90.0, "WBC": 6.0}, "ranges": {"Glucose": {"min": 70, "max": 99}}},
+            {"metrics": {"Glucose": 110.0}, "ranges": {}},
+            {"metrics": {"Glucose": 100.0, "Hemoglobin": 14.0}, "ranges": {"Glucose": {"min": 70, "max": 100}}},
+        ]
+    )
+    by_metric = {r["metric"]: r for r in rows}
+    assert [r["metric"] for r in rows] == ["Glucose", "WBC", "Hemoglobin"]
+    assert by_metric["Glucose"]["values"] == [90.0, 110.0, 100.0]
+    assert by_metric["Glucose"]["delta_prev"] == -10.0
+    assert by_metric["Glucose"]["delta_total"] == 10.0
+    assert by_metric["Glucose"]["range"] == {"min": 70, "max": 100}  # newest report's band
+    assert by_metric["WBC"]["values"] == [6.0, None, None]
+    assert by_metric["WBC"]["delta_prev"] is None
+
+
+def test_comparison_is_ordered_by_report_date(user, add_report, db):
+    newest = add_report(user.id, {"Glucose": 100}, uploaded_at=datetime(2024, 5, 1))
+    oldest = add_report(user.id, {"Glucose": 80}, uploaded_at=datetime(2015, 5, 1))
+    middle = add_report(user.id, {"Glucose": 90}, uploaded_at=datetime(2020, 5, 1))
+
+    assert [r["id"] for r in load_comparison(db, user.id, last=3)] == [oldest, middle, newest]
+    assert [r["id"] for r in load_comparison(db, user.id, last=2)] == [middle, newest]
+    assert [r["id"] for r in load_comparison(db, user.id, report_ids=[newest, oldest])] == [oldest, newest]
+
+
+def test_compare_endpoint_answers_304_without_rendering(client, user, add_report, monkeypatch):
+    add_report(user.id, {"Glucose": 80}, uploaded_at=datetime(2023, 1, 1))
+    add_report(user.id, {"Glucose": 120}, uploaded_at=datetime(2023, 6, 1))
+
+    r = client.get("/api/compare-reports", headers=user.headers)
+    assert r.status_code == 200
+    assert r.content.startswith(b"%PDF")
+    etag = r.headers["etag"]
+
+    def _no_render(*_args, **_kwargs):
+        raise AssertionError("rendered for a conditional request")
+
+    monkeypatch.setattr(report_compare, "render_comparison_doc", _no_render)
+    monkeypatch.setattr(report_compare.pdf_cache, "get", lambda key: None)
+    again = client.get("/api/compare-reports", headers={**user.headers, "If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+
+
+def test_compare_needs_two_reports(client, user, add_report):
+    add_report(user.id, {"Glucose": 80})
+    assert client.get("/api/compare-reports", headers=user.headers).status_code == 404
@@ -0,0 +1,75 @@
+import csv
+import io
+import zipfile
+from itertools import islice
+from datetime import datetime
+
+from app.services.report_export import iter_report_archive
+from app.core import database
+from app.services import report_pdf
+from app.services.report_pdf import iter_user_report_pdfs
+
+
+def test_export_zip_holds_every_pdf_and_a_metrics_csv(client, user, add_report):
+    first = add_report(user.id, {"Glucose": 95}, uploaded_at=datetime(2024, 1, 5))
+    second = add_report(user.id, {"Glucose": 130, "Hemoglobin": 13.5}, uploaded_at=datetime(2024, 2, 5))
+
+    r = client.get("/api/export/reports", headers=user.headers)
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/zip"
+
+    with zipfile.ZipFile(io.BytesIO(r.content)) as zf:
+        assert zf.testzip() is None
+        names = zf.namelist()
+        assert names == [
+            f"reports/report_{first}_2024-01-05.pdf",
+            f"reports/report_{second}_2024-02-05.pdf",
+            "metrics.csv",
+        ]
+        assert zf.getinfo(names[0]).compress_type == zipfile.ZIP_STORED
+        assert all(zf.read(n).startswith(b"%PDF") for n in names[:2])
+        rows = list(csv.DictReader(io.StringIO(zf.read("metrics.csv").decode("utf-8"))))
+
+    assert [(int(r["report_id"]), r["metric"], r["value"]) for r in rows] == [
+        (first, "Glucose", "95"),
+        (second, "Glucose", "130"),
+        (second, "Hemoglobin", "13.5"),
+    ]
+    assert rows[1]["status"] == "high"
+
+
+def test_archive_is_streamed_in_chunks(user, add_report):
+    for day in range(1, 4):
+        add_report(user.id, {"Glucose": 90 + day}, uploaded_at=datetime(2024, 3, day))
+    chunks = [c for c in iter_report_archive(iter_user_report_pdfs(user.id)) if c]
+    assert len(chunks) >= 4  # one per PDF, then the CSV
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as zf:
+        assert len(zf.namelist()) == 4
+
+
+def test_jobs_are_read_lazily_in_pages(user, add_report, db, monkeypatch):
+    ids = [add_report(user.id, {"Glucose": 80 + day}, uploaded_at=datetime(2024, 4, day)) for day in range(1, 6)]
+    pages = []
+    real = database.SessionLocal
+
+    def _session():
+        pages.append(1)
+        return real()
+
+    monkeypatch.setattr(database, "SessionLocal", _session)
+    jobs = iter_user_report_pdfs(user.id, page_size=2)
+    assert pages == []
+    assert [j.report_id for j in islice(jobs, 3)] == ids[:3]
+    assert len(pages) == 2
+    rest = list(jobs)
+    assert [j.report_id for j in rest] == ids[3:]
+    assert len(pages) == 3
+
+    # rolling sparklines carry across page boundaries
+    monkeypatch.setattr(database, "SessionLocal", real)
+    expected = report_pdf.prepare_report_pdf(db, user.id, report_id=ids[4])
+    assert rest[-1].trend_series == expected.trend_series == {"Glucose": [81.0, 82.0, 83.0, 84.0, 85.0]}
+
+
+def test_export_without_reports_is_404(client, user):
+    assert client.get("/api/export/reports", headers=user.headers).status_code == 404
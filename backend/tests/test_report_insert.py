@@ -0,0 +1,63 @@
+from datetime import datetime
+
+from sqlalchemy import create_engine, text
+
+from app.core import database
+from app.core.database import Base, _report_insert_plan, store_reports_in_db
+from app.models.history import ReportHistory
+
+
+def test_insert_plan_is_built_once(monkeypatch, user, add_report):
+    plan = _report_insert_plan()
+    assert _report_insert_plan() is plan
+    assert {"user_id", "uploaded_at", "doctor_summary", "report_metadata", "content_hash"} <= set(plan.columns)
+
+    def _no_reflection():
+        raise AssertionError("schema reflected on insert")
+
+    monkeypatch.setattr(database, "_build_report_insert_plan", _no_reflection)
+    assert add_report(user.id, {"Glucose": 90}) > 0
+
+
+def test_batch_insert_returns_ids_in_input_order(user, db):
+    reports = [
+        {"user_id": user.id, "doctor_summary": f"d{i}", "patient_summary": "p", "metadata": {"Glucose": 90 + i},
+         "uploaded_at": datetime(2024, 1, 1 + i), "content_hash": f"h{i}"}
+        for i in range(5)
+    ]
+    ids = store_reports_in_db(reports)
+    assert len(set(ids)) == 5
+    rows = {r.id: r for r in db.query(ReportHistory).filter(ReportHistory.id.in_(ids))}
+    assert [rows[i].doctor_summary for i in ids] == [f"d{i}" for i in range(5)]
+    assert [rows[i].report_metadata for i in ids] == [{"Glucose": 90 + i} for i in range(5)]
+    assert rows[ids[3]].content_hash == "h3"
+
+
+def test_missing_summaries_are_stored_as_null(user, db):
+    (report_id,) = store_reports_in_db([{"user_id": user.id, "metadata": {"Glucose": 90}}])
+    row = db.get(ReportHistory, report_id)
+    assert (row.doctor_summary, row.patient_summary) == (None, None)
+
+
+def test_legacy_schema_gets_every_column_variant(tmp_path, monkeypatch):
+    legacy = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    Base.metadata.create_all(legacy, tables=[t for n, t in Base.metadata.tables.items() if n != "report_history"])
+    with legacy.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE report_history (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, "
+            "summary_doctor TEXT NOT NULL, summary_patient TEXT NOT NULL, metadata_json TEXT, uploaded_at DATETIME)"
+        ))
+    monkeypatch.setattr(database, "engine", legacy)
+    monkeypatch.setattr(database, "IS_SQLITE", False)  # plain engine.begin(), no shared write lock
+    monkeypatch.setattr(database, "_insert_plan", None)
+
+    (report_id,) = store_reports_in_db([
+        {"user_id": 1, "doctor_summary": "doc", "patient_summary": "pat", "metadata": {"Glucose": 95}}
+    ])
+    with legacy.connect() as conn:
+        row = conn.execute(text("SELECT * FROM report_history WHERE id = :id"), {"id": report_id}).mappings().one()
+        metrics = conn.execute(text("SELECT metric, value FROM report_metric WHERE report_id = :id"), {"id": report_id}).all()
+    assert (row["summary_doctor"], row["summary_patient"]) == ("doc", "pat")
+    assert row["metadata_json"] == '{"Glucose":95}'
+    assert metrics == [("Glucose", 95.0)]
+    assert database._insert_plan.columns == ["user_id", "uploaded_at", "summary_doctor", "summary_patient", "metadata_json"]
@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from sqlalchemy import text
+
+from app.core.database import begin_write
+from app.services import report_pdf
+from app.services.pdf_cache import _DiskTier, _PdfCache, etag_for, pdf_cache, pdf_cache_key
+from app.services.pdf_generator import RENDERER_HTML, RENDERER_REPORTLAB
+
+
+# -----------------------------
+# Cache
+# -----------------------------
+def test_newer_content_supersedes_the_same_report_slot():
+    cache = _PdfCache(max_bytes=1024)
+    old, new = pdf_cache_key(1, "64-8", "aaa"), pdf_cache_key(1, "64-8", "bbb")
+    other = pdf_cache_key(1, "64-4", "aaa")
+    cache.put(old, b"old")
+    cache.put(other, b"other")
+    entry = cache.put(new, b"new")
+
+    assert cache.get(old) is None
+    assert cache.get(new).data == b"new"
+    assert cache.get(other).data == b"other"
+    assert entry.etag == etag_for(new)
+    assert entry.last_modified.microsecond == 0
+    assert cache.total == len(b"new") + len(b"other")
+
+
+def test_lru_is_bounded_by_bytes():
+    cache = _PdfCache(max_bytes=10)
+    a, b, c = (pdf_cache_key(i, "w", "h") for i in (1, 2, 3))
+    cache.put(a, b"aaaa")
+    cache.put(b, b"bbbb")
+    cache.get(a)              # a is now the most recently used
+    cache.put(c, b"cccc")
+    assert cache.get(b) is None
+    assert cache.get(a) is not None and cache.get(c) is not None
+    assert cache.total <= 10
+
+
+def test_invalidate_report_drops_every_window():
+    cache = _PdfCache(max_bytes=1024)
+    cache.put(pdf_cache_key(7, "64-8", "h"), b"x")
+    cache.put(pdf_cache_key(7, "64-4", "h"), b"y")
+    cache.put(pdf_cache_key(70, "64-8", "h"), b"z")
+    cache.invalidate_report(7)
+    assert cache.get(pdf_cache_key(7, "64-8", "h")) is None
+    assert cache.get(pdf_cache_key(7, "64-4", "h")) is None
+    assert cache.get(pdf_cache_key(70, "64-8", "h")) is not None
+
+
+def test_disk_tier_survives_a_new_process_and_is_pruned(tmp_path):
+    key = pdf_cache_key(1, "w", "h")
+    _PdfCache(1024, disk=_DiskTier(str(tmp_path), 1024)).put(key, b"%PDF-1")
+    fresh = _PdfCache(1024, disk=_DiskTier(str(tmp_path), 1024))
+    assert fresh.get(key).data == b"%PDF-1"
+
+    small = _DiskTier(str(tmp_path), 8)
+    small.put(pdf_cache_key(2, "w", "h"), b"12345678")
+    assert small.get(pdf_cache_key(2, "w", "h")) is not None
+    assert small.get(key) is None
+
+
+# -----------------------------
+# /download-report
+# -----------------------------
+def test_download_sets_etag_and_honours_if_none_match(client, user, add_report):
+    add_report(user.id, {"Glucose": 95})
+    r = client.get("/api/download-report", headers=user.headers)
+    assert r.status_code == 200
+    assert r.content.startswith(b"%PDF")
+    etag = r.headers["etag"]
+
+    again = client.get("/api/download-report", headers={**user.headers, "If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+
+
+def test_last_modified_is_the_render_time_not_the_report_date(client, user, add_report):
+    add_report(user.id, {"Glucose": 95}, uploaded_at=datetime(2015, 3, 1))
+    r = client.get("/api/download-report", headers=user.headers)
+    last_modified = parsedate_to_datetime(r.headers["last-modified"]).replace(tzinfo=None)
+    assert last_modified > datetime.utcnow() - timedelta(minutes=5)
+
+    later = format_datetime((last_modified + timedelta(seconds=1)).replace(tzinfo=timezone.utc), usegmt=True)
+    assert client.get("/api/download-report", headers={**user.headers, "If-Modified-Since": later}).status_code == 304
+    earlier = format_datetime(datetime(2020, 1, 1, tzinfo=timezone.utc), usegmt=True)
+    assert client.get("/api/download-report", headers={**user.headers, "If-Modified-Since": earlier}).status_code == 200
+
+
+def test_changed_summary_changes_etag(client, user, add_report):
+    report_id = add_report(user.id, {"Glucose": 95})
+    first = client.get("/api/download-report", headers=user.headers).headers["etag"]
+    with begin_write() as conn:
+        conn.execute(text("UPDATE report_history SET doctor_summary = 'revised' WHERE id = :id"), {"id": report_id})
+
+    r = client.get("/api/download-report", headers={**user.headers, "If-None-Match": first})
+    assert r.status_code == 200
+    assert r.headers["etag"] != first
+
+
+def test_download_requires_an_existing_report(client, user):
+    assert client.get("/api/download-report", headers=user.headers).status_code == 404
+    assert client.get("/api/download-report").status_code == 401
+
+
+def test_fallback_render_is_not_cached_under_the_html_key(client, user, add_report, db, monkeypatch):
+    rid = add_report(user.id, {"Glucose": 91})
+    # the WeasyPrint pool looks available when the job is built, but the render falls back
+    monkeypatch.setattr(report_pdf, "pdf_renderer", lambda: RENDERER_HTML)
+    job = report_pdf.prepare_report_pdf(db, user.id, report_id=rid)
+    pdf = report_pdf.render_report_pdf(job)
+    assert pdf.data.startswith(b"%PDF")
+    assert pdf.etag != job.etag
+    assert pdf_cache.get(job.cache_key) is None
+
+    r = client.get("/api/download-report", params={"report_id": rid}, headers=user.headers)
+    assert r.status_code == 200 and r.headers["ETag"] == pdf.etag
+    # a client holding the fallback is not told it is current while HTML renders are expected
+    assert client.get(
+        "/api/download-report", params={"report_id": rid}, headers={**user.headers, "If-None-Match": pdf.etag}
+    ).status_code == 200
+
+    # ReportLab is the expected renderer: cached under its own key
+    monkeypatch.setattr(report_pdf, "pdf_renderer", lambda: RENDERER_REPORTLAB)
+    job = report_pdf.prepare_report_pdf(db, user.id, report_id=rid)
+    assert job.etag == pdf.etag
+    report_pdf.render_report_pdf(job)
+    assert pdf_cache.get(job.cache_key) is not None
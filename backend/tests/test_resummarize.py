@@ -0,0 +1,80 @@
+import time
+
+from app.models.history import ReportHistory
+from app.services import summary
+from app.services.resummarize import (
+    MAX_CONSECUTIVE_FAILURES,
+    _Pacer,
+    count_stale_summaries,
+    resummarize_reports,
+)
+from app.services.summary import OLLAMA_MODEL, PROMPT_VERSION
+
+
+def test_pacer_backs_off_while_slow_and_recovers():
+    pacer = _Pacer(per_minute=60, slow_seconds=5, max_interval=8)
+    assert pacer.base == pacer.interval == 1.0
+    for expected in (2.0, 4.0, 8.0, 8.0):
+        pacer.done(time.monotonic() - 10)
+        assert pacer.interval == expected
+    pacer.done(time.monotonic())
+    assert pacer.interval == 6.0
+    for _ in range(10):
+        pacer.done(time.monotonic())
+    assert pacer.interval == 1.0
+
+
+def test_unpaced_slow_calls_still_back_off():
+    pacer = _Pacer(per_minute=0, slow_seconds=5)
+    pacer.done(time.monotonic() - 10)
+    assert pacer.interval == 1.0
+    started = time.monotonic()
+    pacer.done(started)
+    assert pacer.interval == 0.75 and pacer.wait() >= started
+
+
+def test_stale_rows_are_resummarized_once(user, add_report, db, fake_llm):
+    current = add_report(user.id, {"Glucose": 90}, summary_model=OLLAMA_MODEL, summary_prompt_version=PROMPT_VERSION)
+    old = add_report(user.id, {"Glucose": 120, "Hemoglobin": 14}, doctor_summary="old", summary_model="llama2", summary_prompt_version=PROMPT_VERSION)
+    unknown = add_report(user.id, {"Glucose": 95}, doctor_summary="old")
+    empty = add_report(user.id, {}, doctor_summary="old")
+    assert count_stale_summaries(user_id=user.id) == 3
+    assert count_stale_summaries(only_model="llama2", user_id=user.id) == 1
+    assert count_stale_summaries(only_model="", user_id=user.id) == 2
+
+    seen = []
+    progress = resummarize_reports(per_minute=0, batch_size=2, user_id=user.id, on_progress=seen.append)
+    assert (progress.done, progress.total, progress.updated, progress.skipped, progress.failed) == (3, 3, 2, 1, 0)
+    assert [p.done for p in seen] == [1, 2]
+    assert len(fake_llm) == 4  # doctor + patient per report with metrics
+    assert count_stale_summaries(user_id=user.id) == 0
+
+    rows = {r.id: r for r in db.query(ReportHistory).filter(ReportHistory.user_id == user.id)}
+    for rid in (old, unknown):
+        assert rows[rid].doctor_summary == "doctor summary"
+        assert (rows[rid].summary_model, rows[rid].summary_prompt_version) == (OLLAMA_MODEL, PROMPT_VERSION)
+    # nothing to summarize: summaries and provenance kept, marked so it is not selected again
+    assert rows[empty].doctor_summary == "old"
+    assert (rows[empty].summary_model, rows[empty].summary_prompt_version) == (None, None)
+    assert rows[empty].summary_skipped_at is not None
+    assert rows[unknown].summary_skipped_at is None
+    assert rows[current].doctor_summary == "doctor summary"
+
+    assert resummarize_reports(per_minute=0, user_id=user.id).total == 0
+
+
+def test_limit_bounds_the_run(user, add_report, fake_llm):
+    for v in (90, 91, 92):
+        add_report(user.id, {"Glucose": v})
+    progress = resummarize_reports(per_minute=0, limit=2, user_id=user.id)
+    assert (progress.total, progress.updated) == (2, 2)
+    assert count_stale_summaries(user_id=user.id) == 1
+
+
+def test_stops_after_consecutive_failures(user, add_report, monkeypatch):
+    monkeypatch.setattr(summary, "_summarize_with_llm", lambda text, audience: "(LLM error) connection refused")
+    for v in range(MAX_CONSECUTIVE_FAILURES + 2):
+        add_report(user.id, {"Glucose": 90 + v}, doctor_summary="old")
+    progress = resummarize_reports(per_minute=0, batch_size=3, user_id=user.id)
+    assert (progress.done, progress.updated, progress.failed) == (MAX_CONSECUTIVE_FAILURES, 0, MAX_CONSECUTIVE_FAILURES)
+    assert count_stale_summaries(user_id=user.id) == MAX_CONSECUTIVE_FAILURES + 2
@@ -0,0 +1,74 @@
+import threading
+import time
+import uuid
+
+from sqlalchemy import event
+
+from app.core.database import (
+    IS_SQLITE,
+    SQLITE_BUSY_TIMEOUT_MS,
+    WriteSessionLocal,
+    begin_write,
+    engine,
+    store_reports_in_db,
+)
+from app.models.user import User
+
+
+def test_tests_run_on_sqlite():
+    assert IS_SQLITE and engine.dialect.name == "sqlite"
+
+
+def test_connection_pragmas():
+    with engine.connect() as conn:
+        pragma = lambda name: conn.exec_driver_sql(f"PRAGMA {name}").scalar()  # noqa: E731
+        assert pragma("journal_mode") == "wal"
+        assert pragma("busy_timeout") == SQLITE_BUSY_TIMEOUT_MS
+        assert pragma("foreign_keys") == 1
+        assert pragma("synchronous") == 1  # NORMAL
+
+
+def test_write_transactions_start_immediate():
+    statements = []
+
+    def _record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _record)
+    try:
+        with begin_write() as conn:
+            conn.exec_driver_sql("SELECT 1")
+        with WriteSessionLocal() as session:
+            session.query(User).first()
+            session.rollback()
+    finally:
+        event.remove(engine, "before_cursor_execute", _record)
+    assert statements.count("BEGIN IMMEDIATE") == 2
+
+
+def test_write_session_survives_a_concurrent_writer(user):
+    """Read, let another connection commit, then write: no 'database is locked'."""
+    session = WriteSessionLocal()
+    other = threading.Thread(
+        target=store_reports_in_db,
+        args=([{"user_id": user.id, "doctor_summary": "d", "patient_summary": "p", "metadata": {"Glucose": 90}}]),
+    )
+    try:
+        session.query(User).count()
+        other.start()
+        time.sleep(0.2)
+        name = f"w_{uuid.uuid4().hex[:8]}"
+        session.add(User(username=name, email=f"{name}@example.com", hashed_password="x"))
+        session.commit()
+    finally:
+        session.close()
+        other.join(timeout=10)
+    assert not other.is_alive()
+
+
+def test_register_uses_the_write_session(client):
+    name = f"r_{uuid.uuid4().hex[:8]}"
+    body = {"username": name, "email": f"{name}@example.com", "password": "pw123456"}
+    assert client.post("/auth/register", json=body).status_code == 200
+    assert client.post("/auth/register", json=body).status_code == 400
+    assert client.post("/auth/login", json={"username": name, "password": "pw123456"}).status_code == 200
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services.trend_aggregates import _fold, get_trend_summary, rebuild_aggregates
+
+_FIELDS = ("metric", "count", "min", "max", "last_value", "last_status", "last_at")
+
+
+def _row(value, day, status="normal"):
+    return {"value": value, "measured_at": datetime(2024, 1, 1) + timedelta(days=day), "status": status, "unit": "mg/dL"}
+
+
+def test_fold_tracks_moments_and_slope():
+    agg = {}
+    for day, value in enumerate((90.0, 92.0, 94.0, 96.0)):
+        agg = _fold(agg, _row(value, day))
+    assert agg["count"] == 4
+    assert (agg["min_value"], agg["max_value"], agg["mean_value"]) == (90.0, 96.0, 93.0)
+    assert agg["slope_per_day"] == pytest.approx(2.0)
+    assert agg["last_value"] == 96.0
+
+
+def test_older_measurement_counts_but_does_not_replace_last():
+    agg = _fold(_fold({}, _row(100.0, 10, "high")), _row(80.0, 0))
+    assert agg["count"] == 2
+    assert agg["min_value"] == 80.0
+    assert (agg["last_value"], agg["last_status"]) == (100.0, "high")
+
+
+def test_incremental_aggregates_match_a_rebuild(user, add_report, db):
+    for day, g in ((5, 120), (1, 90), (3, 100), (2, 95)):
+        add_report(user.id, {"Glucose": g, "Hemoglobin": 13 + day / 10}, uploaded_at=datetime(2024, 1, day))
+    incremental = get_trend_summary(db, user.id)
+
+    assert rebuild_aggregates(user_id=user.id) == 2
+    db.expire_all()
+    rebuilt = get_trend_summary(db, user.id)
+
+    assert [{k: a[k] for k in _FIELDS} for a in incremental] == [{k: a[k] for k in _FIELDS} for a in rebuilt]
+    for a, b in zip(incremental, rebuilt):
+        assert a["mean"] == pytest.approx(b["mean"])
+        assert a["slope_per_day"] == pytest.approx(b["slope_per_day"])
+
+    glucose = next(a for a in rebuilt if a["metric"] == "Glucose")
+    assert (glucose["count"], glucose["last_value"], glucose["last_status"]) == (4, 120.0, "high")
+
+
+def test_summary_endpoint(client, user, add_report):
+    add_report(user.id, {"Glucose": 90})
+    add_report(user.id, {"Glucose": 100})
+    r = client.get("/api/history/summary", headers=user.headers)
+    assert r.status_code == 200
+    (glucose,) = r.json()
+    assert (glucose["metric"], glucose["count"], glucose["mean"]) == ("Glucose", 2, 95.0)
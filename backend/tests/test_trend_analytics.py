@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services.trend_analytics import MetricColumns, batch_trend_analytics, compute_analytics
+
+_T0 = datetime(2024, 1, 1)
+
+
+def _cols(series):
+    """series: {(user_id, metric): [(day, value, status), ...]} -> MetricColumns."""
+    rows = [
+        (uid, metric, "mg/dL", _T0 + timedelta(days=day), value, status)
+        for (uid, metric), points in sorted(series.items())
+        for day, value, status in points
+    ]
+    return MetricColumns(rows)
+
+
+def test_linear_series_slope_and_projection():
+    cols = _cols({(1, "Glucose"): [(d, 90.0 + 2 * d, "normal") for d in range(5)]})
+    g = compute_analytics(cols, horizon_days=10)[1]["Glucose"]
+    assert g["count"] == 5
+    assert g["mean"] == pytest.approx(94.0)
+    assert g["slope_per_day"] == pytest.approx(2.0)
+    assert g["projection"]["value"] == pytest.approx(98.0 + 20.0)
+    assert g["series"]["rate_per_day"] == [None, 2.0, 2.0, 2.0, 2.0]
+    assert g["anomalies"] == 0
+
+
+def test_rolling_average_restarts_per_series():
+    cols = _cols({
+        (1, "A"): [(0, 1.0, None), (1, 2.0, None), (2, 3.0, None)],
+        (1, "B"): [(0, 10.0, None), (1, 20.0, None)],
+    })
+    out = compute_analytics(cols, window=2)[1]
+    assert out["A"]["series"]["rolling_avg"] == [1.0, 1.5, 2.5]
+    assert out["B"]["series"]["rolling_avg"] == [10.0, 15.0]
+
+
+def test_anomalies_from_z_score_and_reference_range():
+    points = [(d, 100.0, "normal") for d in range(9)] + [(9, 200.0, "normal")]
+    points[3] = (3, 100.0, "high")
+    s = compute_analytics(_cols({(1, "Glucose"): points}), z_threshold=2.0)[1]["Glucose"]
+    assert s["series"]["anomaly"] == [False] * 3 + [True] + [False] * 5 + [True]
+    assert s["anomalies"] == 2
+
+
+def test_users_are_separate_series_and_single_points_have_no_fit():
+    cols = _cols({(1, "Glucose"): [(0, 90.0, None), (1, 91.0, None)], (2, "Glucose"): [(0, 50.0, None)]})
+    out = compute_analytics(cols, include_series=False)
+    assert set(out) == {1, 2}
+    assert out[2]["Glucose"]["slope_per_day"] is None
+    assert out[2]["Glucose"]["projection"]["value"] is None
+    assert "series" not in out[1]["Glucose"]
+
+
+def test_long_series_are_downsampled_but_stats_use_every_point():
+    points = [(d, float(d % 7), None) for d in range(200)]
+    g = compute_analytics(_cols({(1, "M"): points}), max_points=20)[1]["M"]
+    assert g["count"] == 200
+    assert len(g["series"]["value"]) == 20
+    assert g["series"]["t"][0].startswith("2024-01-01")
+
+
+def test_endpoint_and_batch_agree(client, user, add_report, db):
+    for d in range(4):
+        add_report(user.id, {"Glucose": 90 + d}, uploaded_at=_T0 + timedelta(days=d))
+    r = client.get("/api/history/analytics", params={"metrics": ["Glucose"]}, headers=user.headers)
+    assert r.status_code == 200
+    api = r.json()["Glucose"]
+    assert api["slope_per_day"] == pytest.approx(1.0)
+
+    ((uid, batch),) = list(batch_trend_analytics(db, [user.id], metrics=["Glucose"]))
+    assert uid == user.id
+    assert batch["Glucose"]["mean"] == pytest.approx(api["mean"])
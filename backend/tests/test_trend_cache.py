@@ -0,0 +1,78 @@
+from datetime import datetime
+
+from sqlalchemy import text
+
+from app.core.database import begin_write
+from app.services.trend_cache import _stamp, _TrendCache, trend_cache
+
+
+def test_series_is_columnar_and_in_history_order(user, add_report, db):
+    late = add_report(user.id, {"Glucose": 100, "WBC": 7}, uploaded_at=datetime(2024, 3, 1))
+    early = add_report(user.id, {"Glucose": 90}, uploaded_at=datetime(2024, 1, 1))
+
+    series = trend_cache.get(db, user.id)
+    assert list(series.report_ids) == [early, late]
+    assert series.report_ids.typecode == "q"
+    assert series.metrics["Glucose"].typecode == "d"
+    assert series.nbytes == 4 * 2 * 8
+
+    rows = series.rows(series.select(), ["Glucose", "WBC", "RBC"])
+    assert rows == [
+        {"date": "2024-01-01", "Glucose": 90.0, "WBC": -1.0, "RBC": -1.0},
+        {"date": "2024-03-01", "Glucose": 100.0, "WBC": 7.0, "RBC": -1.0},
+    ]
+    # backdated rows: the stamp is still (count, max id), as _stamp computes it
+    assert series.stamp == _stamp(db, user.id) == (2, early)
+
+
+def test_hit_until_the_user_uploads(user, add_report, db, monkeypatch):
+    monkeypatch.setattr(trend_cache, "validate", False)  # invalidation alone must be enough
+    add_report(user.id, {"Glucose": 90})
+    first = trend_cache.get(db, user.id)
+    assert trend_cache.get(db, user.id) is first
+
+    add_report(user.id, {"Glucose": 95})
+    db.rollback()  # end the read snapshot, as a new request would
+    second = trend_cache.get(db, user.id)
+    assert second is not first
+    assert len(second.report_ids) == 2
+
+
+def test_writes_from_other_processes_are_caught_by_the_stamp(user, add_report, db):
+    report_id = add_report(user.id, {"Glucose": 90})
+    first = trend_cache.get(db, user.id)
+    with begin_write() as conn:  # no invalidate(), like another worker process
+        conn.execute(
+            text("INSERT INTO report_history (user_id, uploaded_at) VALUES (:u, :t)"),
+            {"u": user.id, "t": datetime(2030, 1, 1)},
+        )
+    db.rollback()
+    fresh = trend_cache.get(db, user.id)
+    assert fresh is not first
+    assert list(fresh.report_ids)[0] == report_id and len(fresh.report_ids) == 2
+
+
+def test_lru_is_bounded_by_array_bytes(make_user, add_report, db):
+    cache = _TrendCache(max_bytes=3 * 8 * 2, validate=False)  # two one-report, one-metric users
+    users = [make_user() for _ in range(3)]
+    for u in users:
+        add_report(u.id, {"Glucose": 90})
+        db.rollback()
+        cache.get(db, u.id)
+    assert list(cache._entries) == [users[1].id, users[2].id]
+    assert cache.total <= cache.max_bytes
+
+
+def test_metrics_endpoint_etag(client, user, add_report):
+    add_report(user.id, {"Glucose": 90})
+    r = client.get("/api/history/metrics", headers=user.headers)
+    etag = r.headers["etag"]
+    assert client.get("/api/history/metrics", headers={**user.headers, "If-None-Match": etag}).status_code == 304
+    # another projection is another representation
+    other = client.get("/api/history/metrics", params={"metrics": ["WBC"]}, headers=user.headers)
+    assert other.headers["etag"] != etag
+
+    add_report(user.id, {"Glucose": 95})
+    r = client.get("/api/history/metrics", headers={**user.headers, "If-None-Match": etag})
+    assert r.status_code == 200
+    assert len(r.json()) == 2
@@ -0,0 +1,46 @@
+# trend_analytics_batch.py
+#
+# Compute trend analytics for many users in vectorized batches and write one
+# JSON object per user (per-metric summary, no per-point series) as JSON lines.
+#
+#   python trend_analytics_batch.py [--out analytics.jsonl] [--chunk-size 500]
+
+import argparse
+import json
+import logging
+import sys
+
+from app.core.database import SessionLocal
+from app.models.history import ReportMetric
+from app.services.trend_analytics import batch_trend_analytics
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch trend analytics over report_metric.")
+    parser.add_argument("--out", default="-", help="Output JSON-lines file (default: stdout).")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Users per vectorized pass.")
+    parser.add_argument("--window", type=int, default=5)
+    parser.add_argument("--horizon-days", type=float, default=30.0)
+    parser.add_argument("--z-threshold", type=float, default=2.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    try:
+        user_ids = [u for (u,) in db.query(ReportMetric.user_id).distinct().order_by(ReportMetric.user_id)]
+        n = 0
+        for user_id, metrics in batch_trend_analytics(
+            db,
+            user_ids,
+            chunk_size=args.chunk_size,
+            window=args.window,
+            horizon_days=args.horizon_days,
+            z_threshold=args.z_threshold,
+        ):
+            out.write(json.dumps({"user_id": user_id, "metrics": metrics}, ensure_ascii=False) + "\n")
+            n += 1
+    finally:
+        db.close()
+        if out is not sys.stdout:
+            out.close()
+    print(f"✅ Trend analytics written for {n} users", file=sys.stderr)